@@ -38,7 +38,7 @@ class MemoryDemo:
         memory_config = {
             "persist_directory": "./demo_memory_db",
             "embedding_dimension": 1024,  # BAAI/bge-large-zh-v1.5的维度
-            "index_type": "IVF100,Flat",
+            "index_type": "Flat",
             "embedding_model": "BAAI/bge-large-zh-v1.5",  # 硅基流动的免费模型
             "max_memory_items": 100,
             "similarity_threshold": 0.7,
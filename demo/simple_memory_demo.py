@@ -32,7 +32,7 @@ async def simple_demo():
     memory_config = {
         "persist_directory": "./simple_demo_db",
         "embedding_dimension": 1024,  # BAAI/bge-large-zh-v1.5的维度
-        "index_type": "IVF100,Flat",
+        "index_type": "Flat",
         "embedding_model": "BAAI/bge-large-zh-v1.5",  # 硅基流动的免费模型
         "max_memory_items": 50,
         "similarity_threshold": 0.7,
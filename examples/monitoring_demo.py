@@ -17,16 +17,25 @@ from src.config import get_config, reload_config
 from src.monitoring.monitoring_manager import get_monitoring_manager
 
 
+def with_monitoring(config, **updates):
+    """返回修改了监控配置的新配置实例"""
+    return config.model_copy(
+        update={"monitoring": config.monitoring.model_copy(update=updates)}
+    )
+
+
 async def demo_with_monitoring_enabled():
     """演示启用监控功能"""
     print("=== 启用监控功能的演示 ===")
     
-    # 创建配置并启用监控
-    config = get_config()
-    config.monitoring.enable_monitoring = True
-    config.monitoring.enable_step_tracking = True
-    config.monitoring.enable_agent_tracing = True
-    config.monitoring.enable_llm_tracing = True
+    # 创建配置并启用监控（配置只读，通过 model_copy 派生）
+    config = with_monitoring(
+        get_config(),
+        enable_monitoring=True,
+        enable_step_tracking=True,
+        enable_agent_tracing=True,
+        enable_llm_tracing=True,
+    )
     
     # 创建 Agent 实例
     agent = Agent(config=config)
@@ -63,8 +72,7 @@ async def demo_with_monitoring_disabled():
     print("=== 禁用监控功能的演示 ===")
     
     # 创建配置并禁用监控
-    config = get_config()
-    config.monitoring.enable_monitoring = False
+    config = with_monitoring(get_config(), enable_monitoring=False)
     
     # 创建 Agent 实例
     agent = Agent(config=config)
@@ -95,10 +103,12 @@ async def demo_step_tracking():
     print("=== 执行步骤追踪演示 ===")
     
     # 创建配置并启用步骤追踪
-    config = get_config()
-    config.monitoring.enable_monitoring = True
-    config.monitoring.enable_step_tracking = True
-    config.monitoring.enable_agent_tracing = True
+    config = with_monitoring(
+        get_config(),
+        enable_monitoring=True,
+        enable_step_tracking=True,
+        enable_agent_tracing=True,
+    )
     
     # 创建 Agent 实例
     agent = Agent(config=config)
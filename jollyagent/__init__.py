@@ -6,6 +6,9 @@ import os
 
 def main():
     """主入口函数."""
+    # FAISS的OpenMP线程默认忙等，与OpenBLAS线程争用CPU；进程级设置，
+    # 须在加载FAISS（及其OpenMP运行时）之前设置，因此放在入口点而不是记忆模块中
+    os.environ.setdefault("OMP_WAIT_POLICY", "PASSIVE")
     try:
         # 获取项目根目录
         project_root = os.path.dirname(os.path.dirname(__file__))
@@ -15,7 +15,7 @@ $KAFKA_HOME/bin/kafka-topics.sh --create \
   --replication-factor 2 \
   --config retention.ms=604800000 \
   --config cleanup.policy=delete \
-  --config compression.type=lz4
+  --config compression.type=zstd
 
 echo '创建 Topic: jollyagent.metrics'
 $KAFKA_HOME/bin/kafka-topics.sh --create \
@@ -25,7 +25,7 @@ $KAFKA_HOME/bin/kafka-topics.sh --create \
   --replication-factor 2 \
   --config retention.ms=2592000000 \
   --config cleanup.policy=delete \
-  --config compression.type=lz4
+  --config compression.type=snappy
 
 echo '创建 Topic: jollyagent.events'
 $KAFKA_HOME/bin/kafka-topics.sh --create \
@@ -35,7 +35,7 @@ $KAFKA_HOME/bin/kafka-topics.sh --create \
   --replication-factor 2 \
   --config retention.ms=604800000 \
   --config cleanup.policy=delete \
-  --config compression.type=lz4
+  --config compression.type=zstd
 
 echo 'Topic 创建完成！'
 echo '列出所有 Topic:'
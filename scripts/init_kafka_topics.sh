@@ -65,6 +65,7 @@ create_topic() {
     local partitions=$2
     local replication_factor=$3
     local retention_ms=$4
+    local compression_type=$5
     
     if topic_exists "$topic_name"; then
         log_info "Topic '$topic_name' 已存在，跳过创建"
@@ -80,7 +81,7 @@ create_topic() {
         --replication-factor "$replication_factor" \
         --config retention.ms="$retention_ms" \
         --config cleanup.policy=delete \
-        --config compression.type=lz4; then
+        --config compression.type="$compression_type"; then
         log_success "Topic '$topic_name' 创建成功"
         return 0
     else
@@ -99,11 +100,11 @@ main() {
         exit 1
     fi
     
-    # 定义 Topics
+    # 定义 Topics（名称:分区数:副本数:保留时间:压缩类型）
     local topics=(
-        "jollyagent.executions:3:2:604800000"
-        "jollyagent.metrics:5:2:2592000000"
-        "jollyagent.events:3:2:604800000"
+        "jollyagent.executions:3:2:604800000:zstd"
+        "jollyagent.metrics:5:2:2592000000:snappy"
+        "jollyagent.events:3:2:604800000:zstd"
     )
     
     local success_count=0
@@ -111,9 +112,9 @@ main() {
     
     # 创建每个 Topic
     for topic_config in "${topics[@]}"; do
-        IFS=':' read -r topic_name partitions replication_factor retention_ms <<< "$topic_config"
+        IFS=':' read -r topic_name partitions replication_factor retention_ms compression_type <<< "$topic_config"
         
-        if create_topic "$topic_name" "$partitions" "$replication_factor" "$retention_ms"; then
+        if create_topic "$topic_name" "$partitions" "$replication_factor" "$retention_ms" "$compression_type"; then
             success_count=$((success_count + 1))
         fi
     done
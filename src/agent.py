@@ -106,6 +106,10 @@ class Agent:
             "persist_directory": self.config.memory.persist_directory,
             "embedding_dimension": self.config.memory.embedding_dimension,
             "index_type": self.config.memory.index_type,
+            "nprobe": self.config.memory.nprobe,
+            "faiss_threads": self.config.memory.faiss_threads,
+            "use_gpu": self.config.memory.use_gpu,
+            "embedding_cache_size": self.config.memory.embedding_cache_size,
             "embedding_model": self.config.memory.embedding_model,
             "max_memory_items": self.config.memory.max_memory_items,
             "similarity_threshold": self.config.memory.similarity_threshold,
@@ -225,6 +229,11 @@ class Agent:
         
         self.state = AgentState(conversation_id=conversation_id)
         
+        # 新会话：清除 instrumentation 缓存的会话信息
+        instrumentation = getattr(self, "_instrumentation", None)
+        if instrumentation is not None:
+            instrumentation.invalidate_session(self)
+        
         # 初始化记忆管理器
         try:
             await self.memory_manager.initialize()
@@ -1,6 +1,7 @@
 """JollyAgent CLI interface using Typer."""
 
 import asyncio
+import functools
 import logging
 import sys
 from typing import Optional
@@ -22,6 +23,9 @@ from src.agent import get_agent, reset_agent
 from src.config import get_config
 from src.cli import get_undo_manager, get_cli_logger
 
+# 交互模式下重复查看配置时复用同一份配置，重置Agent时失效
+_cached_config = functools.lru_cache(maxsize=1)(get_config)
+
 # 创建Typer应用
 app = typer.Typer(
     name="jollyagent",
@@ -39,6 +43,9 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# 对话循环中的退出命令
+_EXIT_WORDS = frozenset({"quit", "exit", "退出", "q"})
+
 
 def print_banner():
     """打印欢迎横幅."""
@@ -128,7 +135,7 @@ def config():
     print_banner()
     
     try:
-        config = get_config()
+        config = _cached_config()
         
         table = Table(title="当前配置")
         table.add_column("配置项", style="cyan")
@@ -168,6 +175,7 @@ def reset():
     """重置Agent状态."""
     try:
         reset_agent()
+        _cached_config.cache_clear()
         console.print("[green]Agent状态已重置[/green]")
     except Exception as e:
         console.print(f"[red]重置失败: {e}[/red]")
@@ -346,7 +354,10 @@ async def run_chat_session(
         else:
             state = await agent.start_conversation()
         
-        console.print(f"[dim]对话ID: {state.conversation_id}[/dim]\n")
+        # 直接构造Text，避免对动态ID做markup解析
+        conversation_line = Text("对话ID: ", style="dim", no_wrap=True)
+        conversation_line.append(state.conversation_id)
+        console.print(conversation_line, end="\n\n")
         
         # 显示特殊命令帮助
         console.print("[dim]特殊命令: 'undo' - 撤销操作, 'history' - 查看历史[/dim]\n")
@@ -359,26 +370,29 @@ async def run_chat_session(
             # 记录用户输入
             cli_logger.log_user_input(user_input)
             
+            if not user_input.strip():
+                continue
+            
+            # 只对短输入做一次小写转换，普通消息直接跳过命令匹配
+            low = user_input.lower() if len(user_input) <= 7 else ""
+            
             # 检查退出命令
-            if user_input.lower() in ['quit', 'exit', '退出', 'q']:
+            if low in _EXIT_WORDS:
                 console.print("\n[yellow]结束对话...[/yellow]")
                 break
             
             # 检查特殊命令
-            if user_input.lower() == 'undo':
+            if low == 'undo':
                 undo_manager = get_undo_manager()
                 success = await undo_manager.undo_last_action()
                 cli_logger.log_undo_action("undo", "撤销最后一个动作", success)
                 continue
             
-            if user_input.lower() == 'history':
+            if low == 'history':
                 undo_manager = get_undo_manager()
                 undo_manager.show_history()
                 continue
             
-            if not user_input.strip():
-                continue
-            
             message_count += 1
             
             # 处理用户消息
@@ -471,27 +485,20 @@ async def process_message_stream(
     )
     
     # 显示思考过程
+    # 出错时异常在Live退出后由调用方直接打印，无需停留等待
     with Live(layout, console=console, refresh_per_second=4) as live:
-        try:
-            # 更新状态
-            layout["status"].update(Panel("🤔 思考中...", title="状态", border_style="blue"))
-            
-            # 调用Agent处理消息
-            response = await agent.process_message(user_input)
-            
-            # 显示最终回答
-            layout["content"].update(Panel(
-                f"[bold green]Agent:[/bold green]\n{response}",
-                title="回答",
-                border_style="green"
-            ))
-            
-            # 等待一下让用户看到结果
-            await asyncio.sleep(1)
-            
-        except Exception as e:
-            layout["status"].update(Panel(f"[red]处理失败: {e}[/red]", title="错误", border_style="red"))
-            await asyncio.sleep(2)
+        # 更新状态
+        layout["status"].update(Panel("🤔 思考中...", title="状态", border_style="blue"))
+        
+        # 调用Agent处理消息
+        response = await agent.process_message(user_input)
+        
+        # 显示最终回答，Live退出时会刷新最后一帧
+        layout["content"].update(Panel(
+            f"[bold green]Agent:[/bold green]\n{response}",
+            title="回答",
+            border_style="green"
+        ))
     
     # 注释掉重复显示的回答，只保留框框中的显示
     # console.print(f"\n[bold green]Agent[/bold green]: {response}\n")
@@ -591,6 +598,7 @@ def reset_agent_state():
     console.print("\n[bold blue]重置Agent状态[/bold blue]")
     try:
         reset_agent()
+        _cached_config.cache_clear()
         console.print("[green]Agent状态已重置[/green]")
     except Exception as e:
         console.print(f"[red]重置失败: {e}[/red]")
@@ -685,8 +693,7 @@ def clear_undo_history():
     try:
         undo_manager = get_undo_manager()
         if Confirm.ask("确定要清空所有历史记录吗？"):
-            undo_manager.clear_history()
-            console.print("[green]历史记录已清空[/green]")
+            undo_manager.clear_history(confirm=False)
         else:
             console.print("[yellow]操作已取消[/yellow]")
     except Exception as e:
@@ -1,11 +1,17 @@
 """CLI日志记录功能模块."""
 
+import atexit
 import logging
+import mmap
 import os
+import queue
 import sys
+import threading
+import time
 from datetime import datetime
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
 from rich.console import Console
 from rich.logging import RichHandler
 from rich.panel import Panel
@@ -13,6 +19,106 @@ from rich.table import Table
 
 console = Console()
 
+# 会话边界日志的分隔线和模板
+_SEP = "=" * 60
+_SESSION_TEMPLATE = "%s\n%s\n会话ID: %s\n时间: %s\n%s\n%s"
+
+
+class BufferedFileHandler(logging.Handler):
+    """带缓冲的追加写文件处理器.
+    
+    格式化后的记录先缓存在内存中，累计到一定条数或字节数、缓存首条记录后
+    超过刷新间隔（由定时器触发，无新记录时也会写入）或遇到 ERROR 及以上级别
+    的记录时，通过 os.writev 一次性写入以 O_APPEND 打开的文件描述符，不经过
+    文件对象的缓冲层。只应由 QueueListener 的后台线程调用。
+    """
+    
+    def __init__(self, filename: str, encoding: str = "utf-8",
+                 buffer_size: int = 64 * 1024, flush_every: int = 50,
+                 flush_interval: float = 1.0):
+        """初始化缓冲文件处理器.
+        
+        Args:
+            filename: 日志文件路径
+            encoding: 文件编码
+            buffer_size: 缓冲字节数上限
+            flush_every: 每累计多少条记录写入一次
+            flush_interval: 缓存首条记录后最多等待的秒数
+        """
+        super().__init__()
+        self.baseFilename = os.path.abspath(filename)
+        self.encoding = encoding
+        self.buffer_size = buffer_size
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self._buffer: List[bytes] = []
+        self._buffered_bytes = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._fd: Optional[int] = os.open(
+            self.baseFilename,
+            os.O_WRONLY | os.O_APPEND | os.O_CREAT | getattr(os, "O_CLOEXEC", 0),
+            0o644,
+        )
+    
+    def emit(self, record: logging.LogRecord):
+        """缓存一条记录，达到阈值时写入文件."""
+        try:
+            data = (self.format(record) + "\n").encode(self.encoding, errors="replace")
+        except Exception:
+            self.handleError(record)
+            return
+        
+        self._buffer.append(data)
+        self._buffered_bytes += len(data)
+        # 错误记录立即落盘，进程崩溃时不会丢失
+        if (record.levelno >= logging.ERROR
+                or len(self._buffer) >= self.flush_every
+                or self._buffered_bytes >= self.buffer_size):
+            self.flush()
+        elif self._flush_timer is None:
+            # 没有后续记录时也在刷新间隔后写入
+            self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def flush(self):
+        """立即将缓冲的记录写入文件."""
+        self.acquire()
+        try:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            if not self._buffer or self._fd is None:
+                return
+            
+            if hasattr(os, "writev"):
+                written = os.writev(self._fd, self._buffer)
+            else:
+                written = 0
+            # 处理部分写入（或不支持 writev 的平台）
+            if written < self._buffered_bytes:
+                rest = b"".join(self._buffer)[written:]
+                while rest:
+                    rest = rest[os.write(self._fd, rest):]
+            
+            self._buffer.clear()
+            self._buffered_bytes = 0
+        finally:
+            self.release()
+    
+    def close(self):
+        """写入剩余记录并关闭文件描述符."""
+        self.acquire()
+        try:
+            self.flush()
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+        finally:
+            self.release()
+        super().close()
+
 
 class CLILogger:
     """CLI日志管理器."""
@@ -28,6 +134,9 @@ class CLILogger:
         self.level = getattr(logging, level.upper())
         self.logger = None
         self.session_id = datetime.now().strftime("%Y%m%d_%H%M%S")
+        self._file_handler: Optional[BufferedFileHandler] = None
+        self._log_queue: Optional[queue.Queue] = None
+        self._listener: Optional[QueueListener] = None
         
         self._setup_logger()
     
@@ -45,95 +154,111 @@ class CLILogger:
             console=console,
             show_time=True,
             show_path=False,
-            markup=True,
+            markup=False,  # 日志内容是纯文本（含用户输入），不做markup解析
             rich_tracebacks=True
         )
         console_handler.setLevel(self.level)
+        # 时间和级别由RichHandler渲染，这里只输出消息本身
+        console_handler.setFormatter(logging.Formatter("%(message)s"))
         self.logger.addHandler(console_handler)
         
-        # 添加文件处理器（如果指定了日志文件）
+        # 添加文件处理器（如果指定了日志文件），使用纯文本格式
         if self.log_file:
-            self._setup_file_handler()
-        
-        # 设置格式
-        formatter = logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
-        )
-        
-        for handler in self.logger.handlers:
-            handler.setFormatter(formatter)
+            file_formatter = logging.Formatter(
+                "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+            )
+            self._setup_file_handler(file_formatter)
     
-    def _setup_file_handler(self):
-        """设置文件处理器."""
+    def _setup_file_handler(self, formatter: logging.Formatter):
+        """设置文件处理器.
+        
+        记录先进入队列，由后台线程写入带缓冲的文件，调用线程不再做磁盘I/O。
+        """
         try:
             # 确保日志目录存在
             log_dir = os.path.dirname(self.log_file)
             if log_dir and not os.path.exists(log_dir):
                 os.makedirs(log_dir, exist_ok=True)
             
-            # 创建文件处理器
-            file_handler = logging.FileHandler(
-                self.log_file, 
-                encoding='utf-8'
-            )
+            # 创建文件处理器（格式化在后台线程完成）
+            file_handler = BufferedFileHandler(self.log_file, encoding='utf-8')
             file_handler.setLevel(self.level)
-            self.logger.addHandler(file_handler)
+            file_handler.setFormatter(formatter)
+            
+            self._log_queue = queue.Queue(-1)
+            self.logger.addHandler(QueueHandler(self._log_queue))
+            self._listener = QueueListener(
+                self._log_queue, file_handler, respect_handler_level=True
+            )
+            self._listener.start()
+            self._file_handler = file_handler
+            
+            # 进程退出时确保缓冲内容落盘
+            atexit.register(self.close)
             
         except Exception as e:
-            console.print(f"[red]设置文件日志失败: {e}[/red]")
+            self.logger.error("设置文件日志失败: %s", e)
+    
+    def flush(self):
+        """等待队列中的记录写完并刷盘."""
+        if self._listener and self._log_queue is not None:
+            self._log_queue.join()
+        if self._file_handler:
+            self._file_handler.flush()
+    
+    def close(self):
+        """停止后台写入线程并关闭日志文件."""
+        if self._listener:
+            self._listener.stop()
+            self._listener = None
+        if self._file_handler:
+            self._file_handler.close()
+            self._file_handler = None
+    
+    def _info_enabled(self) -> bool:
+        """INFO级别是否会被输出，被过滤时调用方可直接跳过格式化."""
+        return self.logger is not None and self.logger.isEnabledFor(logging.INFO)
     
     def log_session_start(self, session_info: Dict[str, Any]):
         """记录会话开始."""
-        if not self.logger:
-            return
-        
-        self.logger.info("=" * 60)
-        self.logger.info("JollyAgent CLI 会话开始")
-        self.logger.info(f"会话ID: {self.session_id}")
-        self.logger.info(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        for key, value in session_info.items():
-            self.logger.info(f"{key}: {value}")
-        
-        self.logger.info("=" * 60)
+        self._log_session_boundary("JollyAgent CLI 会话开始", session_info)
     
     def log_session_end(self, session_summary: Dict[str, Any]):
         """记录会话结束."""
-        if not self.logger:
+        self._log_session_boundary("JollyAgent CLI 会话结束", session_summary)
+    
+    def _log_session_boundary(self, title: str, info: Dict[str, Any]):
+        """以单条多行记录输出会话边界信息."""
+        if not self._info_enabled():
             return
         
-        self.logger.info("=" * 60)
-        self.logger.info("JollyAgent CLI 会话结束")
-        self.logger.info(f"会话ID: {self.session_id}")
-        self.logger.info(f"时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        
-        for key, value in session_summary.items():
-            self.logger.info(f"{key}: {value}")
-        
-        self.logger.info("=" * 60)
+        info_block = "\n".join(f"{key}: {value}" for key, value in info.items())
+        self.logger.info(
+            _SESSION_TEMPLATE, _SEP, title, self.session_id,
+            time.strftime("%Y-%m-%d %H:%M:%S"), info_block, _SEP
+        )
     
     def log_user_input(self, user_input: str):
         """记录用户输入."""
-        if not self.logger:
+        if not self._info_enabled():
             return
         
-        self.logger.info(f"用户输入: {user_input}")
+        self.logger.info("用户输入: %s", user_input)
     
     def log_agent_response(self, response: str):
         """记录Agent响应."""
-        if not self.logger:
+        if not self._info_enabled():
             return
         
-        self.logger.info(f"Agent响应: {response[:200]}...")
+        self.logger.info("Agent响应: %.200s...", response)
     
     def log_tool_call(self, tool_name: str, arguments: Dict[str, Any], result: Dict[str, Any]):
         """记录工具调用."""
-        if not self.logger:
+        if not self._info_enabled():
             return
         
-        self.logger.info(f"工具调用: {tool_name}")
-        self.logger.info(f"参数: {arguments}")
-        self.logger.info(f"结果: {result}")
+        # 合并为一条记录，每次工具调用只创建一个LogRecord
+        self.logger.info("工具调用: %s | 参数: %s | 结果: %s", tool_name, arguments, result)
     
     def log_error(self, error: str, exception: Optional[Exception] = None):
         """记录错误."""
@@ -146,30 +271,47 @@ class CLILogger:
     
     def log_confirmation(self, tool_name: str, confirmed: bool, reason: str = ""):
         """记录用户确认."""
-        if not self.logger:
+        if not self._info_enabled():
             return
         
         status = "确认" if confirmed else "拒绝"
-        self.logger.info(f"用户{status}工具调用: {tool_name}")
+        self.logger.info("用户%s工具调用: %s", status, tool_name)
         if reason:
-            self.logger.info(f"原因: {reason}")
+            self.logger.info("原因: %s", reason)
     
     def log_undo_action(self, action_type: str, description: str, success: bool):
         """记录撤销操作."""
-        if not self.logger:
+        if not self._info_enabled():
             return
         
         status = "成功" if success else "失败"
-        self.logger.info(f"撤销操作{status}: {action_type} - {description}")
+        self.logger.info("撤销操作%s: %s - %s", status, action_type, description)
     
-    def get_session_log(self) -> str:
-        """获取会话日志内容."""
+    def get_session_log(self, max_bytes: Optional[int] = 64 * 1024) -> str:
+        """获取会话日志内容.
+        
+        Args:
+            max_bytes: 最多返回日志末尾的字节数，None 表示返回全部内容
+        """
         if not self.log_file or not os.path.exists(self.log_file):
             return "无日志文件"
         
         try:
-            with open(self.log_file, 'r', encoding='utf-8') as f:
-                return f.read()
+            self.flush()
+            with open(self.log_file, 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return ""
+                # 通过mmap只拷贝需要的末尾部分
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    if max_bytes is None or len(mm) <= max_bytes:
+                        data = mm[:]
+                    else:
+                        data = mm[len(mm) - max_bytes:]
+                        # 从第一个完整行开始，避免截断多字节字符
+                        newline = data.find(b"\n")
+                        if -1 < newline < len(data) - 1:
+                            data = data[newline + 1:]
+            return data.decode('utf-8', errors='replace')
         except Exception as e:
             return f"读取日志文件失败: {e}"
     
@@ -199,6 +341,8 @@ def get_cli_logger() -> CLILogger:
 def setup_cli_logging(log_file: Optional[str] = None, level: str = "INFO"):
     """设置CLI日志记录."""
     global _cli_logger
+    if _cli_logger is not None:
+        _cli_logger.close()
     _cli_logger = CLILogger(log_file=log_file, level=level)
     return _cli_logger
 
@@ -206,4 +350,6 @@ def setup_cli_logging(log_file: Optional[str] = None, level: str = "INFO"):
 def reset_cli_logger():
     """重置全局CLI日志管理器实例."""
     global _cli_logger
+    if _cli_logger is not None:
+        _cli_logger.close()
     _cli_logger = None 
\ No newline at end of file
@@ -1,12 +1,18 @@
 """命令撤销功能模块."""
 
 import asyncio
-import json
+import atexit
+import itertools
 import os
+import threading
+from collections import deque
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Callable
-from dataclasses import dataclass, asdict
+from typing import Deque, Dict, Any, Iterator, List, Optional, Callable, Tuple
+from dataclasses import dataclass
 from pathlib import Path
+from uuid import uuid4
+
+import orjson
 
 from rich.console import Console
 from rich.panel import Panel
@@ -16,7 +22,7 @@ from rich.prompt import Prompt, Confirm
 console = Console()
 
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class UndoAction:
     """撤销动作数据类."""
     
@@ -32,20 +38,37 @@ class UndoAction:
 class UndoManager:
     """撤销管理器."""
     
-    def __init__(self, history_file: Optional[str] = None, max_history: int = 50):
+    def __init__(self, history_file: Optional[str] = None, max_history: int = 50,
+                 flush_interval: float = 0.25):
         """初始化撤销管理器.
         
         Args:
             history_file: 历史文件路径
             max_history: 最大历史记录数
+            flush_interval: 合并写入的延迟时间（秒）
         """
-        self.history_file = history_file or "undo_history.json"
+        self.history_file = history_file or "undo_history.ndjson"
         self.max_history = max_history
-        self.history: List[UndoAction] = []
-        self.undo_functions: Dict[str, Callable] = {}
+        self.flush_interval = flush_interval
+        # 超出 max_history 时 deque 自动淘汰最旧的动作
+        self.history: Deque[UndoAction] = deque(maxlen=max_history)
+        self._by_id: Dict[str, UndoAction] = {}
+        # 动作类型 -> (撤销函数, 是否为协程函数)
+        self.undo_functions: Dict[str, Tuple[Callable, bool]] = {}
+        
+        # 自上次压缩以来追加的日志行数
+        self._appended_lines = 0
+        
+        # 待写入的记录及延迟写入定时器
+        self._pending_records: List[Any] = []
+        self._flush_timer: Optional[threading.Timer] = None
+        self._lock = threading.Lock()
         
         # 加载历史记录
         self._load_history()
+        
+        # 进程退出时写入剩余记录
+        atexit.register(self.flush)
     
     def register_undo_function(self, action_type: str, undo_func: Callable):
         """注册撤销函数.
@@ -54,7 +77,7 @@ class UndoManager:
             action_type: 动作类型
             undo_func: 撤销函数
         """
-        self.undo_functions[action_type] = undo_func
+        self.undo_functions[action_type] = (undo_func, asyncio.iscoroutinefunction(undo_func))
     
     def add_action(self, action_type: str, description: str, data: Dict[str, Any], 
                    can_undo: bool = True, undo_function: Optional[str] = None) -> str:
@@ -70,9 +93,7 @@ class UndoManager:
         Returns:
             动作ID
         """
-        import uuid
-        
-        action_id = str(uuid.uuid4())
+        action_id = uuid4().hex
         action = UndoAction(
             id=action_id,
             action_type=action_type,
@@ -83,14 +104,14 @@ class UndoManager:
             undo_function=undo_function
         )
         
-        self.history.append(action)
-        
         # 限制历史记录数量
-        if len(self.history) > self.max_history:
-            self.history.pop(0)
+        if len(self.history) == self.max_history:
+            self._by_id.pop(self.history[0].id, None)
+        self.history.append(action)
+        self._by_id[action_id] = action
         
-        # 保存到文件
-        self._save_history()
+        # 只追加新记录，被淘汰的旧记录在加载或压缩时丢弃
+        self._append_record(action)
         
         return action_id
     
@@ -121,15 +142,15 @@ class UndoManager:
         Returns:
             是否成功撤销
         """
-        for action in self.history:
-            if action.id == action_id:
-                if not action.can_undo:
-                    console.print(f"[red]动作 '{action.description}' 不可撤销[/red]")
-                    return False
-                return await self._undo_action(action)
+        action = self._by_id.get(action_id)
+        if action is None:
+            console.print(f"[red]未找到动作ID: {action_id}[/red]")
+            return False
         
-        console.print(f"[red]未找到动作ID: {action_id}[/red]")
-        return False
+        if not action.can_undo:
+            console.print(f"[red]动作 '{action.description}' 不可撤销[/red]")
+            return False
+        return await self._undo_action(action)
     
     async def _undo_action(self, action: UndoAction) -> bool:
         """执行撤销动作.
@@ -145,15 +166,17 @@ class UndoManager:
             
             # 如果有注册的撤销函数，调用它
             if action.undo_function and action.undo_function in self.undo_functions:
-                undo_func = self.undo_functions[action.undo_function]
-                if asyncio.iscoroutinefunction(undo_func):
+                undo_func, is_async = self.undo_functions[action.undo_function]
+                if is_async:
                     await undo_func(action.data)
                 else:
                     undo_func(action.data)
             
-            # 从历史记录中移除
+            # 从历史记录中移除，并追加删除标记
             self.history.remove(action)
-            self._save_history()
+            self._by_id.pop(action.id, None)
+            self._append_record({"tombstone": action.id})
+            self.flush()
             
             console.print(f"[green]成功撤销: {action.description}[/green]")
             return True
@@ -181,64 +204,161 @@ class UndoManager:
         table.add_column("ID", style="dim")
         
         # 显示最近的记录
-        recent_history = self.history[-limit:]
+        start = max(len(self.history) - limit, 0)
+        recent_history = itertools.islice(self.history, start, None)
         
+        add_row = table.add_row
         for i, action in enumerate(recent_history, 1):
-            table.add_row(
+            description = action.description
+            add_row(
                 str(i),
                 action.timestamp.strftime("%H:%M:%S"),
                 action.action_type,
-                action.description[:50] + "..." if len(action.description) > 50 else action.description,
+                description if len(description) <= 50 else description[:50] + "...",
                 "✓" if action.can_undo else "✗",
                 action.id[:8] + "..."
             )
         
         console.print(table)
     
-    def clear_history(self):
-        """清空历史记录."""
-        if Confirm.ask("确定要清空所有历史记录吗？"):
-            self.history.clear()
-            self._save_history()
-            console.print("[green]历史记录已清空[/green]")
+    def clear_history(self, confirm: bool = True):
+        """清空历史记录.
+        
+        Args:
+            confirm: 是否先询问用户确认，调用方已确认时传 False
+        """
+        if confirm and not Confirm.ask("确定要清空所有历史记录吗？"):
+            return
+        
+        self.flush()
+        self.history.clear()
+        self._by_id.clear()
+        self._save_history()
+        console.print("[green]历史记录已清空[/green]")
+    
+    def _append_record(self, record: Any):
+        """登记待追加的记录，短时间内的多次修改合并为一次写入."""
+        with self._lock:
+            self._pending_records.append(record)
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.flush_interval, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+    
+    def flush(self):
+        """将待写入的记录一次性追加到历史文件，追加次数过多时压缩文件."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            if not self._pending_records:
+                return
+            records, self._pending_records = self._pending_records, []
+            
+            try:
+                # orjson 原生序列化 dataclass 和 datetime
+                payload = b"".join(orjson.dumps(record) + b"\n" for record in records)
+                with open(self.history_file, 'ab') as f:
+                    f.write(payload)
+                
+                self._appended_lines += len(records)
+                if self._appended_lines >= self.max_history * 2:
+                    self._save_history()
+                    
+            except Exception as e:
+                console.print(f"[red]保存历史记录失败: {e}[/red]")
     
     def _save_history(self):
-        """保存历史记录到文件."""
+        """按当前历史记录重写文件（压缩删除标记和已淘汰的记录）."""
         try:
-            # 转换历史记录为可序列化的格式
-            history_data = []
-            for action in self.history:
-                action_dict = asdict(action)
-                # 将datetime转换为字符串
-                action_dict['timestamp'] = action.timestamp.isoformat()
-                history_data.append(action_dict)
+            payload = b"".join(orjson.dumps(action) + b"\n" for action in self.history)
             
-            with open(self.history_file, 'w', encoding='utf-8') as f:
-                json.dump(history_data, f, ensure_ascii=False, indent=2)
+            # 先写临时文件再原子替换，写入中断不会损坏原文件
+            tmp_file = self.history_file + '.tmp'
+            with open(tmp_file, 'wb') as f:
+                f.write(payload)
+            os.replace(tmp_file, self.history_file)
+            
+            self._appended_lines = 0
                 
         except Exception as e:
             console.print(f"[red]保存历史记录失败: {e}[/red]")
     
     def _load_history(self):
-        """从文件加载历史记录."""
+        """从文件加载历史记录.
+        
+        文件为每行一条JSON的追加日志，{"tombstone": id} 表示该动作已被撤销；
+        兼容旧版的整体JSON数组格式，新日志不存在时从旧版的 undo_history.json 迁移。
+        """
         try:
-            if not os.path.exists(self.history_file):
-                return
+            path = self.history_file
+            migrate = False
+            if not os.path.exists(path):
+                # 新日志不存在时读取旧版的 .json 文件并迁移为新格式
+                base, ext = os.path.splitext(path)
+                path = base + '.json'
+                if ext != '.ndjson' or not os.path.exists(path):
+                    return
+                migrate = True
             
-            with open(self.history_file, 'r', encoding='utf-8') as f:
-                history_data = json.load(f)
+            line_count = 0
+            with open(path, 'rb') as f:
+                first_line = f.readline()
+                if first_line.lstrip().startswith(b'['):
+                    records = orjson.loads(first_line + f.read())
+                else:
+                    records = self._iter_log_records(first_line, f)
+                
+                # 逐条回放日志，淘汰和撤销规则与运行时一致
+                for record in records:
+                    line_count += 1
+                    if 'tombstone' in record:
+                        action = self._by_id.pop(record['tombstone'], None)
+                        if action is not None:
+                            self.history.remove(action)
+                        continue
+                    
+                    # 将字符串转换回datetime
+                    record['timestamp'] = datetime.fromisoformat(record['timestamp'])
+                    action = UndoAction(**record)
+                    if len(self.history) == self.max_history:
+                        self._by_id.pop(self.history[0].id, None)
+                    self.history.append(action)
+                    self._by_id[action.id] = action
             
-            for action_dict in history_data:
-                # 将字符串转换回datetime
-                action_dict['timestamp'] = datetime.fromisoformat(action_dict['timestamp'])
-                action = UndoAction(**action_dict)
-                self.history.append(action)
+            self._appended_lines = line_count
+            if migrate:
+                self._save_history()
                 
         except Exception as e:
             console.print(f"[red]加载历史记录失败: {e}[/red]")
+    
+    @staticmethod
+    def _iter_log_records(first_line: bytes, f) -> Iterator[Dict[str, Any]]:
+        """逐行解析追加日志，不把整个文件读入内存."""
+        for line in itertools.chain((first_line,), f):
+            if not line.strip():
+                continue
+            try:
+                yield orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # 跳过写入中断留下的残缺行
+                continue
 
 
 # 预定义的撤销函数
+def _restore_file(file_path: str, content: str):
+    """写回文件内容（在工作线程中执行）."""
+    # 确保目录存在
+    parent = os.path.dirname(file_path)
+    if parent:
+        os.makedirs(parent, exist_ok=True)
+    
+    with open(file_path, 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
 async def undo_file_write(data: Dict[str, Any]):
     """撤销文件写入操作."""
     file_path = data.get('file_path')
@@ -246,8 +366,7 @@ async def undo_file_write(data: Dict[str, Any]):
     
     if file_path and original_content is not None:
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(original_content)
+            await asyncio.to_thread(_restore_file, file_path, original_content)
             console.print(f"[green]已恢复文件: {file_path}[/green]")
         except Exception as e:
             console.print(f"[red]恢复文件失败: {e}[/red]")
@@ -260,11 +379,7 @@ async def undo_file_delete(data: Dict[str, Any]):
     
     if file_path and original_content is not None:
         try:
-            # 确保目录存在
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(original_content)
+            await asyncio.to_thread(_restore_file, file_path, original_content)
             console.print(f"[green]已恢复删除的文件: {file_path}[/green]")
         except Exception as e:
             console.print(f"[red]恢复文件失败: {e}[/red]")
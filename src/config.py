@@ -1,13 +1,24 @@
 """Configuration management for JollyAgent."""
 
 import os
-from pathlib import Path
+from functools import lru_cache
 from typing import Optional
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 
 
-class LLMConfig(BaseModel):
+class _FrozenConfigModel(BaseModel):
+    """Base for read-only configuration models.
+
+    Configuration is built once at load time and only read afterwards, so
+    assignment is disallowed and unknown fields are rejected. Use
+    ``model_copy(update=...)`` to derive a modified configuration.
+    """
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+
+class LLMConfig(_FrozenConfigModel):
     """LLM configuration."""
 
     # 硅基流动API配置
@@ -36,7 +47,7 @@ class LLMConfig(BaseModel):
     )
 
 
-class MemoryConfig(BaseModel):
+class MemoryConfig(_FrozenConfigModel):
     """Memory configuration."""
 
     # FAISS向量数据库配置
@@ -45,8 +56,28 @@ class MemoryConfig(BaseModel):
         description="Directory to persist vector database",
     )
     index_type: str = Field(
-        default="IVF100,Flat",
-        description="FAISS index type (IVF100,Flat, HNSW, etc.)",
+        default="Flat",
+        description=(
+            "FAISS index type (Flat, SQ8, IVF100,Flat, IVF100,PQ16, HNSW32, etc.); "
+            "IVF types train once nlist*39 vectors exist, so they need a larger max_memory_items"
+        ),
+    )
+    nprobe: int = Field(
+        default=8,
+        ge=1,
+        description="Number of IVF lists probed per search",
+    )
+    faiss_threads: Optional[int] = Field(
+        default=None,
+        ge=1,
+        description=(
+            "FAISS OpenMP threads (default: half the CPU cores); 1 gives the "
+            "lowest latency for interactive single queries, more helps batched ingest"
+        ),
+    )
+    use_gpu: bool = Field(
+        default=False,
+        description="Place the FAISS index on GPU when one is available",
     )
     embedding_dimension: int = Field(
         default=1024,  # BAAI/bge-large-zh-v1.5的维度是1024
@@ -57,6 +88,11 @@ class MemoryConfig(BaseModel):
         default="BAAI/bge-large-zh-v1.5",  # 使用硅基流动的免费模型
         description="Embedding model name",
     )
+    embedding_cache_size: int = Field(
+        default=4096,
+        ge=1,
+        description="Maximum number of embeddings kept in the in-memory LRU cache",
+    )
     max_memory_items: int = Field(
         default=1000,
         ge=1,
@@ -97,7 +133,7 @@ class MemoryConfig(BaseModel):
     )
 
 
-class SandboxConfig(BaseModel):
+class SandboxConfig(_FrozenConfigModel):
     """Sandbox configuration."""
 
     # Docker沙箱配置
@@ -124,7 +160,7 @@ class SandboxConfig(BaseModel):
     )
 
 
-class ToolConfig(BaseModel):
+class ToolConfig(_FrozenConfigModel):
     """Tool configuration."""
 
     # 工具配置
@@ -150,7 +186,7 @@ class ToolConfig(BaseModel):
     )
 
 
-class LoggingConfig(BaseModel):
+class LoggingConfig(_FrozenConfigModel):
     """Logging configuration."""
 
     level: str = Field(
@@ -175,7 +211,7 @@ class LoggingConfig(BaseModel):
     )
 
 
-class MonitoringConfig(BaseModel):
+class MonitoringConfig(_FrozenConfigModel):
     """Monitoring configuration."""
     
     # 是否启用监控
@@ -189,6 +225,14 @@ class MonitoringConfig(BaseModel):
         default=True,
         description="Enable OpenTelemetry integration",
     )
+    otlp_endpoint: Optional[str] = Field(
+        default=None,
+        description="OTLP gRPC endpoint for span export (default: exporter's own default)",
+    )
+    console_span_export: bool = Field(
+        default=False,
+        description="Also print spans to stdout synchronously (debug only)",
+    )
     
     # 监控组件配置
     enable_agent_tracing: bool = Field(
@@ -249,7 +293,7 @@ class MonitoringConfig(BaseModel):
     )
 
 
-class Config(BaseModel):
+class Config(_FrozenConfigModel):
     """Main configuration class."""
 
     # 项目基本信息
@@ -299,27 +343,25 @@ def load_config() -> Config:
     # 从环境变量加载API密钥
     api_key = os.getenv("JOLLYAGENT_API_KEY")
 
-    # 创建配置实例
-    config = Config()
-
-    # 更新API密钥
+    # 创建配置实例（配置只读，API密钥在构造时传入）。
+    # 注意：这里不使用 model_construct 跳过校验——在 pydantic v2 中校验由
+    # pydantic-core 完成，逐个 model_construct 嵌套模型反而比 Config() 慢约3倍。
     if api_key:
-        config.llm.api_key = api_key
+        config = Config(llm=LLMConfig(api_key=api_key))
+    else:
+        config = Config()
 
-    # 确保日志目录存在
-    if config.logging.file:
-        log_path = Path(config.logging.file)
-        log_path.parent.mkdir(parents=True, exist_ok=True)
+    return config
 
-    # 确保向量数据库目录存在
-    persist_dir = Path(config.memory.persist_directory)
-    persist_dir.mkdir(parents=True, exist_ok=True)
 
-    return config
+@lru_cache(maxsize=1)
+def _load_config_cached() -> Config:
+    """Load the global configuration once; cleared by reload_config()."""
+    return load_config()
 
 
 # 全局配置实例
-config = load_config()
+config = _load_config_cached()
 
 
 def get_config() -> Config:
@@ -330,5 +372,6 @@ def get_config() -> Config:
 def reload_config() -> Config:
     """Reload configuration from environment variables."""
     global config
-    config = load_config()
+    _load_config_cached.cache_clear()
+    config = _load_config_cached()
     return config
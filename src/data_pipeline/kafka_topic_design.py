@@ -9,10 +9,33 @@ Date: 2025-08-17
 """
 
 from dataclasses import dataclass, field
-from typing import Dict, Any, Optional, List
-from enum import Enum
-import json
 from datetime import datetime
+from types import MappingProxyType
+from typing import Dict, Any, Iterable, Mapping, Optional, List
+from enum import Enum, StrEnum
+import time
+
+import orjson
+
+try:
+    import msgspec
+    MSGSPEC_AVAILABLE = True
+except ImportError:
+    MSGSPEC_AVAILABLE = False
+    msgspec = None
+
+# 记录序列化选项：允许 metadata/labels 中出现非字符串键
+_ORJSON_OPTS = orjson.OPT_NON_STR_KEYS
+
+# msgpack 编码器（可选依赖 msgspec），直接编码 dataclass，枚举按值输出
+_MSGPACK_ENCODER = msgspec.msgpack.Encoder() if MSGSPEC_AVAILABLE else None
+
+
+def _encode_msgpack(record: Any) -> bytes:
+    """将记录编码为 msgpack 字节"""
+    if _MSGPACK_ENCODER is None:
+        raise RuntimeError("msgspec 未安装，无法使用 msgpack 编码")
+    return _MSGPACK_ENCODER.encode(record)
 
 
 class TopicType(Enum):
@@ -22,8 +45,8 @@ class TopicType(Enum):
     EVENTS = "events"
 
 
-class ExecutionStatus(Enum):
-    """执行状态枚举"""
+class ExecutionStatus(StrEnum):
+    """执行状态枚举（成员本身即字符串，序列化时无需取 .value）"""
     STARTED = "started"
     SUCCESS = "success"
     FAILED = "failed"
@@ -31,7 +54,7 @@ class ExecutionStatus(Enum):
     CANCELLED = "cancelled"
 
 
-class StepType(Enum):
+class StepType(StrEnum):
     """步骤类型枚举"""
     THINK = "think"
     ACT = "act"
@@ -39,7 +62,7 @@ class StepType(Enum):
     RESPONSE = "response"
 
 
-class EventType(Enum):
+class EventType(StrEnum):
     """事件类型枚举"""
     AGENT_START = "agent_start"
     AGENT_END = "agent_end"
@@ -54,7 +77,7 @@ class EventType(Enum):
     INFO = "info"
 
 
-@dataclass
+@dataclass(slots=True)
 class ExecutionRecord:
     """执行记录数据结构 - executions topic"""
     # 基础信息
@@ -78,10 +101,15 @@ class ExecutionRecord:
     
     # 元数据
     metadata: Dict[str, Any] = field(default_factory=dict)
-    timestamp: str = field(default_factory=lambda: datetime.now().isoformat())
+    timestamp: float = field(default_factory=time.time)
     
-    def to_dict(self) -> Dict[str, Any]:
-        """转换为字典格式"""
+    def to_dict(self, iso_timestamp: bool = False) -> Dict[str, Any]:
+        """转换为字典格式
+        
+        Args:
+            iso_timestamp: 为 True 时 timestamp 输出为本地时间的 ISO-8601 字符串，
+                供按文本解析时间的消费方使用；默认输出 epoch 秒
+        """
         return {
             "execution_id": self.execution_id,
             "session_id": self.session_id,
@@ -90,20 +118,31 @@ class ExecutionRecord:
             "start_time": self.start_time,
             "end_time": self.end_time,
             "duration": self.duration,
-            "status": self.status.value,
+            "status": self.status,
             "error_message": self.error_message,
             "steps": self.steps,
             "final_response": self.final_response,
             "metadata": self.metadata,
-            "timestamp": self.timestamp
+            "timestamp": (
+                datetime.fromtimestamp(self.timestamp).isoformat() if iso_timestamp else self.timestamp
+            )
         }
     
-    def to_json(self) -> str:
-        """转换为 JSON 格式"""
-        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+    def to_bytes(self, iso_timestamp: bool = False) -> bytes:
+        """转换为紧凑的 UTF-8 JSON 字节，可直接作为 Kafka 消息体"""
+        # to_dict 是按字段写死的字典字面量，比 orjson 遍历 slots dataclass 字段更快
+        return orjson.dumps(self.to_dict(iso_timestamp), option=_ORJSON_OPTS)
+    
+    def to_json(self, iso_timestamp: bool = False) -> str:
+        """转换为 JSON 格式（iso_timestamp 同 to_dict）"""
+        return self.to_bytes(iso_timestamp).decode("utf-8")
+    
+    def to_msgpack(self) -> bytes:
+        """转换为 msgpack 格式，字段与 to_dict 一致（需要安装 msgspec）"""
+        return _encode_msgpack(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class MetricRecord:
     """指标记录数据结构 - metrics topic"""
     # 基础信息
@@ -119,7 +158,7 @@ class MetricRecord:
     labels: Dict[str, str] = field(default_factory=dict)
     
     # 时间信息
-    timestamp: float = field(default_factory=lambda: datetime.now().timestamp())
+    timestamp: float = field(default_factory=time.time)
     
     # 元数据
     metadata: Dict[str, Any] = field(default_factory=dict)
@@ -137,12 +176,21 @@ class MetricRecord:
             "metadata": self.metadata
         }
     
+    def to_bytes(self) -> bytes:
+        """转换为紧凑的 UTF-8 JSON 字节，可直接作为 Kafka 消息体"""
+        # to_dict 是按字段写死的字典字面量，比 orjson 遍历 slots dataclass 字段更快
+        return orjson.dumps(self.to_dict(), option=_ORJSON_OPTS)
+    
     def to_json(self) -> str:
         """转换为 JSON 格式"""
-        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2)
+        return self.to_bytes().decode("utf-8")
+    
+    def to_msgpack(self) -> bytes:
+        """转换为 msgpack 格式，字段与 to_dict 一致（需要安装 msgspec）"""
+        return _encode_msgpack(self)
 
 
-@dataclass
+@dataclass(slots=True)
 class EventRecord:
     """事件记录数据结构 - events topic"""
     # 基础信息
@@ -155,7 +203,7 @@ class EventRecord:
     event_data: Dict[str, Any] = field(default_factory=dict)
     
     # 时间信息
-    timestamp: float = field(default_factory=lambda: datetime.now().timestamp())
+    timestamp: float = field(default_factory=time.time)
     
     # 严重程度
     severity: str = "info"  # debug, info, warning, error, critical
@@ -167,7 +215,7 @@ class EventRecord:
         """转换为字典格式"""
         return {
             "event_id": self.event_id,
-            "event_type": self.event_type.value,
+            "event_type": self.event_type,
             "session_id": self.session_id,
             "execution_id": self.execution_id,
             "event_data": self.event_data,
@@ -176,93 +224,138 @@ class EventRecord:
             "metadata": self.metadata
         }
     
+    def to_bytes(self) -> bytes:
+        """转换为紧凑的 UTF-8 JSON 字节，可直接作为 Kafka 消息体"""
+        # to_dict 是按字段写死的字典字面量，比 orjson 遍历 slots dataclass 字段更快
+        return orjson.dumps(self.to_dict(), option=_ORJSON_OPTS)
+    
     def to_json(self) -> str:
         """转换为 JSON 格式"""
-        return json.dumps(self.to_dict(), ensure_ascii=False, indent=2) 
+        return self.to_bytes().decode("utf-8")
+    
+    def to_msgpack(self) -> bytes:
+        """转换为 msgpack 格式，字段与 to_dict 一致（需要安装 msgspec）"""
+        return _encode_msgpack(self) 
+
+
+def serialize_batch(records: Iterable[Any], fmt: str = "json") -> List[bytes]:
+    """批量序列化记录，供生产者在一个 linger 窗口内一次性入队发送
+    
+    Args:
+        records: ExecutionRecord / MetricRecord / EventRecord 实例
+        fmt: 序列化格式，"json" 或 "msgpack"（需要安装 msgspec）
+    
+    Returns:
+        与输入顺序一致的消息体字节列表
+    """
+    if fmt == "json":
+        dumps = orjson.dumps
+        return [dumps(record.to_dict(), option=_ORJSON_OPTS) for record in records]
+    if fmt == "msgpack":
+        if _MSGPACK_ENCODER is None:
+            raise RuntimeError("msgspec 未安装，无法使用 msgpack 编码")
+        encode = _MSGPACK_ENCODER.encode
+        return [encode(record) for record in records]
+    raise ValueError(f"不支持的序列化格式: {fmt}")
+
+
+# Topic 创建脚本模板
+_SCRIPT_HEADER = """#!/bin/bash
+# Kafka Topic 创建脚本
+# 用于创建 JollyAgent 监控系统的 Topic
+
+KAFKA_HOME=${KAFKA_HOME:-/opt/kafka}
+KAFKA_BROKERS=${KAFKA_BROKERS:-localhost:9092}
+
+echo '开始创建 JollyAgent 监控系统 Topic...'
+
+"""
+
+_TOPIC_CREATE_TEMPLATE = """echo '创建 Topic: {name}'
+$KAFKA_HOME/bin/kafka-topics.sh --create \\
+  --bootstrap-server $KAFKA_BROKERS \\
+  --topic {name} \\
+  --partitions {partitions} \\
+  --replication-factor {replication_factor} \\
+  --config retention.ms={retention_ms} \\
+  --config cleanup.policy={cleanup_policy} \\
+  --config compression.type={compression_type}
+
+"""
+
+_SCRIPT_FOOTER = """echo 'Topic 创建完成！'
+echo '列出所有 Topic:'
+$KAFKA_HOME/bin/kafka-topics.sh --list --bootstrap-server $KAFKA_BROKERS"""
+
+
+# Topic 定义（只读目录，模块加载时构建一次，所有 KafkaTopicDesign 实例共享）
+_TOPICS: Mapping[TopicType, Mapping[str, Any]] = MappingProxyType({
+    TopicType.EXECUTIONS: MappingProxyType({
+        "name": "jollyagent.executions",
+        "partitions": 3,
+        "replication_factor": 2,
+        "retention_ms": 7 * 24 * 60 * 60 * 1000,  # 7天
+        "cleanup_policy": "delete",
+        # 记录较大且字段名重复多，zstd 压缩率明显优于 lz4
+        "compression_type": "zstd",
+        "description": "Agent 执行记录，包含完整的执行流程和结果"
+    }),
+    TopicType.METRICS: MappingProxyType({
+        "name": "jollyagent.metrics",
+        "partitions": 5,
+        "replication_factor": 2,
+        "retention_ms": 30 * 24 * 60 * 60 * 1000,  # 30天
+        "cleanup_policy": "delete",
+        # 消息小而频繁，snappy 的生产端吞吐更高
+        "compression_type": "snappy",
+        "description": "性能指标数据，用于实时监控和告警"
+    }),
+    TopicType.EVENTS: MappingProxyType({
+        "name": "jollyagent.events",
+        "partitions": 3,
+        "replication_factor": 2,
+        "retention_ms": 7 * 24 * 60 * 60 * 1000,  # 7天
+        "cleanup_policy": "delete",
+        "compression_type": "zstd",
+        "description": "系统事件日志，用于审计和调试"
+    }),
+})
+
+# 按名称索引的 Topic 配置
+_TOPICS_BY_NAME: Mapping[str, Mapping[str, Any]] = MappingProxyType(
+    {topic_type.value: config for topic_type, config in _TOPICS.items()}
+)
+
+_EMPTY_TOPIC_CONFIG: Mapping[str, Any] = MappingProxyType({})
 
 
 class KafkaTopicDesign:
     """Kafka Topic 设计类"""
     
     def __init__(self):
-        self.topics = {
-            TopicType.EXECUTIONS: {
-                "name": "jollyagent.executions",
-                "partitions": 3,
-                "replication_factor": 2,
-                "retention_ms": 7 * 24 * 60 * 60 * 1000,  # 7天
-                "cleanup_policy": "delete",
-                "compression_type": "lz4",
-                "description": "Agent 执行记录，包含完整的执行流程和结果"
-            },
-            TopicType.METRICS: {
-                "name": "jollyagent.metrics",
-                "partitions": 5,
-                "replication_factor": 2,
-                "retention_ms": 30 * 24 * 60 * 60 * 1000,  # 30天
-                "cleanup_policy": "delete",
-                "compression_type": "lz4",
-                "description": "性能指标数据，用于实时监控和告警"
-            },
-            TopicType.EVENTS: {
-                "name": "jollyagent.events",
-                "partitions": 3,
-                "replication_factor": 2,
-                "retention_ms": 7 * 24 * 60 * 60 * 1000,  # 7天
-                "cleanup_policy": "delete",
-                "compression_type": "lz4",
-                "description": "系统事件日志，用于审计和调试"
-            }
-        }
+        self.topics = _TOPICS
     
-    def get_topic_config(self, topic_type: TopicType) -> Dict[str, Any]:
-        """获取指定 Topic 的配置"""
-        return self.topics.get(topic_type, {})
+    def get_topic_config(self, topic_type: TopicType) -> Mapping[str, Any]:
+        """获取指定 Topic 的配置（只读）"""
+        return self.topics.get(topic_type, _EMPTY_TOPIC_CONFIG)
     
-    def get_all_topics(self) -> Dict[str, Dict[str, Any]]:
-        """获取所有 Topic 配置"""
-        return {topic_type.value: config for topic_type, config in self.topics.items()}
+    def get_all_topics(self) -> Mapping[str, Mapping[str, Any]]:
+        """获取所有 Topic 配置（只读）"""
+        return _TOPICS_BY_NAME
     
     def create_topic_config_script(self) -> str:
         """生成 Kafka Topic 创建脚本"""
-        script_lines = [
-            "#!/bin/bash",
-            "# Kafka Topic 创建脚本",
-            "# 用于创建 JollyAgent 监控系统的 Topic",
-            "",
-            "KAFKA_HOME=${KAFKA_HOME:-/opt/kafka}",
-            "KAFKA_BROKERS=${KAFKA_BROKERS:-localhost:9092}",
-            "",
-            "echo '开始创建 JollyAgent 监控系统 Topic...'",
-            ""
-        ]
-        
-        for topic_type, config in self.topics.items():
-            script_lines.extend([
-                f"echo '创建 Topic: {config['name']}'",
-                f"$KAFKA_HOME/bin/kafka-topics.sh --create \\",
-                f"  --bootstrap-server $KAFKA_BROKERS \\",
-                f"  --topic {config['name']} \\",
-                f"  --partitions {config['partitions']} \\",
-                f"  --replication-factor {config['replication_factor']} \\",
-                f"  --config retention.ms={config['retention_ms']} \\",
-                f"  --config cleanup.policy={config['cleanup_policy']} \\",
-                f"  --config compression.type={config['compression_type']}",
-                ""
-            ])
-        
-        script_lines.extend([
-            "echo 'Topic 创建完成！'",
-            "echo '列出所有 Topic:'",
-            "$KAFKA_HOME/bin/kafka-topics.sh --list --bootstrap-server $KAFKA_BROKERS"
-        ])
-        
-        return "\n".join(script_lines)
+        topic_blocks = "".join(
+            _TOPIC_CREATE_TEMPLATE.format_map(config) for config in self.topics.values()
+        )
+        return _SCRIPT_HEADER + topic_blocks + _SCRIPT_FOOTER
 
 
 # 预定义的指标名称
 class MetricNames:
     """预定义的指标名称"""
+    # 名称均为仅含字母、数字和下划线的字面量，CPython 编译时已自动驻留，
+    # 作为 labels/headers 字典键比较时走身份比较，无需再 sys.intern
     # 执行相关指标
     EXECUTION_DURATION = "execution_duration"
     EXECUTION_SUCCESS_RATE = "execution_success_rate"
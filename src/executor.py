@@ -2,8 +2,12 @@
 
 import asyncio
 import logging
+import sys
 from typing import Any, Dict, List, Optional, Type
 
+import orjson
+
+from src.config import get_config
 from src.tools.base import Tool, ToolResult, ToolSchema
 
 logger = logging.getLogger(__name__)
@@ -16,18 +20,23 @@ class ToolExecutor:
         """初始化工具执行器."""
         self.tools: Dict[str, Tool] = {}
         self.tool_classes: Dict[str, Type[Tool]] = {}
+        # 工具模式缓存，注册/注销/清空时失效
+        self._schema_cache: Optional[List[Dict[str, Any]]] = None
+        self._schema_cache_json: Optional[bytes] = None
         logger.info("ToolExecutor initialized")
     
     def register_tool(self, tool_class: Type[Tool]) -> None:
         """注册工具类."""
         tool_instance = tool_class()
-        tool_name = tool_instance.schema.name
+        # 驻留工具名，热路径上的 dict 查找可走身份比较
+        tool_name = sys.intern(tool_instance.schema.name)
         
         if tool_name in self.tools:
             logger.warning(f"Tool {tool_name} already registered, overwriting")
         
         self.tools[tool_name] = tool_instance
         self.tool_classes[tool_name] = tool_class
+        self._invalidate_schema_cache()
         logger.info(f"Registered tool: {tool_name}")
     
     def register_tools(self, tool_classes: List[Type[Tool]]) -> None:
@@ -44,8 +53,21 @@ class ToolExecutor:
         return list(self.tools.keys())
     
     def get_tool_schemas(self) -> List[Dict[str, Any]]:
-        """获取所有工具的模式定义."""
-        return [tool.get_schema_dict() for tool in self.tools.values()]
+        """获取所有工具的模式定义（缓存结果，调用方不应修改）."""
+        if self._schema_cache is None:
+            self._schema_cache = [tool.get_schema_dict() for tool in self.tools.values()]
+        return self._schema_cache
+    
+    def get_tool_schemas_json(self) -> bytes:
+        """获取所有工具模式定义的预序列化 JSON."""
+        if self._schema_cache_json is None:
+            self._schema_cache_json = orjson.dumps(self.get_tool_schemas())
+        return self._schema_cache_json
+    
+    def _invalidate_schema_cache(self) -> None:
+        """使工具模式缓存失效."""
+        self._schema_cache = None
+        self._schema_cache_json = None
     
     def get_tool_schema(self, name: str) -> Optional[Dict[str, Any]]:
         """获取指定工具的模式定义."""
@@ -84,23 +106,31 @@ class ToolExecutor:
             )
     
     async def execute_tools(self, tool_calls: List[Dict[str, Any]]) -> List[ToolResult]:
-        """批量执行工具."""
-        results = []
-        for tool_call in tool_calls:
+        """批量执行工具（并发执行，结果顺序与 tool_calls 一致）."""
+        semaphore = asyncio.Semaphore(get_config().max_concurrent_requests)
+
+        async def run(name: str, arguments: Dict[str, Any]) -> ToolResult:
+            async with semaphore:
+                return await self.execute_tool(name, **arguments)
+
+        results: List[Optional[ToolResult]] = [None] * len(tool_calls)
+        indices = []
+        coros = []
+        for index, tool_call in enumerate(tool_calls):
             name = tool_call.get('name')
-            arguments = tool_call.get('arguments', {})
-            
             if not name:
-                results.append(ToolResult(
+                results[index] = ToolResult(
                     success=False,
                     result=None,
                     error="Tool name is required"
-                ))
+                )
                 continue
-            
-            result = await self.execute_tool(name, **arguments)
-            results.append(result)
-        
+            indices.append(index)
+            coros.append(run(name, tool_call.get('arguments', {})))
+
+        for index, result in zip(indices, await asyncio.gather(*coros)):
+            results[index] = result
+
         return results
     
     def get_dangerous_tools(self) -> List[str]:
@@ -122,6 +152,7 @@ class ToolExecutor:
         if name in self.tools:
             del self.tools[name]
             del self.tool_classes[name]
+            self._invalidate_schema_cache()
             logger.info(f"Unregistered tool: {name}")
             return True
         return False
@@ -130,6 +161,7 @@ class ToolExecutor:
         """清空所有工具."""
         self.tools.clear()
         self.tool_classes.clear()
+        self._invalidate_schema_cache()
         logger.info("Cleared all tools")
 
 
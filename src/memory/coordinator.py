@@ -1,27 +1,47 @@
 """分层记忆协调器实现."""
 
+import asyncio
 import logging
-from typing import Any, Dict, List, Optional, Union
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Set, Union
 from uuid import uuid4
 from datetime import datetime
 
-from pydantic import BaseModel, Field
-
 from src.memory.manager import MemoryManager, MemoryItem
 from src.memory.short_term import ShortTermMemoryManager, ShortTermMessage
 from src.memory.long_term import LongTermMemoryManager
 
 logger = logging.getLogger(__name__)
 
+# 记忆模式（内部用整数比较，仅在对外/日志时转换为名称）
+_MODE_SHORT, _MODE_LONG = 0, 1
+_MODE_NAMES = ("short", "long")
+
+
+def _to_memory_item(message: ShortTermMessage) -> MemoryItem:
+    """将短期记忆消息转换为记忆项.
+
+    短期消息的时间戳为epoch秒，在此转换为datetime；元数据可能为 None，
+    而 MemoryItem 要求字典，这里替换为空字典。
+    """
+    return MemoryItem(
+        id=message.id,
+        content=message.content,
+        role=message.role,
+        timestamp=datetime.fromtimestamp(message.timestamp),
+        metadata=message.metadata or {},
+    )
+
 
-class MemoryContext(BaseModel):
-    """记忆上下文模型."""
+@dataclass(slots=True)
+class MemoryContext:
+    """记忆上下文（每次获取时构建、随即消费，字段均已在上游校验）."""
     
-    conversation_id: str = Field(..., description="会话ID")
-    short_term_messages: List[ShortTermMessage] = Field(default_factory=list, description="短期记忆消息")
-    conversation_summary: Optional[str] = Field(default=None, description="会话摘要")
-    relevant_memories: List[MemoryItem] = Field(default_factory=list, description="相关长期记忆")
-    memory_mode: str = Field(default="short", description="记忆模式：short/long/hybrid")
+    conversation_id: str  # 会话ID
+    short_term_messages: List[ShortTermMessage] = field(default_factory=list)  # 短期记忆消息
+    conversation_summary: Optional[str] = None  # 会话摘要
+    relevant_memories: List[MemoryItem] = field(default_factory=list)  # 相关长期记忆
+    memory_mode: str = "short"  # 记忆模式：short/long/hybrid
 
 
 class LayeredMemoryCoordinator(MemoryManager):
@@ -43,21 +63,25 @@ class LayeredMemoryCoordinator(MemoryManager):
         self.current_conversation_id: Optional[str] = None
         self.conversation_message_count = 0
         
+        # 后台长期记忆写入任务（close 时等待完成）
+        self._bg_tasks: Set[asyncio.Task] = set()
+        
         logger.info(f"LayeredMemoryCoordinator initialized: threshold={self.conversation_length_threshold}")
     
     async def initialize(self) -> None:
-        """初始化分层记忆协调器."""
-        await self.short_term_manager.initialize()
-        await self.long_term_manager.initialize()
+        """初始化分层记忆协调器（幂等，重复调用直接返回）."""
+        if self._is_initialized:
+            return
+        await asyncio.gather(
+            self.short_term_manager.initialize(),
+            self.long_term_manager.initialize(),
+        )
         self._is_initialized = True
         logger.info("LayeredMemoryCoordinator initialized successfully")
     
-    def _determine_memory_mode(self, conversation_id: str, message_count: int) -> str:
-        """确定记忆模式."""
-        if message_count <= self.conversation_length_threshold:
-            return "short"  # 短对话模式
-        else:
-            return "long"   # 长对话模式
+    def _determine_memory_mode(self, conversation_id: str, message_count: int) -> int:
+        """确定记忆模式：超过阈值为长对话模式，否则为短对话模式."""
+        return _MODE_LONG if message_count > self.conversation_length_threshold else _MODE_SHORT
     
     async def add_memory(self, content: str, role: str, metadata: Optional[Dict[str, Any]] = None) -> str:
         """添加记忆到合适的层级."""
@@ -75,15 +99,33 @@ class LayeredMemoryCoordinator(MemoryManager):
         # 根据对话长度决定是否添加到长期记忆
         memory_mode = self._determine_memory_mode(self.current_conversation_id or "", self.conversation_message_count)
         
-        if memory_mode == "long":
-            # 长对话模式：同时添加到长期记忆
-            long_term_id = await self.long_term_manager.add_memory(content, role, metadata)
-            logger.debug(f"Added memory to both layers: short={short_term_id}, long={long_term_id}")
+        if memory_mode == _MODE_LONG:
+            # 长对话模式：同时添加到长期记忆（后台写入，不阻塞调用方）
+            task = asyncio.create_task(self.long_term_manager.add_memory(content, role, metadata))
+            self._bg_tasks.add(task)
+            task.add_done_callback(self._on_long_term_write_done)
+            logger.debug(f"Added memory to short-term, long-term write scheduled: {short_term_id}")
         else:
             logger.debug(f"Added memory to short-term only: {short_term_id}")
         
         return short_term_id
     
+    def _on_long_term_write_done(self, task: asyncio.Task) -> None:
+        """后台长期记忆写入完成回调."""
+        self._bg_tasks.discard(task)
+        if task.cancelled():
+            return
+        exc = task.exception()
+        if exc is not None:
+            logger.error(f"Failed to add long-term memory: {exc}")
+        else:
+            logger.debug(f"Added long-term memory: {task.result()}")
+    
+    async def _wait_background_writes(self) -> None:
+        """等待尚未完成的后台长期记忆写入（失败由完成回调记录）."""
+        if self._bg_tasks:
+            await asyncio.gather(*self._bg_tasks, return_exceptions=True)
+    
     async def get_memory_context(self, conversation_id: str, query: str = "") -> MemoryContext:
         """获取记忆上下文."""
         if not self._is_initialized:
@@ -92,18 +134,19 @@ class LayeredMemoryCoordinator(MemoryManager):
         # 确定记忆模式
         memory_mode = self._determine_memory_mode(conversation_id, self.conversation_message_count)
         
-        # 获取短期记忆
-        short_term_messages = await self.short_term_manager.get_recent_messages(self.short_term_rounds)
-        
-        # 获取会话摘要
-        conversation_summary = await self.long_term_manager.get_conversation_summary(conversation_id)
+        # 并发获取短期记忆、会话摘要和相关长期记忆（三者互不依赖）
+        short_term_fut = self.short_term_manager.get_recent_messages(self.short_term_rounds)
+        summary_fut = self.long_term_manager.get_conversation_summary(conversation_id)
         
-        # 获取相关长期记忆（跨对话ID搜索）
         relevant_memories = []
         if query:
             # 不限制对话ID，搜索所有相关记忆
-            search_result = await self.long_term_manager.search_memory_with_summary(
-                query, None, limit=5  # 移除conversation_id限制
+            short_term_messages, conversation_summary, search_result = await asyncio.gather(
+                short_term_fut,
+                summary_fut,
+                self.long_term_manager.search_memory_with_summary(
+                    query, None, limit=5  # 移除conversation_id限制
+                ),
             )
             relevant_memories = search_result.get("vector_memories", [])
             
@@ -119,16 +162,18 @@ class LayeredMemoryCoordinator(MemoryManager):
                     metadata={"type": "conversation_summary", "conversation_id": conversation_id}
                 )
                 relevant_memories.insert(0, summary_memory)  # 将摘要放在最前面
+        else:
+            short_term_messages, conversation_summary = await asyncio.gather(short_term_fut, summary_fut)
         
         context = MemoryContext(
             conversation_id=conversation_id,
             short_term_messages=short_term_messages,
             conversation_summary=conversation_summary,
             relevant_memories=relevant_memories,
-            memory_mode=memory_mode
+            memory_mode=_MODE_NAMES[memory_mode]
         )
         
-        logger.debug(f"Generated memory context: mode={memory_mode}, short_messages={len(short_term_messages)}, relevant_memories={len(relevant_memories)}")
+        logger.debug(f"Generated memory context: mode={context.memory_mode}, short_messages={len(short_term_messages)}, relevant_memories={len(relevant_memories)}")
         return context
     
     async def generate_conversation_summary(self, conversation_id: str, messages: List[Dict[str, Any]]) -> str:
@@ -146,20 +191,11 @@ class LayeredMemoryCoordinator(MemoryManager):
         # 根据当前对话长度选择搜索策略
         memory_mode = self._determine_memory_mode(self.current_conversation_id or "", self.conversation_message_count)
         
-        if memory_mode == "short":
+        if memory_mode == _MODE_SHORT:
             # 短对话模式：主要搜索短期记忆
             short_term_results = await self.short_term_manager.search_memory(query, limit)
             # 转换为MemoryItem格式
-            memory_items = []
-            for msg in short_term_results:
-                memory_items.append(MemoryItem(
-                    id=msg.id,
-                    content=msg.content,
-                    role=msg.role,
-                    timestamp=msg.timestamp,
-                    metadata=msg.metadata
-                ))
-            return memory_items
+            return [_to_memory_item(msg) for msg in short_term_results]
         else:
             # 长对话模式：主要搜索长期记忆
             return await self.long_term_manager.search_relevant_memories(query, limit)
@@ -197,8 +233,10 @@ class LayeredMemoryCoordinator(MemoryManager):
         if not self._is_initialized:
             await self.initialize()
         
-        short_term_stats = await self.short_term_manager.get_memory_stats()
-        long_term_stats = await self.long_term_manager.get_memory_stats()
+        short_term_stats, long_term_stats = await asyncio.gather(
+            self.short_term_manager.get_memory_stats(),
+            self.long_term_manager.get_memory_stats(),
+        )
         
         return {
             "coordinator": {
@@ -216,8 +254,12 @@ class LayeredMemoryCoordinator(MemoryManager):
         if not self._is_initialized:
             await self.initialize()
         
-        short_term_count = await self.short_term_manager.clear_memories()
-        long_term_count = await self.long_term_manager.clear_memories()
+        # 先等待后台写入完成，否则在途的写入会在清空之后落盘
+        await self._wait_background_writes()
+        short_term_count, long_term_count = await asyncio.gather(
+            self.short_term_manager.clear_memories(),
+            self.long_term_manager.clear_memories(),
+        )
         
         total_count = short_term_count + long_term_count
         logger.info(f"Cleared all memories: short_term={short_term_count}, long_term={long_term_count}")
@@ -229,13 +271,7 @@ class LayeredMemoryCoordinator(MemoryManager):
         # 先尝试从短期记忆获取
         short_term_memory = await self.short_term_manager.get_memory(memory_id)
         if short_term_memory:
-            return MemoryItem(
-                id=short_term_memory.id,
-                content=short_term_memory.content,
-                role=short_term_memory.role,
-                timestamp=short_term_memory.timestamp,
-                metadata=short_term_memory.metadata
-            )
+            return _to_memory_item(short_term_memory)
         
         # 再从长期记忆获取
         return await self.long_term_manager.get_memory(memory_id)
@@ -261,16 +297,7 @@ class LayeredMemoryCoordinator(MemoryManager):
     async def list_memories(self, limit: int = 100, offset: int = 0) -> List[MemoryItem]:
         """列出记忆项（优先返回短期记忆）."""
         short_term_memories = await self.short_term_manager.list_memories(limit, offset)
-        memory_items = []
-        
-        for msg in short_term_memories:
-            memory_items.append(MemoryItem(
-                id=msg.id,
-                content=msg.content,
-                role=msg.role,
-                timestamp=msg.timestamp,
-                metadata=msg.metadata
-            ))
+        memory_items = [_to_memory_item(msg) for msg in short_term_memories]
         
         # 如果短期记忆不够，补充长期记忆
         if len(memory_items) < limit:
@@ -282,7 +309,11 @@ class LayeredMemoryCoordinator(MemoryManager):
     
     async def close(self) -> None:
         """关闭分层记忆协调器."""
-        await self.short_term_manager.close()
-        await self.long_term_manager.close()
+        # 等待尚未完成的长期记忆写入
+        await self._wait_background_writes()
+        await asyncio.gather(
+            self.short_term_manager.close(),
+            self.long_term_manager.close(),
+        )
         self._is_initialized = False
         logger.info("LayeredMemoryCoordinator closed") 
\ No newline at end of file
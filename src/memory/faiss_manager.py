@@ -1,21 +1,98 @@
 """基于FAISS的记忆管理器实现."""
 
-import json
+import asyncio
+import hashlib
+import itertools
 import logging
 import os
+import re
+import sqlite3
 import time
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
+from uuid import uuid4
 
+import aiohttp
 import faiss
 import numpy as np
+import orjson
 from openai import OpenAI
 
 from src.memory.manager import MemoryItem, MemoryQuery, MemoryResult, MemoryManager
 
 logger = logging.getLogger(__name__)
 
+# 记忆存储表：嵌入以float32原始字节存储（1024维约4KB，JSON文本约15KB）
+_CREATE_TABLE_SQL = """
+CREATE TABLE IF NOT EXISTS memories (
+    id TEXT PRIMARY KEY,
+    content TEXT NOT NULL,
+    role TEXT NOT NULL,
+    ts REAL NOT NULL,
+    metadata TEXT NOT NULL,
+    embedding BLOB
+)
+"""
+
+# 嵌入缓存表：按内容哈希保存API返回的嵌入，重启后相同文本无需再次请求。
+# 独立于 memories 表，因为不同记忆项可以有相同内容
+_CREATE_EMBEDDING_CACHE_SQL = """
+CREATE TABLE IF NOT EXISTS embedding_cache (
+    hash BLOB PRIMARY KEY,
+    embedding BLOB NOT NULL
+)
+"""
+
+# 量化编码索引（SQ8、PQ等）开始训练所需的最少向量数，之前使用精确的Flat索引
+_MIN_TRAIN_VECTORS = 1024
+
+# GPU索引的查询合并窗口：单条查询在GPU上受传输开销限制，
+# 同一窗口内的并发查询合并为一次批量搜索
+_SEARCH_BATCH_WINDOW = 0.005
+_SEARCH_BATCH_MAX = 64
+
+# 使用 UPSERT 保留已有行的 rowid，加载顺序与写入顺序一致
+_UPSERT_SQL = """
+INSERT INTO memories (id, content, role, ts, metadata, embedding)
+VALUES (?, ?, ?, ?, ?, ?)
+ON CONFLICT(id) DO UPDATE SET
+    content = excluded.content,
+    role = excluded.role,
+    ts = excluded.ts,
+    metadata = excluded.metadata,
+    embedding = excluded.embedding
+"""
+
+
+@dataclass(slots=True)
+class _StoredMemory:
+    """记忆项的内部表示.
+    
+    嵌入存放在管理器的连续缓冲区中，时间戳为epoch秒；
+    只在返回给调用方时转换为 MemoryItem，加载/保存/修剪都不经过pydantic校验。
+    """
+    id: str
+    content: str
+    role: str
+    ts: float
+    metadata: Dict[str, Any]
+    
+    def to_item(self, embedding: Optional[List[float]] = None,
+                similarity_score: Optional[float] = None) -> MemoryItem:
+        """转换为对外的 MemoryItem."""
+        return MemoryItem(
+            id=self.id,
+            content=self.content,
+            role=self.role,
+            timestamp=datetime.fromtimestamp(self.ts),
+            metadata=self.metadata,
+            embedding=embedding,
+            similarity_score=similarity_score
+        )
+
 
 class FAISSMemoryManager(MemoryManager):
     """基于FAISS的记忆管理器."""
@@ -26,25 +103,67 @@ class FAISSMemoryManager(MemoryManager):
         
         # 配置参数
         self.persist_directory = config.get("persist_directory", "./memory_db")
-        self.index_type = config.get("index_type", "IVF100,Flat")
+        self.index_type = config.get("index_type", "Flat")
         self.embedding_dimension = config.get("embedding_dimension", 1024)  # 更新默认维度
         self.embedding_model = config.get("embedding_model", "BAAI/bge-large-zh-v1.5")
         self.max_memory_items = config.get("max_memory_items", 1000)
         self.similarity_threshold = config.get("similarity_threshold", 0.7)
+        self.nprobe = config.get("nprobe", 8)
+        # FAISS的OpenMP线程数：交互式单条查询用1最快，批量写入/搜索可调大
+        self.faiss_threads = config.get("faiss_threads") or max(1, (os.cpu_count() or 1) // 2)
+        self.embedding_cache_size = config.get("embedding_cache_size", 4096)
+        self.use_gpu = config.get("use_gpu", False)
+        
+        # 训练所需的向量数只取决于索引类型，初始化时计算一次；
+        # 记忆上限达不到该数量时索引永远不会训练，直接使用Flat索引
+        self._train_threshold = self._compute_train_threshold(self._new_factory_index())
+        if self._train_threshold > self.max_memory_items:
+            logger.warning(
+                f"Index type {self.index_type} needs {self._train_threshold} training vectors "
+                f"but max_memory_items is {self.max_memory_items}, falling back to FlatIP"
+            )
+            self.index_type = "Flat"
+            self._train_threshold = 0
         
         # FAISS索引和存储
         self.index = None
-        self.memory_items: Dict[str, MemoryItem] = {}
+        self._index_trained = False
+        self._needs_training = False
+        
+        # GPU资源（use_gpu 且有可用GPU时创建，需在索引存活期间保持引用）及查询合并队列
+        self._gpu_res = None
+        self._pending_searches: List[tuple] = []
+        self._search_flush: Optional[asyncio.TimerHandle] = None
+        # 字典顺序即时间顺序（从旧到新）：加载时按时间排序，新增追加到末尾，
+        # 更新时移到末尾，列出最新/修剪最旧的记忆都无需排序
+        self.memory_items: Dict[str, _StoredMemory] = {}
         self.memory_ids: List[str] = []
         
+        # 嵌入向量缓冲区（SoA布局）：第 i 行是 memory_ids[i] 的归一化嵌入，
+        # 与索引中的位置一一对应；记忆项本身不再持有嵌入列表
+        self._emb = np.empty((0, self.embedding_dimension), dtype=np.float32)
+        self._row_of: Dict[str, int] = {}
+        
+        # 索引中的稳定int64 ID（与缓冲区行号无关），支持按ID删除/替换单个向量
+        self._fid_of: Dict[str, int] = {}
+        self._id_of_fid: Dict[int, str] = {}
+        self._next_fid = itertools.count()
+        
+        # 嵌入LRU缓存：内容哈希 -> float32向量，重复文本不再请求API
+        self._emb_cache: "OrderedDict[bytes, np.ndarray]" = OrderedDict()
+        
         # 硅基流动API客户端（用于生成嵌入）
         self.api_key = config.get("openai_api_key")  # 使用相同的API密钥
         self.api_base_url = "https://api.siliconflow.cn/v1"
         
         # 文件路径
         self.db_path = Path(self.persist_directory)
-        self.index_file = self.db_path / "faiss.index"
-        self.metadata_file = self.db_path / "metadata.json"
+        self.sqlite_file = self.db_path / "memories.db"
+        self.metadata_file = self.db_path / "metadata.json"  # 旧版本的JSON存储，启动时迁移
+        self._conn: Optional[sqlite3.Connection] = None
+        
+        # 共享HTTP会话（首次请求时创建）
+        self._http: Optional[aiohttp.ClientSession] = None
         
         logger.info(f"FAISSMemoryManager initialized with config: {config}")
     
@@ -54,6 +173,9 @@ class FAISSMemoryManager(MemoryManager):
             # 创建目录
             self.db_path.mkdir(parents=True, exist_ok=True)
             
+            # FAISS线程数（进程级设置）
+            faiss.omp_set_num_threads(self.faiss_threads)
+            
             # 加载现有数据
             await self._load_existing_data()
             
@@ -68,140 +190,459 @@ class FAISSMemoryManager(MemoryManager):
             raise
     
     async def _load_existing_data(self) -> None:
-        """加载现有的记忆数据."""
+        """打开SQLite存储并加载现有的记忆数据."""
+        self._conn = sqlite3.connect(str(self.sqlite_file))
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(_CREATE_TABLE_SQL)
+        self._conn.execute(_CREATE_EMBEDDING_CACHE_SQL)
+        
         if self.metadata_file.exists():
-            try:
-                with open(self.metadata_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.memory_items = {
-                        item_id: MemoryItem(**item_data) 
-                        for item_id, item_data in data.get("memory_items", {}).items()
-                    }
-                    self.memory_ids = data.get("memory_ids", [])
-                logger.info(f"Loaded {len(self.memory_items)} existing memory items")
-            except Exception as e:
-                logger.warning(f"Failed to load existing data: {e}")
+            self._migrate_json_metadata()
+        
+        rows = self._conn.execute(
+            "SELECT id, content, role, ts, metadata, embedding FROM memories ORDER BY ts, rowid"
+        ).fetchall()
+        self.memory_items = {}
+        self.memory_ids = []
+        blobs = []
+        row_size = self.embedding_dimension * 4
+        for item_id, content, role, ts, metadata, embedding in rows:
+            if not embedding or len(embedding) != row_size:
+                logger.warning(f"Skipping memory item {item_id} without a valid embedding")
+                continue
+            self.memory_items[item_id] = _StoredMemory(item_id, content, role, ts, orjson.loads(metadata))
+            self.memory_ids.append(item_id)
+            blobs.append(embedding)
+        
+        # 所有嵌入一次性拼接为连续矩阵
+        self._emb = np.frombuffer(b"".join(blobs), dtype=np.float32).reshape(
+            len(blobs), self.embedding_dimension
+        ).copy()
+        faiss.normalize_L2(self._emb)
+        self._row_of = {memory_id: row for row, memory_id in enumerate(self.memory_ids)}
+        for memory_id in self.memory_ids:
+            self._assign_fid(memory_id)
+        logger.info(f"Loaded {len(self.memory_items)} existing memory items")
+    
+    def _migrate_json_metadata(self) -> None:
+        """将旧版本的 metadata.json 导入SQLite，成功后重命名为 .migrated."""
+        try:
+            data = orjson.loads(self.metadata_file.read_bytes())
+            items = data.get("memory_items", {})
+            ordered_ids = [item_id for item_id in data.get("memory_ids", []) if item_id in items]
+            listed = set(ordered_ids)
+            ordered_ids += [item_id for item_id in items if item_id not in listed]
+            legacy_items = [MemoryItem(**items[item_id]) for item_id in ordered_ids]
+            self._upsert_items(
+                [
+                    _StoredMemory(item.id, item.content, item.role, item.timestamp.timestamp(), item.metadata)
+                    for item in legacy_items
+                ],
+                [
+                    np.asarray(item.embedding, dtype=np.float32).tobytes() if item.embedding else None
+                    for item in legacy_items
+                ]
+            )
+            self.metadata_file.replace(self.metadata_file.with_suffix(".json.migrated"))
+            logger.info(f"Migrated {len(ordered_ids)} memory items from {self.metadata_file}")
+        except Exception as e:
+            logger.warning(f"Failed to migrate existing JSON data: {e}")
     
     async def _initialize_index(self) -> None:
-        """初始化FAISS索引."""
-        if self.index_file.exists() and len(self.memory_items) > 0:
-            # 加载现有索引
-            try:
-                self.index = faiss.read_index(str(self.index_file))
-                logger.info(f"Loaded existing FAISS index with {self.index.ntotal} vectors")
-            except Exception as e:
-                logger.warning(f"Failed to load existing index: {e}")
-                self._create_new_index()
-        else:
-            # 创建新索引
-            self._create_new_index()
+        """初始化FAISS索引（由SQLite中的嵌入重建）."""
+        await self._rebuild_index()
     
     def _create_new_index(self) -> None:
-        """创建新的FAISS索引."""
+        """创建新的FAISS索引.
+        
+        向量在写入和查询前都做L2归一化，索引使用内积度量，内积即余弦相似度。
+        索引以 IndexIDMap2 包装（IVF索引本身支持自定义ID），
+        向量按稳定ID写入，单条更新/删除无需重建。
+        需要训练的索引（IVF、SQ8、PQ等）优先加载已持久化的训练结果，
+        否则在向量足够之前先用精确的Flat内积索引。
+        """
         dimension = self.embedding_dimension
+        self._index_trained = False
+        
+        base_index = self._new_factory_index()
+        self._needs_training = not base_index.is_trained
+        if self._needs_training:
+            trained_index = self._load_trained_index()
+            if trained_index is None:
+                self.index = self._to_device(faiss.IndexIDMap2(faiss.IndexFlatIP(dimension)))
+                logger.info(f"Created new FlatIP index with dimension {dimension} ({self.index_type} pending training)")
+                return
+            base_index = trained_index
+            self._index_trained = True
+        
+        self.index = self._to_device(self._with_ids(base_index))
+        logger.info(f"Created new {self.index_type} index with dimension {dimension}")
+    
+    def _new_factory_index(self) -> faiss.Index:
+        """按 index_type 创建内积度量的索引，类型无效时回退到FlatIP."""
+        try:
+            return faiss.index_factory(self.embedding_dimension, self.index_type, faiss.METRIC_INNER_PRODUCT)
+        except RuntimeError as e:
+            logger.warning(f"Invalid index type {self.index_type}: {e}, falling back to FlatIP")
+            self.index_type = "Flat"
+            return faiss.IndexFlatIP(self.embedding_dimension)
+    
+    @staticmethod
+    def _with_ids(index: faiss.Index) -> faiss.Index:
+        """IVF索引直接支持自定义ID，其余索引以 IndexIDMap2 包装."""
+        try:
+            faiss.extract_index_ivf(index)
+            return index
+        except RuntimeError:
+            return faiss.IndexIDMap2(index)
+    
+    def _compute_train_threshold(self, index: faiss.Index) -> int:
+        """训练所需的向量数：IVF为 nlist*39，量化编码（SQ/PQ）至少 _MIN_TRAIN_VECTORS."""
+        threshold = 0
+        try:
+            threshold = faiss.extract_index_ivf(index).nlist * 39
+        except RuntimeError:
+            pass
+        if "SQ" in self.index_type or "PQ" in self.index_type:
+            threshold = max(threshold, _MIN_TRAIN_VECTORS)
+        return threshold
+    
+    def _tune_ivf(self, index: faiss.Index) -> None:
+        """设置IVF搜索参数：nprobe，以及按倒排列表而不是按查询并行（parallel_mode=1）."""
+        try:
+            ivf_index = faiss.extract_index_ivf(index)
+        except RuntimeError:
+            return
+        ivf_index.nprobe = self.nprobe
+        ivf_index.parallel_mode = 1
+    
+    @property
+    def trained_index_file(self) -> Path:
+        """训练后的空索引（IVF质心、量化参数）的持久化路径，按索引类型和维度区分."""
+        key = re.sub(r"[^0-9A-Za-z]+", "_", self.index_type)
+        return self.db_path / f"trained_{key}_{self.embedding_dimension}.faiss"
+    
+    def _load_trained_index(self) -> Optional[faiss.Index]:
+        """加载已持久化的训练结果，避免每次启动重新训练."""
+        if not self.trained_index_file.exists():
+            return None
+        try:
+            index = faiss.read_index(str(self.trained_index_file))
+        except RuntimeError as e:
+            logger.warning(f"Failed to load trained index {self.trained_index_file}: {e}")
+            return None
+        if index.d != self.embedding_dimension or not index.is_trained:
+            return None
+        index.reset()
+        self._tune_ivf(index)
+        return index
+    
+    def _to_device(self, index: faiss.Index) -> faiss.Index:
+        """use_gpu 时将索引复制到GPU 0，无可用GPU时保留CPU索引."""
+        if not self.use_gpu:
+            return index
+        if self._gpu_res is None:
+            if not hasattr(faiss, "StandardGpuResources") or faiss.get_num_gpus() == 0:
+                logger.warning("use_gpu is set but no GPU is available, keeping the index on CPU")
+                self.use_gpu = False
+                return index
+            self._gpu_res = faiss.StandardGpuResources()
+        return faiss.index_cpu_to_gpu(self._gpu_res, 0, index)
+    
+    def _assign_fid(self, memory_id: str) -> int:
+        """为记忆项分配索引ID."""
+        fid = next(self._next_fid)
+        self._fid_of[memory_id] = fid
+        self._id_of_fid[fid] = memory_id
+        return fid
+    
+    def _release_fid(self, memory_id: str) -> int:
+        """释放记忆项的索引ID."""
+        fid = self._fid_of.pop(memory_id)
+        del self._id_of_fid[fid]
+        return fid
+    
+    def _fids_array(self) -> np.ndarray:
+        """按缓冲区行顺序排列的索引ID数组."""
+        return np.fromiter((self._fid_of[memory_id] for memory_id in self.memory_ids), dtype=np.int64)
+    
+    async def _remove_from_index(self, fids: List[int]) -> None:
+        """按ID从索引删除向量；索引类型不支持删除（如HNSW）时回退为重建."""
+        try:
+            self.index.remove_ids(np.asarray(fids, dtype=np.int64))
+        except RuntimeError:
+            await self._rebuild_index()
+    
+    @staticmethod
+    def _normalized(embedding: np.ndarray) -> np.ndarray:
+        """复制为 (1, d) 的float32矩阵并做L2归一化（嵌入可能是缓存中的只读向量，不能原地修改）."""
+        matrix = np.array(embedding, dtype=np.float32).reshape(1, -1)
+        faiss.normalize_L2(matrix)
+        return matrix
+    
+    def _append_vectors(self, memory_ids: List[str], embeddings: List[np.ndarray]) -> None:
+        """归一化后追加到嵌入缓冲区和索引，向量足够时将Flat索引升级为IVF索引."""
+        count = len(self.memory_ids)
+        needed = count + len(embeddings)
+        
+        # 容量不足时按倍数扩容
+        if needed > len(self._emb):
+            grown = np.empty((max(needed, 2 * len(self._emb), 16), self.embedding_dimension), dtype=np.float32)
+            grown[:count] = self._emb[:count]
+            self._emb = grown
+        # 直接写入缓冲区并原地归一化，不再额外分配临时矩阵
+        matrix = self._emb[count:needed]
+        matrix[:] = embeddings
+        faiss.normalize_L2(matrix)
+        
+        for offset, memory_id in enumerate(memory_ids):
+            self._row_of[memory_id] = count + offset
+        self.memory_ids.extend(memory_ids)
+        fids = np.fromiter((self._assign_fid(memory_id) for memory_id in memory_ids), dtype=np.int64)
+        
+        self.index.add_with_ids(matrix, fids)
+        self._maybe_train()
+    
+    def _remove_row(self, memory_id: str) -> None:
+        """从嵌入缓冲区移除一行（用最后一行填补空位）."""
+        row = self._row_of.pop(memory_id)
+        last = len(self.memory_ids) - 1
+        if row != last:
+            last_id = self.memory_ids[last]
+            self._emb[row] = self._emb[last]
+            self.memory_ids[row] = last_id
+            self._row_of[last_id] = row
+        self.memory_ids.pop()
+    
+    def _embedding_of(self, memory_id: str) -> Optional[List[float]]:
+        """获取记忆项的（归一化）嵌入."""
+        row = self._row_of.get(memory_id)
+        return None if row is None else self._emb[row].tolist()
+    
+    def _maybe_train(self) -> None:
+        """需要训练的索引：向量数达到阈值时训练，替换当前的Flat索引并持久化训练结果."""
+        if not self._needs_training or self._index_trained:
+            return
         
-        if "IVF" in self.index_type:
-            # IVF索引需要训练数据，先用Flat索引
-            self.index = faiss.IndexFlatL2(dimension)
-            logger.info(f"Created new FlatL2 index with dimension {dimension}")
-        elif "HNSW" in self.index_type:
-            # HNSW索引
-            self.index = faiss.IndexHNSWFlat(dimension, 32)  # 32是M参数
-            logger.info(f"Created new HNSW index with dimension {dimension}")
-        else:
-            # 默认使用Flat索引
-            self.index = faiss.IndexFlatL2(dimension)
-            logger.info(f"Created new FlatL2 index with dimension {dimension}")
-    
-    async def _call_siliconflow_api(self, text: str) -> Dict[str, Any]:
-        """调用硅基流动API生成嵌入."""
-        import json
-        import urllib.request
-        import urllib.parse
-        
-        url = f"{self.api_base_url}/embeddings"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        if self.index.ntotal < self._train_threshold:
+            return
+        
+        trained_index = self._new_factory_index()
+        matrix = self._emb[:len(self.memory_ids)]
+        trained_index.train(matrix)
+        self._tune_ivf(trained_index)
+        try:
+            faiss.write_index(trained_index, str(self.trained_index_file))
+        except RuntimeError as e:
+            logger.warning(f"Failed to save trained index: {e}")
+        
+        trained_index = self._with_ids(trained_index)
+        trained_index.add_with_ids(matrix, self._fids_array())
+        self.index = self._to_device(trained_index)
+        self._index_trained = True
+        logger.info(f"Trained {self.index_type} index with {len(matrix)} vectors")
+    
+    def _get_http_session(self) -> aiohttp.ClientSession:
+        """获取共享的HTTP会话（长连接复用，close 时关闭）."""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                headers={"Authorization": f"Bearer {self.api_key}"},
+                connector=aiohttp.TCPConnector(limit=32, keepalive_timeout=60),
+                json_serialize=lambda obj: orjson.dumps(obj).decode(),
+            )
+        return self._http
+    
+    async def _call_siliconflow_api(self, text: Union[str, List[str]]) -> Dict[str, Any]:
+        """调用硅基流动API生成嵌入（text 为列表时一次请求批量生成）."""
         data = {
             "model": self.embedding_model,
             "input": text
         }
-        
-        # 使用urllib进行同步调用，在异步函数中使用线程池
-        import asyncio
-        
-        def make_request():
-            req = urllib.request.Request(
-                url,
-                data=json.dumps(data).encode('utf-8'),
-                headers=headers,
-                method='POST'
-            )
-            
-            with urllib.request.urlopen(req) as response:
-                result = json.loads(response.read().decode('utf-8'))
-                return result
-        
-        # 在线程池中执行同步请求
-        loop = asyncio.get_event_loop()
-        result = await loop.run_in_executor(None, make_request)
-        return result
+        async with self._get_http_session().post(f"{self.api_base_url}/embeddings", json=data) as response:
+            response.raise_for_status()
+            # 嵌入响应是大量浮点数，用 orjson 解析
+            return await response.json(loads=orjson.loads)
     
-    async def _get_embedding(self, text: str) -> List[float]:
-        """获取文本的向量嵌入."""
+    def _fallback_embedding(self, text: str) -> np.ndarray:
+        """生成随机向量作为嵌入（无API密钥或API调用失败时使用）."""
+        # 由内容哈希得到种子（不受进程级 hash() 随机化影响，跨进程一致），
+        # 使用独立的PCG64生成器而不是修改全局随机状态
+        seed = int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+        return np.random.default_rng(seed).standard_normal(self.embedding_dimension, dtype=np.float32)
+    
+    @staticmethod
+    def _content_hash(text: str) -> bytes:
+        """嵌入缓存的键."""
+        return hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+    
+    def _cached_embedding(self, key: bytes) -> Optional[np.ndarray]:
+        """查找缓存的嵌入：先查内存LRU，再查SQLite缓存表."""
+        vec = self._emb_cache.get(key)
+        if vec is not None:
+            self._emb_cache.move_to_end(key)
+            return vec
+        if self._conn is None:
+            return None
+        row = self._conn.execute("SELECT embedding FROM embedding_cache WHERE hash = ?", (key,)).fetchone()
+        if row is None or len(row[0]) != self.embedding_dimension * 4:
+            return None
+        vec = np.frombuffer(row[0], dtype=np.float32)
+        self._remember_embedding(key, vec)
+        return vec
+    
+    def _remember_embedding(self, key: bytes, vec: np.ndarray) -> None:
+        """放入内存LRU缓存（只读，防止调用方原地修改），超出容量时淘汰最久未使用的项."""
+        vec.flags.writeable = False
+        self._emb_cache[key] = vec
+        self._emb_cache.move_to_end(key)
+        while len(self._emb_cache) > self.embedding_cache_size:
+            self._emb_cache.popitem(last=False)
+    
+    def _store_embeddings(self, entries: Dict[bytes, np.ndarray]) -> None:
+        """缓存API返回的嵌入（内存LRU + SQLite缓存表）."""
+        for key, vec in entries.items():
+            self._remember_embedding(key, vec)
+        if self._conn is None or not entries:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO embedding_cache (hash, embedding) VALUES (?, ?)",
+                    [(key, vec.tobytes()) for key, vec in entries.items()],
+                )
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save embedding cache: {e}")
+    
+    async def _get_embedding(self, text: str) -> np.ndarray:
+        """获取文本的向量嵌入（相同内容命中缓存时不请求API）."""
         if not self.api_key:
             # 如果没有API密钥，返回随机向量（仅用于测试）
             logger.warning("No API key available, using random embedding")
-            # 使用固定的随机种子确保测试的一致性
-            np.random.seed(hash(text) % 2**32)
-            return list(np.random.normal(0, 1, self.embedding_dimension))
+            return self._fallback_embedding(text)
+        
+        key = self._content_hash(text)
+        cached = self._cached_embedding(key)
+        if cached is not None:
+            return cached
         
         try:
             # 使用硅基流动API生成嵌入
             response = await self._call_siliconflow_api(text)
-            return response["data"][0]["embedding"]
+            vec = np.asarray(response["data"][0]["embedding"], dtype=np.float32)
         except Exception as e:
             logger.error(f"Failed to get embedding: {e}")
-            # 如果API调用失败，返回随机向量
-            np.random.seed(hash(text) % 2**32)
-            return list(np.random.normal(0, 1, self.embedding_dimension))
+            # 如果API调用失败，返回随机向量（不缓存）
+            return self._fallback_embedding(text)
+        
+        self._store_embeddings({key: vec})
+        return vec
+    
+    async def _get_embeddings_batch(self, texts: List[str]) -> List[np.ndarray]:
+        """批量获取文本的向量嵌入（未命中缓存的文本去重后一次API请求）."""
+        if not texts:
+            return []
+        
+        if not self.api_key:
+            logger.warning("No API key available, using random embeddings")
+            return [self._fallback_embedding(text) for text in texts]
+        
+        keys = [self._content_hash(text) for text in texts]
+        found: Dict[bytes, np.ndarray] = {}
+        missing: Dict[bytes, str] = {}
+        for key, text in zip(keys, texts):
+            if key in found or key in missing:
+                continue
+            cached = self._cached_embedding(key)
+            if cached is not None:
+                found[key] = cached
+            else:
+                missing[key] = text
+        
+        if missing:
+            try:
+                response = await self._call_siliconflow_api(list(missing.values()))
+                # 按 index 排序，保证与输入顺序一致
+                data = sorted(response["data"], key=lambda d: d.get("index", 0))
+                fetched = {
+                    key: np.asarray(d["embedding"], dtype=np.float32)
+                    for key, d in zip(missing, data)
+                }
+            except Exception as e:
+                logger.error(f"Failed to get batch embeddings: {e}")
+                return [found[key] if key in found else self._fallback_embedding(text)
+                        for key, text in zip(keys, texts)]
+            self._store_embeddings(fetched)
+            found.update(fetched)
+        
+        return [found[key] for key in keys]
     
     async def add_memory(self, content: str, role: str, metadata: Optional[Dict[str, Any]] = None) -> str:
         """添加记忆项."""
         if not self._is_initialized:
             await self.initialize()
         
-        # 创建记忆项
-        memory_item = MemoryItem(
-            content=content,
-            role=role,
-            metadata=metadata or {}
-        )
-        
         # 获取向量嵌入
         embedding = await self._get_embedding(content)
-        memory_item.embedding = embedding
         
-        # 添加到内存存储
+        # 等待嵌入之后再打时间戳：并发添加时字典顺序是完成顺序，须与ts顺序一致
+        memory_item = _StoredMemory(str(uuid4()), content, role, time.time(), metadata or {})
+        
+        # 添加到内存存储和FAISS索引
         self.memory_items[memory_item.id] = memory_item
-        self.memory_ids.append(memory_item.id)
+        self._append_vectors([memory_item.id], [embedding])
         
-        # 添加到FAISS索引
-        embedding_array = np.array([embedding], dtype=np.float32)
-        self.index.add(embedding_array)
+        # 保存到磁盘
+        self._upsert_items([memory_item])
         
         # 限制记忆数量
         if len(self.memory_items) > self.max_memory_items:
             await self._trim_memories()
         
-        # 保存到磁盘
-        await self._save_data()
-        
         logger.info(f"Added memory item: {memory_item.id}")
         return memory_item.id
     
+    async def add_conversation_memory(self, messages: List[Dict[str, Any]]) -> List[str]:
+        """批量添加对话记忆（一次嵌入请求、一次索引写入、一次落盘）."""
+        if not self._is_initialized:
+            await self.initialize()
+        
+        if not messages:
+            return []
+        
+        # 批量获取向量嵌入
+        contents = [message.get("content", "") for message in messages]
+        embeddings = await self._get_embeddings_batch(contents)
+        
+        # 与 add_memory 相同，嵌入完成后再打时间戳
+        now = time.time()
+        memory_items = [
+            _StoredMemory(
+                str(uuid4()),
+                content,
+                message.get("role", "user"),
+                now,
+                message.get("metadata", {}) or {}
+            )
+            for content, message in zip(contents, messages)
+        ]
+        
+        for memory_item in memory_items:
+            self.memory_items[memory_item.id] = memory_item
+        
+        # 一次性添加到FAISS索引
+        self._append_vectors([item.id for item in memory_items], embeddings)
+        
+        # 保存到磁盘
+        self._upsert_items(memory_items)
+        
+        # 限制记忆数量
+        if len(self.memory_items) > self.max_memory_items:
+            await self._trim_memories()
+        
+        logger.info(f"Added {len(memory_items)} memory items in batch")
+        return [item.id for item in memory_items]
+    
     async def search_memory(self, query: Union[str, MemoryQuery]) -> MemoryResult:
         """搜索记忆."""
         if not self._is_initialized:
@@ -221,32 +662,25 @@ class FAISSMemoryManager(MemoryManager):
         
         # 获取查询的向量嵌入
         query_embedding = await self._get_embedding(query_text)
-        query_array = np.array([query_embedding], dtype=np.float32)
+        query_array = self._normalized(query_embedding)
         
         # 执行向量搜索
         if self.index.ntotal == 0:
             return MemoryResult(items=[], total_count=0, query_time=time.time() - start_time)
         
-        # 搜索最相似的向量
-        scores, indices = self.index.search(query_array, min(limit * 2, self.index.ntotal))
+        # 搜索最相似的向量：索引中的每个ID都对应一个记忆项，取 limit 个即可，
+        # 不必多取候选再在Python中筛选
+        scores, indices = await self._search_index(query_array, min(limit, self.index.ntotal))
         
-        # 过滤和排序结果
+        # 向量化过滤：去掉空位（-1）和低于阈值的结果；归一化向量的内积即余弦相似度，
+        # FAISS 已按相似度降序返回，无需再排序
+        keep = (indices[0] >= 0) & (scores[0] >= similarity_threshold)
         results = []
-        for distance, idx in zip(scores[0], indices[0]):
-            if idx < len(self.memory_ids):
-                memory_id = self.memory_ids[idx]
-                memory_item = self.memory_items.get(memory_id)
-                if memory_item:
-                    # 将L2距离转换为相似度分数 (0-1范围)
-                    # 使用距离的倒数作为相似度，避免距离过大的问题
-                    similarity_score = 1.0 / (1.0 + distance)
-                    if similarity_score >= similarity_threshold:
-                        memory_item.similarity_score = float(similarity_score)
-                        results.append(memory_item)
-        
-        # 按相似度排序并限制数量
-        results.sort(key=lambda x: x.similarity_score or 0, reverse=True)
-        results = results[:limit]
+        for similarity_score, fid in zip(scores[0][keep].tolist(), indices[0][keep].tolist()):
+            memory_id = self._id_of_fid.get(fid)
+            memory_item = self.memory_items.get(memory_id) if memory_id is not None else None
+            if memory_item:
+                results.append(memory_item.to_item(similarity_score=similarity_score))
         
         query_time = time.time() - start_time
         logger.info(f"Memory search completed in {query_time:.3f}s, found {len(results)} results")
@@ -257,9 +691,47 @@ class FAISSMemoryManager(MemoryManager):
             query_time=query_time
         )
     
+    async def _search_index(self, query_array: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """执行索引搜索；GPU索引上合并短时间窗口内的并发查询."""
+        if self._gpu_res is None:
+            return self.index.search(query_array, k)
+        
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_searches.append((query_array, k, future))
+        if len(self._pending_searches) >= _SEARCH_BATCH_MAX:
+            self._flush_searches()
+        elif self._search_flush is None:
+            self._search_flush = loop.call_later(_SEARCH_BATCH_WINDOW, self._flush_searches)
+        return await future
+    
+    def _flush_searches(self) -> None:
+        """一次批量搜索所有排队的查询，并把结果分发给各自的等待者."""
+        if self._search_flush is not None:
+            self._search_flush.cancel()
+            self._search_flush = None
+        pending, self._pending_searches = self._pending_searches, []
+        if not pending:
+            return
+        
+        k = max(item[1] for item in pending)
+        try:
+            scores, indices = self.index.search(np.vstack([item[0] for item in pending]), k)
+        except Exception as e:
+            for _, _, future in pending:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for row, (_, query_k, future) in enumerate(pending):
+            if not future.done():
+                future.set_result((scores[row:row + 1, :query_k], indices[row:row + 1, :query_k]))
+    
     async def get_memory(self, memory_id: str) -> Optional[MemoryItem]:
-        """获取指定记忆项."""
-        return self.memory_items.get(memory_id)
+        """获取指定记忆项（附带嵌入）."""
+        memory_item = self.memory_items.get(memory_id)
+        if memory_item is None:
+            return None
+        return memory_item.to_item(embedding=self._embedding_of(memory_id))
     
     async def update_memory(self, memory_id: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
         """更新记忆项."""
@@ -270,18 +742,24 @@ class FAISSMemoryManager(MemoryManager):
         embedding = await self._get_embedding(content)
         
         # 更新记忆项
-        memory_item = self.memory_items[memory_id]
+        memory_item = self.memory_items.pop(memory_id)
+        self.memory_items[memory_id] = memory_item  # 移到最新的一端
         memory_item.content = content
-        memory_item.embedding = embedding
         if metadata:
             memory_item.metadata.update(metadata)
-        memory_item.timestamp = datetime.now()
+        memory_item.ts = time.time()
+        row = self._row_of[memory_id]
+        self._emb[row] = embedding
+        faiss.normalize_L2(self._emb[row:row + 1])
         
-        # 重新构建索引（FAISS不支持直接更新）
-        await self._rebuild_index()
+        # 按ID替换索引中的向量（先删除旧向量再以相同ID写入）
+        fid = self._fid_of[memory_id]
+        await self._remove_from_index([fid])
+        if self.index.ntotal < len(self.memory_ids):
+            self.index.add_with_ids(self._emb[row:row + 1], np.array([fid], dtype=np.int64))
         
         # 保存到磁盘
-        await self._save_data()
+        self._upsert_items([memory_item])
         
         logger.info(f"Updated memory item: {memory_id}")
         return True
@@ -293,35 +771,40 @@ class FAISSMemoryManager(MemoryManager):
         
         # 从内存中删除
         del self.memory_items[memory_id]
-        if memory_id in self.memory_ids:
-            self.memory_ids.remove(memory_id)
+        self._remove_row(memory_id)
         
-        # 重新构建索引
-        await self._rebuild_index()
+        # 按ID从索引删除
+        await self._remove_from_index([self._release_fid(memory_id)])
         
         # 保存到磁盘
-        await self._save_data()
+        self._delete_items([memory_id])
         
         logger.info(f"Deleted memory item: {memory_id}")
         return True
     
     async def list_memories(self, limit: int = 100, offset: int = 0) -> List[MemoryItem]:
         """列出记忆项."""
-        items = list(self.memory_items.values())
-        items.sort(key=lambda x: x.timestamp, reverse=True)
-        return items[offset:offset + limit]
+        # 从最新的一端只取需要的部分
+        items = itertools.islice(reversed(self.memory_items.values()), offset, offset + limit)
+        return [item.to_item() for item in items]
     
     async def clear_memories(self) -> int:
         """清空所有记忆."""
         count = len(self.memory_items)
         self.memory_items.clear()
         self.memory_ids.clear()
+        self._row_of.clear()
+        self._fid_of.clear()
+        self._id_of_fid.clear()
+        self._emb = np.empty((0, self.embedding_dimension), dtype=np.float32)
         
         # 重新创建索引
         self._create_new_index()
         
         # 保存到磁盘
-        await self._save_data()
+        if self._conn is not None:
+            with self._conn:
+                self._conn.execute("DELETE FROM memories")
         
         logger.info(f"Cleared {count} memory items")
         return count
@@ -335,82 +818,89 @@ class FAISSMemoryManager(MemoryManager):
             "max_memory_items": self.max_memory_items,
             "similarity_threshold": self.similarity_threshold,
             "persist_directory": str(self.persist_directory),
-            "index_type": self.index_type
+            "index_type": self.index_type,
+            "index_trained": self._index_trained,
+            "embedding_cache_size": len(self._emb_cache)
         }
     
     async def _rebuild_index(self) -> None:
-        """重新构建FAISS索引."""
-        if not self.memory_items:
-            self._create_new_index()
-            return
-        
-        # 创建新索引
+        """重新构建FAISS索引（直接使用连续的嵌入缓冲区）."""
         self._create_new_index()
         
-        # 重新添加所有向量
-        embeddings = []
-        for memory_id in self.memory_ids:
-            memory_item = self.memory_items.get(memory_id)
-            if memory_item and memory_item.embedding:
-                embeddings.append(memory_item.embedding)
-        
-        if embeddings:
-            embedding_array = np.array(embeddings, dtype=np.float32)
-            self.index.add(embedding_array)
+        count = len(self.memory_ids)
+        if count:
+            self.index.add_with_ids(self._emb[:count], self._fids_array())
+            self._maybe_train()
         
-        logger.info(f"Rebuilt index with {len(embeddings)} vectors")
+        logger.info(f"Rebuilt index with {count} vectors")
     
     async def _trim_memories(self) -> None:
         """修剪记忆数量，保留最新的."""
         if len(self.memory_items) <= self.max_memory_items:
             return
         
-        # 按时间排序，保留最新的
-        sorted_items = sorted(
-            self.memory_items.items(),
-            key=lambda x: x[1].timestamp,
-            reverse=True
-        )
-        
-        # 保留最新的max_memory_items个
-        keep_items = sorted_items[:self.max_memory_items]
+        # 最旧的超出部分就在字典开头（达到上限后每次添加通常只超出一条）；
+        # 保留最新的max_memory_items个，其余按ID从缓冲区和索引中删除
+        excess = len(self.memory_items) - self.max_memory_items
+        removed_ids = list(itertools.islice(self.memory_items, excess))
+        removed_fids = []
+        for memory_id in removed_ids:
+            del self.memory_items[memory_id]
+            self._remove_row(memory_id)
+            removed_fids.append(self._release_fid(memory_id))
         
-        # 更新存储
-        self.memory_items = dict(keep_items)
-        self.memory_ids = [item[0] for item in keep_items]
-        
-        # 重新构建索引
-        await self._rebuild_index()
+        self._delete_items(removed_ids)
+        await self._remove_from_index(removed_fids)
         
         logger.info(f"Trimmed memories to {len(self.memory_items)} items")
     
-    async def _save_data(self) -> None:
-        """保存数据到磁盘."""
+    def _upsert_items(self, items: List[_StoredMemory], blobs: Optional[List[Optional[bytes]]] = None) -> None:
+        """写入或更新记忆项（嵌入以float32二进制存储，默认取缓冲区中的行）."""
+        if self._conn is None or not items:
+            return
+        if blobs is None:
+            blobs = [self._embedding_blob(item.id) for item in items]
+        rows = [
+            (
+                item.id,
+                item.content,
+                item.role,
+                item.ts,
+                orjson.dumps(item.metadata, default=str, option=orjson.OPT_NON_STR_KEYS).decode(),
+                blob,
+            )
+            for item, blob in zip(items, blobs)
+        ]
         try:
-            # 保存元数据
-            metadata = {
-                "memory_items": {
-                    item_id: item.model_dump() 
-                    for item_id, item in self.memory_items.items()
-                },
-                "memory_ids": self.memory_ids
-            }
-            
-            with open(self.metadata_file, 'w', encoding='utf-8') as f:
-                json.dump(metadata, f, ensure_ascii=False, indent=2, default=str)
-            
-            # 保存FAISS索引
-            if self.index:
-                faiss.write_index(self.index, str(self.index_file))
-            
-            logger.debug("Memory data saved to disk")
-            
-        except Exception as e:
-            logger.error(f"Failed to save memory data: {e}")
+            with self._conn:
+                self._conn.executemany(_UPSERT_SQL, rows)
+        except sqlite3.Error as e:
+            logger.error(f"Failed to save memory items: {e}")
+    
+    def _embedding_blob(self, memory_id: str) -> Optional[bytes]:
+        """缓冲区中记忆项嵌入的float32字节."""
+        row = self._row_of.get(memory_id)
+        return self._emb[row].tobytes() if row is not None else None
+    
+    def _delete_items(self, memory_ids: List[str]) -> None:
+        """删除记忆项."""
+        if self._conn is None or not memory_ids:
+            return
+        try:
+            with self._conn:
+                self._conn.executemany("DELETE FROM memories WHERE id = ?", [(i,) for i in memory_ids])
+        except sqlite3.Error as e:
+            logger.error(f"Failed to delete memory items: {e}")
     
     async def close(self) -> None:
         """关闭记忆管理器."""
+        self._flush_searches()
+        if self._http is not None:
+            await self._http.close()
+            self._http = None
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
         if self._is_initialized:
-            await self._save_data()
             self._is_initialized = False
             logger.info("MemoryManager closed") 
\ No newline at end of file
@@ -1,12 +1,15 @@
 """长期记忆管理器实现."""
 
-import json
+import asyncio
 import logging
 from datetime import datetime
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 from uuid import uuid4
 
+import faiss
+import numpy as np
+import orjson
 from pydantic import BaseModel, Field
 
 from src.memory.faiss_manager import FAISSMemoryManager
@@ -14,6 +17,9 @@ from src.memory.manager import MemoryItem
 
 logger = logging.getLogger(__name__)
 
+# 摘要落盘的合并窗口（秒）：窗口内的多次修改只重写一次 summaries.json
+_SUMMARY_FLUSH_DELAY = 0.5
+
 
 class ConversationSummary(BaseModel):
     """会话摘要模型."""
@@ -35,6 +41,14 @@ class LongTermMemoryManager(FAISSMemoryManager):
         # 会话摘要存储
         self.summaries: Dict[str, ConversationSummary] = {}
         self.summary_file = self.db_path / "summaries.json"
+        self._summaries_dirty = False
+        self._summary_flush_task: Optional[asyncio.Task] = None
+        
+        # 摘要向量索引：摘要文本的归一化嵌入，按稳定ID写入，替换/删除无需重建
+        self.summary_index = faiss.IndexIDMap2(faiss.IndexFlatIP(self.embedding_dimension))
+        self._summary_fid_of: Dict[str, int] = {}
+        self._summary_conv_of: Dict[int, str] = {}
+        self._next_summary_fid = 0
         
         # 摘要生成配置
         self.summary_model = config.get("summary_model", "Qwen/QwQ-32B")
@@ -52,13 +66,14 @@ class LongTermMemoryManager(FAISSMemoryManager):
         """加载会话摘要."""
         if self.summary_file.exists():
             try:
-                with open(self.summary_file, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                    self.summaries = {
-                        conv_id: ConversationSummary(**summary_data)
-                        for conv_id, summary_data in data.get("summaries", {}).items()
-                    }
+                data = orjson.loads(self.summary_file.read_bytes())
+                self.summaries = {
+                    conv_id: ConversationSummary(**summary_data)
+                    for conv_id, summary_data in data.get("summaries", {}).items()
+                }
                 logger.info(f"Loaded {len(self.summaries)} conversation summaries")
+                # 重建摘要索引（摘要嵌入通常命中嵌入缓存，不会请求API）
+                await self._index_summaries(list(self.summaries.values()))
             except Exception as e:
                 logger.warning(f"Failed to load summaries: {e}")
     
@@ -67,72 +82,122 @@ class LongTermMemoryManager(FAISSMemoryManager):
         try:
             data = {
                 "summaries": {
-                    conv_id: summary.dict()
+                    conv_id: summary.model_dump()
                     for conv_id, summary in self.summaries.items()
                 }
             }
-            with open(self.summary_file, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+            self.summary_file.write_bytes(
+                orjson.dumps(data, default=str, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+            )
             logger.debug(f"Saved {len(self.summaries)} conversation summaries")
         except Exception as e:
             logger.error(f"Failed to save summaries: {e}")
     
+    def _schedule_summary_flush(self) -> None:
+        """标记摘要已修改，并在后台延迟落盘（合并短时间内的多次修改）."""
+        self._summaries_dirty = True
+        if self._summary_flush_task is None or self._summary_flush_task.done():
+            self._summary_flush_task = asyncio.create_task(self._flush_summaries_later())
+    
+    async def _flush_summaries_later(self) -> None:
+        """等待合并窗口结束后保存摘要."""
+        await asyncio.sleep(_SUMMARY_FLUSH_DELAY)
+        await self._flush_summaries()
+    
+    async def _flush_summaries(self) -> None:
+        """有未保存的修改时保存摘要."""
+        if self._summaries_dirty:
+            self._summaries_dirty = False
+            await self._save_summaries()
+    
+    async def _index_summaries(self, summaries: List[ConversationSummary]) -> None:
+        """为摘要批量生成嵌入并写入摘要索引（同一会话的旧摘要先删除）."""
+        if not summaries:
+            return
+        embeddings = await self._get_embeddings_batch([summary.summary for summary in summaries])
+        
+        self._remove_summary_vectors([summary.conversation_id for summary in summaries])
+        fids = []
+        for summary in summaries:
+            fid = self._next_summary_fid
+            self._next_summary_fid += 1
+            self._summary_fid_of[summary.conversation_id] = fid
+            self._summary_conv_of[fid] = summary.conversation_id
+            fids.append(fid)
+        
+        matrix = np.array(embeddings, dtype=np.float32)
+        faiss.normalize_L2(matrix)
+        self.summary_index.add_with_ids(matrix, np.array(fids, dtype=np.int64))
+    
+    def _remove_summary_vectors(self, conversation_ids: List[str]) -> None:
+        """按会话ID从摘要索引中删除向量."""
+        fids = [self._summary_fid_of.pop(conv_id) for conv_id in conversation_ids if conv_id in self._summary_fid_of]
+        for fid in fids:
+            del self._summary_conv_of[fid]
+        if fids:
+            self.summary_index.remove_ids(np.array(fids, dtype=np.int64))
+    
+    @staticmethod
+    def _build_summary_prompt(messages: List[Dict[str, Any]]) -> str:
+        """构建生成摘要的提示词."""
+        # 构建对话内容
+        conversation_text = ""
+        for msg in messages:
+            role = msg.get("role", "unknown")
+            content = msg.get("content", "")
+            if role in ["user", "assistant"]:
+                conversation_text += f"{role}: {content}\n"
+        
+        return f"""请将以下对话总结成1-2句话的摘要，突出主要内容和结论：
+
+对话内容：
+{conversation_text}
+
+摘要："""
+    
     async def generate_conversation_summary(self, conversation_id: str, messages: List[Dict[str, Any]]) -> str:
         """生成会话摘要."""
+        results = await self.generate_conversation_summaries([(conversation_id, messages)])
+        return results[0]
+    
+    async def generate_conversation_summaries(self, conversations: List[Tuple[str, List[Dict[str, Any]]]]) -> List[str]:
+        """并发生成多个会话的摘要，并一次性为新摘要生成嵌入写入摘要索引."""
         if not self.api_key:  # 使用api_key而不是openai_client
             logger.warning("No API key available, cannot generate summary")
-            return "会话摘要生成失败：缺少API密钥"
+            return ["会话摘要生成失败：缺少API密钥"] * len(conversations)
         
         try:
-            # 构建对话内容
-            conversation_text = ""
-            for msg in messages:
-                role = msg.get("role", "unknown")
-                content = msg.get("content", "")
-                if role in ["user", "assistant"]:
-                    conversation_text += f"{role}: {content}\n"
+            # 并发调用LLM生成摘要
+            responses = await asyncio.gather(*(
+                self._call_llm_for_summary(self._build_summary_prompt(messages))
+                for _, messages in conversations
+            ))
             
-            # 生成摘要的提示词
-            summary_prompt = f"""请将以下对话总结成1-2句话的摘要，突出主要内容和结论：
-
-对话内容：
-{conversation_text}
-
-摘要："""
+            # 保存摘要（同一会话出现多次时以最后一次为准）
+            new_summaries: Dict[str, ConversationSummary] = {}
+            for (conversation_id, messages), response in zip(conversations, responses):
+                if response:
+                    new_summaries[conversation_id] = ConversationSummary(
+                        conversation_id=conversation_id,
+                        summary=response,
+                        metadata={"message_count": len(messages)}
+                    )
+                    logger.info(f"Generated summary for conversation {conversation_id}: {response[:50]}...")
             
-            # 调用LLM生成摘要
-            response = await self._call_llm_for_summary(summary_prompt)
+            if new_summaries:
+                self.summaries.update(new_summaries)
+                await self._index_summaries(list(new_summaries.values()))
+                self._schedule_summary_flush()
             
-            if response:
-                # 保存摘要
-                summary = ConversationSummary(
-                    conversation_id=conversation_id,
-                    summary=response,
-                    metadata={"message_count": len(messages)}
-                )
-                self.summaries[conversation_id] = summary
-                await self._save_summaries()
-                
-                logger.info(f"Generated summary for conversation {conversation_id}: {response[:50]}...")
-                return response
-            else:
-                return "会话摘要生成失败"
+            return [response if response else "会话摘要生成失败" for response in responses]
                 
         except Exception as e:
             logger.error(f"Failed to generate conversation summary: {e}")
-            return f"会话摘要生成失败：{str(e)}"
+            return [f"会话摘要生成失败：{str(e)}"] * len(conversations)
     
     async def _call_llm_for_summary(self, prompt: str) -> Optional[str]:
         """调用LLM生成摘要."""
         try:
-            import json
-            import urllib.request
-            
-            url = "https://api.siliconflow.cn/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
             data = {
                 "model": self.summary_model,
                 "messages": [{"role": "user", "content": prompt}],
@@ -141,24 +206,11 @@ class LongTermMemoryManager(FAISSMemoryManager):
                 "stream": False
             }
             
-            # 使用urllib进行同步调用，在异步函数中使用线程池
-            import asyncio
-            
-            def make_request():
-                req = urllib.request.Request(
-                    url,
-                    data=json.dumps(data).encode('utf-8'),
-                    headers=headers,
-                    method='POST'
-                )
-                
-                with urllib.request.urlopen(req) as response:
-                    result = json.loads(response.read().decode('utf-8'))
-                    return result
-            
-            # 在线程池中执行同步请求
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(None, make_request)
+            # 复用与嵌入请求相同的HTTP会话
+            session = self._get_http_session()
+            async with session.post(f"{self.api_base_url}/chat/completions", json=data) as resp:
+                resp.raise_for_status()
+                response = await resp.json(loads=orjson.loads)
             
             return response["choices"][0]["message"]["content"].strip()
             
@@ -179,7 +231,8 @@ class LongTermMemoryManager(FAISSMemoryManager):
         """删除会话摘要."""
         if conversation_id in self.summaries:
             del self.summaries[conversation_id]
-            await self._save_summaries()
+            self._remove_summary_vectors([conversation_id])
+            self._schedule_summary_flush()
             logger.info(f"Deleted summary for conversation {conversation_id}")
             return True
         return False
@@ -201,17 +254,8 @@ class LongTermMemoryManager(FAISSMemoryManager):
                     "relevance": "current_session"
                 })
         else:
-            # 搜索相关摘要（简单文本匹配）
-            query_lower = query.lower()
-            for conv_id, summary in self.summaries.items():
-                if query_lower in summary.summary.lower():
-                    summary_results.append({
-                        "conversation_id": conv_id,
-                        "summary": summary.summary,
-                        "relevance": "text_match"
-                    })
-                    if len(summary_results) >= 3:  # 最多返回3个相关摘要
-                        break
+            # 在摘要索引中做向量检索（最多返回3个相关摘要）
+            summary_results = await self._search_summaries(query, limit=3)
         
         return {
             "vector_memories": vector_results,
@@ -219,21 +263,43 @@ class LongTermMemoryManager(FAISSMemoryManager):
             "query": query
         }
     
+    async def _search_summaries(self, query: str, limit: int) -> List[Dict[str, Any]]:
+        """按余弦相似度检索相关会话摘要."""
+        if self.summary_index.ntotal == 0:
+            return []
+        
+        query_array = self._normalized(await self._get_embedding(query))
+        scores, fids = self.summary_index.search(query_array, min(limit, self.summary_index.ntotal))
+        keep = (fids[0] >= 0) & (scores[0] >= self.similarity_threshold)
+        
+        results = []
+        for score, fid in zip(scores[0][keep].tolist(), fids[0][keep].tolist()):
+            conv_id = self._summary_conv_of.get(fid)
+            if conv_id is not None:
+                results.append({
+                    "conversation_id": conv_id,
+                    "summary": self.summaries[conv_id].summary,
+                    "relevance": "semantic_match",
+                    "similarity_score": score
+                })
+        return results
+    
     async def get_memory_stats(self) -> Dict[str, Any]:
         """获取长期记忆统计信息."""
         base_stats = await super().get_memory_stats()
         base_stats.update({
             "conversation_summaries_count": len(self.summaries),
+            "summary_index_size": self.summary_index.ntotal,
             "summary_model": self.summary_model
         })
         return base_stats
     
     async def close(self) -> None:
         """关闭长期记忆管理器."""
-        await self._save_summaries()
+        if self._summary_flush_task is not None and not self._summary_flush_task.done():
+            self._summary_flush_task.cancel()
+        self._summary_flush_task = None
+        await self._flush_summaries()
         await super().close()
         logger.info("LongTermMemoryManager closed")
-
-
-# 导入asyncio用于异步调用
-import asyncio 
\ No newline at end of file
+ 
\ No newline at end of file
@@ -1,25 +1,31 @@
 """短期记忆管理器实现."""
 
+import bisect
+import itertools
 import logging
-from datetime import datetime
-from typing import Any, Dict, List, Optional
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from uuid import uuid4
 
-from pydantic import BaseModel, Field
-
 from src.memory.manager import MemoryManager
 
 logger = logging.getLogger(__name__)
 
+# 搜索缓冲区中消息之间的分隔符
+_SEARCH_SEPARATOR = "\x00"
+
 
-class ShortTermMessage(BaseModel):
-    """短期记忆消息模型."""
+@dataclass(slots=True)
+class ShortTermMessage:
+    """短期记忆消息（只由内部代码创建，无需pydantic校验）."""
     
-    id: str = Field(default_factory=lambda: str(uuid4()))
-    content: str = Field(..., description="消息内容")
-    role: str = Field(..., description="角色：user/assistant/tool")
-    timestamp: datetime = Field(default_factory=datetime.now)
-    metadata: Optional[Dict[str, Any]] = Field(default=None, description="元数据")
+    content: str  # 消息内容
+    role: str  # 角色：user/assistant/tool
+    id: str = field(default_factory=lambda: uuid4().hex)
+    timestamp: float = field(default_factory=time.time)  # epoch秒，对外时再转换为datetime
+    metadata: Optional[Dict[str, Any]] = None  # 元数据
 
 
 class ShortTermMemoryManager(MemoryManager):
@@ -31,7 +37,18 @@ class ShortTermMemoryManager(MemoryManager):
         
         # 配置参数
         self.max_rounds = config.get("short_term_rounds", 10)
-        self.messages: List[ShortTermMessage] = []
+        # 按消息ID索引、保持插入顺序：按ID查找/更新/删除和淘汰最旧的消息都是O(1)
+        self.messages: "OrderedDict[str, ShortTermMessage]" = OrderedDict()
+        # 消息内容的小写形式（插入/更新时计算一次），搜索时不再逐条 lower()
+        self._content_lower: Dict[str, str] = {}
+        # 搜索缓冲区（拼接后的小写内容、各消息起始偏移、消息ID），消息变化时失效
+        self._search_cache: Optional[Tuple[str, List[int], List[str]]] = None
+        
+        # 消息ID：默认用进程内递增计数生成（短期记忆不持久化，只需在本管理器内唯一），
+        # 配置 need_uuid_ids 时改用UUID
+        self._use_uuid_ids = config.get("need_uuid_ids", False)
+        self._id_prefix = f"{id(self):x}-"
+        self._id_counter = itertools.count()
         
         logger.info(f"ShortTermMemoryManager initialized: max_rounds={self.max_rounds}")
     
@@ -40,49 +57,74 @@ class ShortTermMemoryManager(MemoryManager):
         self._is_initialized = True
         logger.info("ShortTermMemoryManager initialized successfully")
     
-    def _trim_messages(self) -> None:
-        """修剪消息列表，确保不超过轮次限制."""
-        while len(self.messages) > self.max_rounds:
-            removed_msg = self.messages.pop(0)
-            logger.debug(f"Removed old message: {removed_msg.id}")
-    
     async def add_memory(self, content: str, role: str, metadata: Optional[Dict[str, Any]] = None) -> str:
         """添加短期记忆."""
         if not self._is_initialized:
             await self.initialize()
         
         # 创建消息
-        message = ShortTermMessage(
-            content=content,
-            role=role,
-            metadata=metadata
-        )
-        
-        # 添加到消息列表
-        self.messages.append(message)
+        message_id = uuid4().hex if self._use_uuid_ids else f"{self._id_prefix}{next(self._id_counter)}"
+        message = ShortTermMessage(content, role, message_id, time.time(), metadata)
         
-        # 修剪消息列表
-        self._trim_messages()
+        # 添加到消息列表，超出轮次限制时淘汰最旧的消息
+        self.messages[message.id] = message
+        self._content_lower[message.id] = content.lower()
+        self._search_cache = None
+        excess = len(self.messages) - self.max_rounds
+        for _ in range(excess):
+            removed_id = self.messages.popitem(last=False)[0]
+            del self._content_lower[removed_id]
         
-        logger.debug(f"Added short-term memory: {message.id}, total messages: {len(self.messages)}")
+        if logger.isEnabledFor(logging.DEBUG):
+            if excess > 0:
+                logger.debug("Trimmed %d old short-term messages", excess)
+            logger.debug("Added short-term memory: %s, total messages: %d", message.id, len(self.messages))
         return message.id
     
+    def _search_buffer(self) -> Tuple[str, List[int], List[str]]:
+        """获取（必要时重建）搜索缓冲区：所有消息的小写内容以分隔符拼接为一个字符串."""
+        if self._search_cache is None:
+            ids = list(self.messages)
+            texts = [self._content_lower[memory_id] for memory_id in ids]
+            starts = [0]
+            for text in texts[:-1]:
+                starts.append(starts[-1] + len(text) + 1)
+            self._search_cache = (_SEARCH_SEPARATOR.join(texts), starts, ids)
+        return self._search_cache
+    
     async def search_memory(self, query: str, limit: int = 10) -> List[ShortTermMessage]:
         """搜索短期记忆（简单文本匹配）."""
         if not self._is_initialized:
             return []
         
-        # 简单的文本匹配搜索
-        results = []
         query_lower = query.lower()
+        if not query_lower:
+            return list(itertools.islice(reversed(self.messages.values()), limit))
         
-        for message in reversed(self.messages):  # 从最新的开始搜索
-            if query_lower in message.content.lower():
-                results.append(message)
-                if len(results) >= limit:
-                    break
+        return list(itertools.islice(self._iter_matches(query_lower), limit))
+    
+    def _iter_matches(self, query_lower: str) -> Iterator[ShortTermMessage]:
+        """从最新到最旧依次产出内容包含 query_lower 的消息（惰性，取够即停）."""
+        if _SEARCH_SEPARATOR in query_lower:
+            # 查询包含分隔符时逐条匹配，避免跨消息的误匹配
+            content_lower = self._content_lower
+            yield from (
+                message for message in reversed(self.messages.values())
+                if query_lower in content_lower[message.id]
+            )
+            return
         
-        return results
+        # 从缓冲区末尾（最新的消息）向前 rfind，每次命中后跳到所在消息之前继续，
+        # 整个搜索只有少量C层面的子串扫描，而不是每条消息一次Python调用
+        joined, starts, ids = self._search_buffer()
+        end = len(joined)
+        while True:
+            pos = joined.rfind(query_lower, 0, end)
+            if pos < 0:
+                return
+            k = bisect.bisect_right(starts, pos) - 1
+            yield self.messages[ids[k]]
+            end = starts[k]
     
     async def get_recent_messages(self, rounds: Optional[int] = None) -> List[ShortTermMessage]:
         """获取最近N轮消息."""
@@ -90,7 +132,9 @@ class ShortTermMemoryManager(MemoryManager):
             return []
         
         n = rounds or self.max_rounds
-        return self.messages[-n:]
+        recent = list(itertools.islice(reversed(self.messages.values()), n))
+        recent.reverse()
+        return recent
     
     async def get_memory_stats(self) -> Dict[str, Any]:
         """获取短期记忆统计信息."""
@@ -104,46 +148,51 @@ class ShortTermMemoryManager(MemoryManager):
         """清空短期记忆."""
         count = len(self.messages)
         self.messages.clear()
-        logger.info(f"Cleared {count} short-term memories")
+        self._content_lower.clear()
+        self._search_cache = None
+        logger.info("Cleared %d short-term memories", count)
         return count
     
     # 以下方法在短期记忆中不适用，返回默认值
     async def get_memory(self, memory_id: str) -> Optional[ShortTermMessage]:
-        """获取指定记忆项（短期记忆不支持）."""
-        for msg in self.messages:
-            if msg.id == memory_id:
-                return msg
-        return None
+        """获取指定记忆项."""
+        return self.messages.get(memory_id)
     
     async def update_memory(self, memory_id: str, content: str, metadata: Optional[Dict[str, Any]] = None) -> bool:
-        """更新记忆项（短期记忆不支持）."""
-        for msg in self.messages:
-            if msg.id == memory_id:
-                msg.content = content
-                msg.metadata = metadata
-                msg.timestamp = datetime.now()
-                
-                logger.debug(f"Updated short-term memory: {memory_id}")
-                return True
-        return False
+        """更新记忆项."""
+        msg = self.messages.get(memory_id)
+        if msg is None:
+            return False
+        
+        msg.content = content
+        self._content_lower[memory_id] = content.lower()
+        self._search_cache = None
+        msg.metadata = metadata
+        msg.timestamp = time.time()
+        
+        logger.debug("Updated short-term memory: %s", memory_id)
+        return True
     
     async def delete_memory(self, memory_id: str) -> bool:
         """删除记忆项."""
-        for i, msg in enumerate(self.messages):
-            if msg.id == memory_id:
-                removed_msg = self.messages.pop(i)
-                logger.debug(f"Deleted short-term memory: {memory_id}")
-                return True
-        return False
+        if self.messages.pop(memory_id, None) is None:
+            return False
+        del self._content_lower[memory_id]
+        self._search_cache = None
+        
+        logger.debug("Deleted short-term memory: %s", memory_id)
+        return True
     
     async def list_memories(self, limit: int = 100, offset: int = 0) -> List[ShortTermMessage]:
         """列出记忆项."""
         start = offset
         end = start + limit
-        return self.messages[start:end]
+        return list(itertools.islice(self.messages.values(), start, end))
     
     async def close(self) -> None:
         """关闭短期记忆管理器."""
         self.messages.clear()
+        self._content_lower.clear()
+        self._search_cache = None
         self._is_initialized = False
         logger.info("ShortTermMemoryManager closed") 
\ No newline at end of file
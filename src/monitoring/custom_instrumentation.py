@@ -7,18 +7,38 @@
 
 import time
 import logging
-import functools
 import asyncio
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional, Callable, Union
-from contextlib import contextmanager, asynccontextmanager
+from weakref import WeakKeyDictionary
+from contextlib import asynccontextmanager, nullcontext
 from dataclasses import dataclass, asdict
 
 from .opentelemetry_integration import get_global_integration
-from .data_collector import DataCollector
+from .data_collector import get_global_data_collector, initialize_global_data_collector
 from .step_tracker import get_global_step_tracker, initialize_global_step_tracker, StepType, StepStatus
 
 logger = logging.getLogger(__name__)
 
+# 待处理事件队列上限，满时丢弃最旧的事件
+_EVENT_QUEUE_SIZE = 8192
+
+# 事件数据中消息、结果和参数预览的最大字符数
+_PREVIEW_CHARS = 200
+
+# 各 span 的属性键（值按相同顺序传入，只有启用追踪时才组装成字典）
+_PROCESS_MESSAGE_ATTR_KEYS = ("session.id", "user.message.length", "user.message.preview")
+_THINK_ATTR_KEYS = ("session.id", "step.number")
+_ACT_ATTR_KEYS = ("session.id", "step.number", "tool.calls.count")
+_OBSERVE_ATTR_KEYS = ("session.id", "step.number", "observations.count")
+_LLM_CALL_ATTR_KEYS = ("session.id", "llm.messages.count", "llm.model")
+_TOOL_ATTR_KEYS = ("tool.name", "tool.arguments.count")
+_MEMORY_ATTR_KEYS = ("memory.operation",)
+
+# 未启用追踪时复用的空上下文
+_NO_SPAN = nullcontext()
+
 
 @dataclass
 class InstrumentationConfig:
@@ -35,25 +55,486 @@ class InstrumentationConfig:
     trace_file_operations: bool = True
 
 
+@dataclass(slots=True)
+class _Counters:
+    """性能计数器（包装器每次调用只做属性自增）"""
+    agent_executions: int = 0
+    tool_executions: int = 0
+    llm_calls: int = 0
+    memory_operations: int = 0
+    total_errors: int = 0
+
+
+class _InstrumentedMethod:
+    """instrumentation 包装器基类
+
+    原方法、instrumentation 实例和所属 agent 存放在槽位中，调用时按属性读取，
+    不再经由闭包单元；__name__/__doc__ 等元信息放在实例字典中。
+    """
+    
+    __slots__ = ("_m", "_instr", "_agent_instance", "__dict__")
+    
+    def __init__(self, original_method, instrumentation: "CustomInstrumentation"):
+        self._m = original_method
+        self._instr = instrumentation
+        self._agent_instance = None
+        
+        # 保持原始方法的签名信息
+        self.__wrapped__ = original_method
+        self.__name__ = getattr(original_method, "__name__", type(self).__name__)
+        self.__doc__ = getattr(original_method, "__doc__", None)
+        self.__module__ = getattr(original_method, "__module__", __name__)
+
+
+class _ProcessMessageWrapper(_InstrumentedMethod):
+    """process_message 的 instrumentation 包装器"""
+    
+    __slots__ = ()
+    
+    async def __call__(self, user_message: str) -> str:
+        instrumentation = self._instr
+        if instrumentation._fast_noop or not instrumentation.config.enable_agent_tracing:
+            return await self._m(user_message)
+        
+        agent_instance = self._agent_instance
+        session_id = instrumentation._session_id(agent_instance)
+        
+        # 开始追踪会话
+        instrumentation.data_collector.start_session(session_id, {
+            "user_message_length": len(user_message),
+            "agent_id": id(agent_instance)
+        })
+        
+        # 开始执行步骤追踪
+        cycle_number = len(getattr(agent_instance.state, 'react_steps', [])) + 1
+        instrumentation.step_tracker.start_cycle(session_id, cycle_number, user_message)
+        
+        t0 = time.perf_counter_ns()
+        success = True
+        error_message = None
+        result = None
+        
+        try:
+            with instrumentation._trace_span(
+                "agent.process_message", _PROCESS_MESSAGE_ATTR_KEYS,
+                (session_id, len(user_message), user_message[:100])
+            ):
+                # 调用原始方法
+                result = await self._m(user_message)
+                
+        except Exception as e:
+            success = False
+            error_message = str(e)
+            instrumentation._counters.total_errors += 1
+            raise
+        finally:
+            duration_ns = time.perf_counter_ns() - t0
+            instrumentation._counters.agent_executions += 1
+            
+            # 结束执行步骤追踪
+            instrumentation.step_tracker.end_cycle(session_id, result, success, error_message)
+            
+            # 记录事件和指标（数据字典在出队时再构建）
+            instrumentation._enqueue_event(
+                session_id, "process_message", "agent", (user_message, result),
+                duration_ns, success, error_message, "agent.process_message"
+            )
+            
+        return result
+
+
+class _ThinkWrapper(_InstrumentedMethod):
+    """_think 的 instrumentation 包装器"""
+    
+    __slots__ = ()
+    
+    async def __call__(self, step):
+        instrumentation = self._instr
+        if instrumentation._fast_noop or not instrumentation.config.enable_agent_tracing:
+            return await self._m(step)
+        
+        agent_instance = self._agent_instance
+        session_id = instrumentation._session_id(agent_instance)
+        step_number = len(agent_instance.state.react_steps) + 1
+        
+        # 开始思考步骤追踪
+        step_id = instrumentation.step_tracker.start_step(session_id, StepType.THINK, {
+            "step_number": step_number,
+            "has_thought": bool(step.thought),
+            "tool_calls_count": len(step.tool_calls),
+            "has_final_answer": bool(step.final_answer)
+        })
+        
+        t0 = time.perf_counter_ns()
+        thought_data = None
+        
+        try:
+            with instrumentation._trace_span(
+                "agent.think", _THINK_ATTR_KEYS, (session_id, step_number)
+            ):
+                await self._m(step)
+                
+                # 记录思考结果
+                thought_data = {
+                    "has_thought": bool(step.thought),
+                    "tool_calls_count": len(step.tool_calls),
+                    "has_final_answer": bool(step.final_answer)
+                }
+                
+                if step.thought:
+                    thought_data["thought_content"] = step.thought.content[:200]
+                    
+                if step.tool_calls:
+                    thought_data["tool_names"] = [tc.name for tc in step.tool_calls]
+                    
+        except Exception as e:
+            instrumentation._counters.total_errors += 1
+            # 结束思考步骤追踪（失败）
+            instrumentation.step_tracker.end_step(session_id, step_id, None, StepStatus.FAILED, str(e))
+            raise
+        finally:
+            duration_ns = time.perf_counter_ns() - t0
+            
+            # 结束思考步骤追踪（成功）
+            if thought_data is not None:
+                instrumentation.step_tracker.end_step(session_id, step_id, thought_data, StepStatus.SUCCESS)
+            
+            # 记录事件和指标
+            instrumentation._enqueue_event(
+                session_id, "think", "agent", thought_data or {},
+                duration_ns, True, None, "agent.think"
+            )
+
+
+class _ActWrapper(_InstrumentedMethod):
+    """_act 的 instrumentation 包装器"""
+    
+    __slots__ = ()
+    
+    async def __call__(self, step):
+        instrumentation = self._instr
+        if instrumentation._fast_noop or not instrumentation.config.enable_agent_tracing:
+            return await self._m(step)
+        
+        agent_instance = self._agent_instance
+        session_id = instrumentation._session_id(agent_instance)
+        step_number = len(agent_instance.state.react_steps) + 1
+        
+        # 开始行动步骤追踪
+        step_id = instrumentation.step_tracker.start_step(session_id, StepType.ACT, {
+            "step_number": step_number,
+            "tool_calls_count": len(step.tool_calls)
+        })
+        
+        t0 = time.perf_counter_ns()
+        act_data = None
+        
+        try:
+            with instrumentation._trace_span(
+                "agent.act", _ACT_ATTR_KEYS,
+                (session_id, step_number, len(step.tool_calls))
+            ):
+                await self._m(step)
+                
+                # 记录执行结果
+                act_data = {
+                    "tool_calls_count": len(step.tool_calls),
+                    "observations_count": len(step.observations),
+                    "successful_tools": sum(1 for obs in step.observations if obs.success),
+                    "failed_tools": sum(1 for obs in step.observations if not obs.success)
+                }
+                
+        except Exception as e:
+            instrumentation._counters.total_errors += 1
+            # 结束行动步骤追踪（失败）
+            instrumentation.step_tracker.end_step(session_id, step_id, None, StepStatus.FAILED, str(e))
+            raise
+        finally:
+            duration_ns = time.perf_counter_ns() - t0
+            
+            # 结束行动步骤追踪（成功）
+            if act_data is not None:
+                instrumentation.step_tracker.end_step(session_id, step_id, act_data, StepStatus.SUCCESS)
+            
+            # 记录事件和指标
+            instrumentation._enqueue_event(
+                session_id, "act", "agent", act_data or {},
+                duration_ns, True, None, "agent.act"
+            )
+
+
+class _ObserveWrapper(_InstrumentedMethod):
+    """_observe 的 instrumentation 包装器"""
+    
+    __slots__ = ()
+    
+    async def __call__(self, step):
+        instrumentation = self._instr
+        if instrumentation._fast_noop or not instrumentation.config.enable_agent_tracing:
+            return await self._m(step)
+        
+        agent_instance = self._agent_instance
+        session_id = instrumentation._session_id(agent_instance)
+        step_number = len(agent_instance.state.react_steps) + 1
+        
+        # 开始观察步骤追踪
+        step_id = instrumentation.step_tracker.start_step(session_id, StepType.OBSERVE, {
+            "step_number": step_number,
+            "observations_count": len(step.observations)
+        })
+        
+        t0 = time.perf_counter_ns()
+        observe_data = None
+        
+        try:
+            with instrumentation._trace_span(
+                "agent.observe", _OBSERVE_ATTR_KEYS,
+                (session_id, step_number, len(step.observations))
+            ):
+                await self._m(step)
+                
+                # 记录观察结果
+                observe_data = {
+                    "observations_count": len(step.observations),
+                    "has_final_answer": bool(step.final_answer)
+                }
+                
+                if step.final_answer:
+                    observe_data["final_answer_length"] = len(step.final_answer)
+                    
+        except Exception as e:
+            instrumentation._counters.total_errors += 1
+            # 结束观察步骤追踪（失败）
+            instrumentation.step_tracker.end_step(session_id, step_id, None, StepStatus.FAILED, str(e))
+            raise
+        finally:
+            duration_ns = time.perf_counter_ns() - t0
+            
+            # 结束观察步骤追踪（成功）
+            if observe_data is not None:
+                instrumentation.step_tracker.end_step(session_id, step_id, observe_data, StepStatus.SUCCESS)
+            
+            # 记录事件和指标
+            instrumentation._enqueue_event(
+                session_id, "observe", "agent", observe_data or {},
+                duration_ns, True, None, "agent.observe"
+            )
+
+
+class _LLMCallWrapper(_InstrumentedMethod):
+    """_call_llm 的 instrumentation 包装器"""
+    
+    __slots__ = ()
+    
+    async def __call__(self, messages):
+        instrumentation = self._instr
+        if instrumentation._fast_noop or not instrumentation.config.enable_llm_tracing:
+            return await self._m(messages)
+        
+        agent_instance = self._agent_instance
+        session_id = instrumentation._session_id(agent_instance)
+        t0 = time.perf_counter_ns()
+        
+        # 准备 LLM 调用数据（token 估算在出队时计算）
+        llm_data = {
+            "messages_count": len(messages),
+            "model": instrumentation._model_name(agent_instance)
+        }
+        
+        try:
+            with instrumentation._trace_span(
+                "agent.llm_call", _LLM_CALL_ATTR_KEYS,
+                (session_id, len(messages), llm_data["model"])
+            ):
+                result = await self._m(messages)
+                
+                # 记录 LLM 响应数据
+                usage = result.get("usage", {})
+                llm_data.update({
+                    "response_length": len(result.get("content", "")),
+                    "usage_tokens": usage.get("total_tokens", 0),
+                    "usage_prompt_tokens": usage.get("prompt_tokens", 0),
+                    "usage_completion_tokens": usage.get("completion_tokens", 0)
+                })
+                
+        except Exception as e:
+            instrumentation._counters.total_errors += 1
+            raise
+        finally:
+            duration_ns = time.perf_counter_ns() - t0
+            instrumentation._counters.llm_calls += 1
+            
+            # 记录事件和指标
+            instrumentation._enqueue_event(
+                session_id, "llm_call", "agent", (llm_data, messages),
+                duration_ns, True, None, "agent.llm_call"
+            )
+            
+        return result
+
+
+class _ToolExecutionWrapper(_InstrumentedMethod):
+    """工具执行方法的 instrumentation 包装器"""
+    
+    __slots__ = ()
+    
+    async def __call__(self, tool_name: str, **kwargs):
+        instrumentation = self._instr
+        if instrumentation._fast_noop or not instrumentation.config.enable_tool_tracing:
+            return await self._m(tool_name, **kwargs)
+        
+        t0 = time.perf_counter_ns()
+        
+        # 准备工具执行数据（只保留参数名和截断后的预览）
+        tool_data = {
+            "tool_name": tool_name,
+            "argument_names": list(kwargs),
+            "arguments_count": len(kwargs)
+        }
+        if instrumentation.config.enable_custom_attributes:
+            tool_data["arguments_preview"] = {
+                key: value[:_PREVIEW_CHARS] if isinstance(value, str) else value
+                for key, value in kwargs.items()
+            }
+        
+        try:
+            with instrumentation._trace_span(
+                "tool.execution", _TOOL_ATTR_KEYS, (tool_name, len(kwargs))
+            ):
+                result = await self._m(tool_name, **kwargs)
+                
+                # 记录工具执行结果
+                tool_data.update({
+                    "success": result.success,
+                    "result_length": len(str(result.result)) if result.success else 0,
+                    "error_message": result.error if not result.success else None
+                })
+                
+        except Exception as e:
+            instrumentation._counters.total_errors += 1
+            raise
+        finally:
+            duration_ns = time.perf_counter_ns() - t0
+            instrumentation._counters.tool_executions += 1
+            
+            # 记录事件和指标
+            instrumentation._enqueue_event(
+                "tool_execution", "tool_execution", "executor", tool_data,
+                duration_ns, tool_data.get("success", False), None, f"tool.{tool_name}"
+            )
+            
+        return result
+
+
+class _MemoryOperationWrapper(_InstrumentedMethod):
+    """记忆操作的 instrumentation 包装器"""
+    
+    __slots__ = ("_operation", "_metric_name")
+    
+    def __init__(self, original_method, instrumentation: "CustomInstrumentation", operation_name: str):
+        super().__init__(original_method, instrumentation)
+        self._operation = operation_name
+        self._metric_name = f"memory.{operation_name}"
+    
+    async def __call__(self, *args, **kwargs):
+        instrumentation = self._instr
+        if instrumentation._fast_noop or not instrumentation.config.enable_memory_tracing:
+            return await self._m(*args, **kwargs)
+        
+        operation_name = self._operation
+        t0 = time.perf_counter_ns()
+        
+        # 准备记忆操作数据
+        memory_data = {
+            "operation": operation_name,
+            "args_count": len(args),
+            "kwargs_count": len(kwargs)
+        }
+        
+        try:
+            with instrumentation._trace_span(
+                "memory.operation", _MEMORY_ATTR_KEYS, (operation_name,)
+            ):
+                result = await self._m(*args, **kwargs)
+                
+                # 记录记忆操作结果
+                if operation_name == "add_memory":
+                    memory_data["content_length"] = len(args[0]) if args else 0
+                elif operation_name == "search_memory":
+                    memory_data["query_length"] = len(args[0]) if args else 0
+                    memory_data["results_count"] = len(result) if isinstance(result, list) else 1
+                elif operation_name == "end_conversation":
+                    memory_data["summary_length"] = len(result) if result else 0
+                    
+        except Exception as e:
+            instrumentation._counters.total_errors += 1
+            raise
+        finally:
+            duration_ns = time.perf_counter_ns() - t0
+            instrumentation._counters.memory_operations += 1
+            
+            # 记录事件和指标
+            instrumentation._enqueue_event(
+                "memory_operation", "memory_operation", "memory", memory_data,
+                duration_ns, True, None, self._metric_name
+            )
+            
+        return result
+
+
 class CustomInstrumentation:
     """自定义 Instrumentation 类"""
     
     def __init__(self, config: Optional[InstrumentationConfig] = None):
         self.config = config or InstrumentationConfig()
         self.ot_integration = get_global_integration()
-        self.data_collector = DataCollector()
+        # 所有 instrumentation 共享同一个数据收集器
+        self.data_collector = get_global_data_collector() or initialize_global_data_collector()
         self.step_tracker = get_global_step_tracker() or initialize_global_step_tracker()
         
         # 性能指标
-        self.performance_metrics = {
-            "agent_executions": 0,
-            "tool_executions": 0,
-            "llm_calls": 0,
-            "memory_operations": 0,
-            "total_errors": 0
-        }
+        self._counters = _Counters()
+        
+        # 按 agent 实例缓存会话ID和模型名，包装器每次调用不再逐级 getattr
+        self._session_cache: WeakKeyDictionary = WeakKeyDictionary()
+        self._model_cache: WeakKeyDictionary = WeakKeyDictionary()
+        
+        # 包装器只把事件压入队列，事件记录和指标上报由后台线程批量完成，不占用事件循环
+        self._event_queue: deque = deque(maxlen=_EVENT_QUEUE_SIZE)
+        self._drain_scheduled = False
+        self._io_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="instr-io")
+        
+        # 追踪不可用且未启用性能指标时，包装器直接调用原方法
+        self.refresh()
         
         logger.info("自定义 Instrumentation 初始化完成")
+    
+    def refresh(self) -> None:
+        """重新检测 OpenTelemetry 可用性（集成状态变化后调用）"""
+        self._trace_enabled = bool(self.ot_integration and self.ot_integration.is_available())
+        self._fast_noop = not self._trace_enabled and not self.config.enable_performance_metrics
+        self.data_collector.refresh()
+    
+    def _session_id(self, agent_instance) -> str:
+        """获取 agent 当前的会话ID（首次解析后缓存）"""
+        session_id = self._session_cache.get(agent_instance)
+        if session_id is None:
+            session_id = getattr(agent_instance.state, 'conversation_id', 'unknown')
+            self._session_cache[agent_instance] = session_id
+        return session_id
+    
+    def _model_name(self, agent_instance) -> str:
+        """获取 agent 使用的模型名（首次解析后缓存）"""
+        model = self._model_cache.get(agent_instance)
+        if model is None:
+            model = getattr(agent_instance.config.llm, 'model', 'unknown')
+            self._model_cache[agent_instance] = model
+        return model
+    
+    def invalidate_session(self, agent_instance) -> None:
+        """agent 开始新会话时清除其缓存的会话信息"""
+        self._session_cache.pop(agent_instance, None)
+        self._model_cache.pop(agent_instance, None)
         
     def instrument_agent_methods(self, agent_instance):
         """为 Agent 实例的方法添加 instrumentation"""
@@ -126,452 +607,122 @@ class CustomInstrumentation:
         
     def _instrument_process_message(self, original_method):
         """为 process_message 方法添加 instrumentation"""
-        instrumentation = self  # 捕获当前的 instrumentation 实例
-        
-        async def wrapper(user_message: str) -> str:
-            # 获取 agent_instance (通过闭包访问)
-            agent_instance = wrapper._agent_instance
-            
-            session_id = getattr(agent_instance.state, 'conversation_id', 'unknown')
-            
-            # 开始追踪会话
-            instrumentation.data_collector.start_session(session_id, {
-                "user_message_length": len(user_message),
-                "agent_id": id(agent_instance)
-            })
-            
-            # 开始执行步骤追踪
-            cycle_number = len(getattr(agent_instance.state, 'react_steps', [])) + 1
-            cycle_id = instrumentation.step_tracker.start_cycle(session_id, cycle_number, user_message)
-            
-            start_time = time.time()
-            success = True
-            error_message = None
-            result = None
-            
-            try:
-                with instrumentation._trace_span("agent.process_message", {
-                    "session.id": session_id,
-                    "user.message.length": len(user_message),
-                    "user.message.preview": user_message[:100]
-                }):
-                    # 调用原始方法
-                    result = await original_method(user_message)
-                    
-            except Exception as e:
-                success = False
-                error_message = str(e)
-                instrumentation.performance_metrics["total_errors"] += 1
-                raise
-            finally:
-                duration = time.time() - start_time
-                instrumentation.performance_metrics["agent_executions"] += 1
-                
-                # 结束执行步骤追踪
-                instrumentation.step_tracker.end_cycle(session_id, result, success, error_message)
-                
-                # 记录事件
-                instrumentation.data_collector.record_event(
-                    session_id=session_id,
-                    event_type="process_message",
-                    component="agent",
-                    data={
-                        "user_message": user_message,
-                        "result": result,
-                        "duration": duration,
-                        "success": success
-                    },
-                    duration=duration,
-                    success=success,
-                    error_message=error_message
-                )
-                
-                # 记录指标
-                instrumentation._record_execution_metric("agent.process_message", duration, success)
-                
-            return result
-            
-        # 保持原始方法的签名信息
-        wrapper.__name__ = original_method.__name__
-        wrapper.__doc__ = original_method.__doc__
-        wrapper.__module__ = original_method.__module__
-        
-        return wrapper 
+        return _ProcessMessageWrapper(original_method, self)
         
     def _instrument_think(self, original_method):
         """为 _think 方法添加 instrumentation"""
-        async def wrapper(self, step):
-            # 获取 instrumentation 实例
-            instrumentation = getattr(self, '_instrumentation', None)
-            if not instrumentation:
-                return await original_method(step)
-                
-            session_id = getattr(self.state, 'conversation_id', 'unknown')
-            
-            # 开始思考步骤追踪
-            step_id = instrumentation.step_tracker.start_step(session_id, StepType.THINK, {
-                "step_number": len(self.state.react_steps) + 1,
-                "has_thought": bool(step.thought),
-                "tool_calls_count": len(step.tool_calls),
-                "has_final_answer": bool(step.final_answer)
-            })
-            
-            start_time = time.time()
-            
-            try:
-                with instrumentation._trace_span("agent.think", {
-                    "session.id": session_id,
-                    "step.number": len(self.state.react_steps) + 1
-                }):
-                    await original_method(step)
-                    
-                    # 记录思考结果
-                    thought_data = {
-                        "has_thought": bool(step.thought),
-                        "tool_calls_count": len(step.tool_calls),
-                        "has_final_answer": bool(step.final_answer)
-                    }
-                    
-                    if step.thought:
-                        thought_data["thought_content"] = step.thought.content[:200]
-                        
-                    if step.tool_calls:
-                        thought_data["tool_names"] = [tc.name for tc in step.tool_calls]
-                        
-            except Exception as e:
-                instrumentation.performance_metrics["total_errors"] += 1
-                # 结束思考步骤追踪（失败）
-                instrumentation.step_tracker.end_step(session_id, step_id, None, StepStatus.FAILED, str(e))
-                raise
-            finally:
-                duration = time.time() - start_time
-                
-                # 结束思考步骤追踪（成功）
-                if 'thought_data' in locals():
-                    instrumentation.step_tracker.end_step(session_id, step_id, thought_data, StepStatus.SUCCESS)
-                
-                # 记录事件
-                instrumentation.data_collector.record_event(
-                    session_id=session_id,
-                    event_type="think",
-                    component="agent",
-                    data=thought_data if 'thought_data' in locals() else {},
-                    duration=duration,
-                    success=True
-                )
-                
-                # 记录指标
-                instrumentation._record_execution_metric("agent.think", duration, True)
-                
-        # 保持原始方法的签名信息
-        wrapper.__name__ = original_method.__name__
-        wrapper.__doc__ = original_method.__doc__
-        wrapper.__module__ = original_method.__module__
-        
-        return wrapper 
+        return _ThinkWrapper(original_method, self)
         
     def _instrument_act(self, original_method):
         """为 _act 方法添加 instrumentation"""
-        @functools.wraps(original_method)
-        async def wrapper(self, step):
-            session_id = getattr(self.state, 'conversation_id', 'unknown')
-            
-            # 获取 instrumentation 实例
-            instrumentation = getattr(self, '_instrumentation', None)
-            if not instrumentation:
-                return await original_method(step)
-            
-            # 开始行动步骤追踪
-            step_id = instrumentation.step_tracker.start_step(session_id, StepType.ACT, {
-                "step_number": len(self.state.react_steps) + 1,
-                "tool_calls_count": len(step.tool_calls)
-            })
-            
-            start_time = time.time()
-            
-            try:
-                with self._trace_span("agent.act", {
-                    "session.id": session_id,
-                    "step.number": len(self.state.react_steps) + 1,
-                    "tool.calls.count": len(step.tool_calls)
-                }):
-                    await original_method(step)
-                    
-                    # 记录执行结果
-                    act_data = {
-                        "tool_calls_count": len(step.tool_calls),
-                        "observations_count": len(step.observations),
-                        "successful_tools": sum(1 for obs in step.observations if obs.success),
-                        "failed_tools": sum(1 for obs in step.observations if not obs.success)
-                    }
-                    
-            except Exception as e:
-                self.performance_metrics["total_errors"] += 1
-                # 结束行动步骤追踪（失败）
-                instrumentation.step_tracker.end_step(session_id, step_id, None, StepStatus.FAILED, str(e))
-                raise
-            finally:
-                duration = time.time() - start_time
-                
-                # 结束行动步骤追踪（成功）
-                if 'act_data' in locals():
-                    instrumentation.step_tracker.end_step(session_id, step_id, act_data, StepStatus.SUCCESS)
-                
-                # 记录事件
-                self.data_collector.record_event(
-                    session_id=session_id,
-                    event_type="act",
-                    component="agent",
-                    data=act_data if 'act_data' in locals() else {},
-                    duration=duration,
-                    success=True
-                )
-                
-                # 记录指标
-                self._record_execution_metric("agent.act", duration, True)
-                
-        return wrapper 
+        return _ActWrapper(original_method, self)
         
     def _instrument_observe(self, original_method):
         """为 _observe 方法添加 instrumentation"""
-        @functools.wraps(original_method)
-        async def wrapper(self, step):
-            session_id = getattr(self.state, 'conversation_id', 'unknown')
-            
-            # 获取 instrumentation 实例
-            instrumentation = getattr(self, '_instrumentation', None)
-            if not instrumentation:
-                return await original_method(step)
-            
-            # 开始观察步骤追踪
-            step_id = instrumentation.step_tracker.start_step(session_id, StepType.OBSERVE, {
-                "step_number": len(self.state.react_steps) + 1,
-                "observations_count": len(step.observations)
-            })
-            
-            start_time = time.time()
-            
-            try:
-                with self._trace_span("agent.observe", {
-                    "session.id": session_id,
-                    "step.number": len(self.state.react_steps) + 1,
-                    "observations.count": len(step.observations)
-                }):
-                    await original_method(step)
-                    
-                    # 记录观察结果
-                    observe_data = {
-                        "observations_count": len(step.observations),
-                        "has_final_answer": bool(step.final_answer)
-                    }
-                    
-                    if step.final_answer:
-                        observe_data["final_answer_length"] = len(step.final_answer)
-                        
-            except Exception as e:
-                self.performance_metrics["total_errors"] += 1
-                # 结束观察步骤追踪（失败）
-                instrumentation.step_tracker.end_step(session_id, step_id, None, StepStatus.FAILED, str(e))
-                raise
-            finally:
-                duration = time.time() - start_time
-                
-                # 结束观察步骤追踪（成功）
-                if 'observe_data' in locals():
-                    instrumentation.step_tracker.end_step(session_id, step_id, observe_data, StepStatus.SUCCESS)
-                
-                # 记录事件
-                self.data_collector.record_event(
-                    session_id=session_id,
-                    event_type="observe",
-                    component="agent",
-                    data=observe_data if 'observe_data' in locals() else {},
-                    duration=duration,
-                    success=True
-                )
-                
-                # 记录指标
-                self._record_execution_metric("agent.observe", duration, True)
-                
-        return wrapper 
+        return _ObserveWrapper(original_method, self)
         
     def _instrument_llm_call(self, original_method):
         """为 _call_llm 方法添加 instrumentation"""
-        @functools.wraps(original_method)
-        async def wrapper(self, messages):
-            session_id = getattr(self.state, 'conversation_id', 'unknown')
-            start_time = time.time()
-            
-            # 准备 LLM 调用数据
-            llm_data = {
-                "messages_count": len(messages),
-                "total_tokens_estimate": sum(len(msg.get("content", "")) for msg in messages),
-                "model": getattr(self.config.llm, 'model', 'unknown')
-            }
-            
-            try:
-                with self._trace_span("agent.llm_call", {
-                    "session.id": session_id,
-                    "llm.messages.count": len(messages),
-                    "llm.model": llm_data["model"]
-                }):
-                    result = await original_method(messages)
-                    
-                    # 记录 LLM 响应数据
-                    llm_data.update({
-                        "response_length": len(result.get("content", "")),
-                        "usage_tokens": result.get("usage", {}).get("total_tokens", 0),
-                        "usage_prompt_tokens": result.get("usage", {}).get("prompt_tokens", 0),
-                        "usage_completion_tokens": result.get("usage", {}).get("completion_tokens", 0)
-                    })
-                    
-            except Exception as e:
-                self.performance_metrics["total_errors"] += 1
-                raise
-            finally:
-                duration = time.time() - start_time
-                self.performance_metrics["llm_calls"] += 1
-                
-                # 记录事件
-                self.data_collector.record_event(
-                    session_id=session_id,
-                    event_type="llm_call",
-                    component="agent",
-                    data=llm_data,
-                    duration=duration,
-                    success=True
-                )
-                
-                # 记录指标
-                self._record_execution_metric("agent.llm_call", duration, True)
-                
-            return result
-            
-        return wrapper 
+        return _LLMCallWrapper(original_method, self)
         
     def _instrument_tool_execution(self, original_method):
         """为工具执行方法添加 instrumentation"""
-        @functools.wraps(original_method)
-        async def wrapper(self, tool_name: str, **kwargs):
-            start_time = time.time()
-            
-            # 准备工具执行数据
-            tool_data = {
-                "tool_name": tool_name,
-                "arguments": kwargs,
-                "arguments_count": len(kwargs)
-            }
-            
-            try:
-                with self._trace_span("tool.execution", {
-                    "tool.name": tool_name,
-                    "tool.arguments.count": len(kwargs)
-                }):
-                    result = await original_method(tool_name, **kwargs)
-                    
-                    # 记录工具执行结果
-                    tool_data.update({
-                        "success": result.success,
-                        "result_length": len(str(result.result)) if result.success else 0,
-                        "error_message": result.error if not result.success else None
-                    })
-                    
-            except Exception as e:
-                self.performance_metrics["total_errors"] += 1
-                raise
-            finally:
-                duration = time.time() - start_time
-                self.performance_metrics["tool_executions"] += 1
-                
-                # 记录事件
-                self.data_collector.record_event(
-                    session_id="tool_execution",
-                    event_type="tool_execution",
-                    component="executor",
-                    data=tool_data,
-                    duration=duration,
-                    success=tool_data.get("success", False)
-                )
-                
-                # 记录指标
-                self._record_execution_metric(f"tool.{tool_name}", duration, tool_data.get("success", False))
-                
-            return result
-            
-        return wrapper 
+        return _ToolExecutionWrapper(original_method, self)
         
     def _instrument_memory_operation(self, original_method, operation_name: str):
         """为记忆操作添加 instrumentation"""
-        @functools.wraps(original_method)
-        async def wrapper(self, *args, **kwargs):
-            start_time = time.time()
-            
-            # 准备记忆操作数据
-            memory_data = {
-                "operation": operation_name,
-                "args_count": len(args),
-                "kwargs_count": len(kwargs)
-            }
-            
-            try:
-                with self._trace_span("memory.operation", {
-                    "memory.operation": operation_name
-                }):
-                    result = await original_method(*args, **kwargs)
-                    
-                    # 记录记忆操作结果
-                    if operation_name == "add_memory":
-                        memory_data["content_length"] = len(args[0]) if args else 0
-                    elif operation_name == "search_memory":
-                        memory_data["query_length"] = len(args[0]) if args else 0
-                        memory_data["results_count"] = len(result) if isinstance(result, list) else 1
-                    elif operation_name == "end_conversation":
-                        memory_data["summary_length"] = len(result) if result else 0
-                        
-            except Exception as e:
-                self.performance_metrics["total_errors"] += 1
-                raise
-            finally:
-                duration = time.time() - start_time
-                self.performance_metrics["memory_operations"] += 1
-                
-                # 记录事件
-                self.data_collector.record_event(
-                    session_id="memory_operation",
-                    event_type="memory_operation",
-                    component="memory",
-                    data=memory_data,
-                    duration=duration,
-                    success=True
-                )
-                
-                # 记录指标
-                self._record_execution_metric(f"memory.{operation_name}", duration, True)
-                
-            return result
-            
-        return wrapper
-        
-    @contextmanager
-    def _trace_span(self, name: str, attributes: Optional[Dict[str, Any]] = None):
-        """创建追踪 span 的上下文管理器"""
-        if self.ot_integration and self.ot_integration.is_available():
-            with self.ot_integration.trace_execution(name, attributes or {}) as span:
-                yield span
-        else:
-            yield None
+        return _MemoryOperationWrapper(original_method, self, operation_name)
+        
+    def _trace_span(self, name: str, keys: tuple = (), values: tuple = ()):
+        """创建追踪 span 的上下文管理器（属性字典只在追踪可用时构建）"""
+        if self._trace_enabled:
+            return self.ot_integration.trace_execution(name, dict(zip(keys, values)))
+        return _NO_SPAN
             
     def _record_execution_metric(self, name: str, duration: float, success: bool):
         """记录执行指标"""
-        if self.ot_integration and self.ot_integration.is_available():
+        if self._trace_enabled:
             self.ot_integration.record_execution(name, duration, success)
-            
+    
+    def _enqueue_event(self, session_id: str, event_type: str, component: str, data: Any,
+                       duration_ns: int, success: bool, error_message: Optional[str],
+                       metric_name: str):
+        """把事件压入队列，由 flush_events 批量记录事件和指标（耗时单位为纳秒）"""
+        self._event_queue.append(
+            (session_id, event_type, component, data, duration_ns, success, error_message, metric_name)
+        )
+        if self._drain_scheduled:
+            return
+        self._drain_scheduled = True
+        try:
+            self._io_executor.submit(self.flush_events)
+        except RuntimeError:
+            # 已关闭时直接处理
+            self.flush_events()
+    
+    def flush_events(self) -> int:
+        """处理队列中的全部事件，返回处理的事件数"""
+        self._drain_scheduled = False
+        queue = self._event_queue
+        record_event = self.data_collector.record_event
+        count = 0
+        while True:
+            try:
+                (session_id, event_type, component, data, duration_ns,
+                 success, error_message, metric_name) = queue.popleft()
+            except IndexError:
+                # 队列已空（后台线程与调用方可能同时处理）
+                break
+            duration = duration_ns / 1e9
+            if event_type == "process_message":
+                user_message, result = data
+                data = {
+                    "user_message_len": len(user_message),
+                    "result_len": len(result) if result else 0,
+                    "duration": duration,
+                    "success": success
+                }
+                if self.config.enable_custom_attributes:
+                    data["user_message_preview"] = user_message[:_PREVIEW_CHARS]
+                    data["result_preview"] = (result or "")[:_PREVIEW_CHARS]
+            elif event_type == "llm_call":
+                data, messages = data
+                data["total_tokens_estimate"] = sum(
+                    len(msg.get("content") or "") for msg in messages
+                )
+            try:
+                record_event(
+                    session_id=session_id,
+                    event_type=event_type,
+                    component=component,
+                    data=data,
+                    duration=duration,
+                    success=success,
+                    error_message=error_message
+                )
+                self._record_execution_metric(metric_name, duration, success)
+            except Exception as e:
+                logger.error(f"记录事件失败: {e}")
+            count += 1
+        return count
+            
+    @property
+    def performance_metrics(self) -> Dict[str, int]:
+        """性能指标快照"""
+        return asdict(self._counters)
+    
+    def close(self) -> None:
+        """等待后台线程处理完已入队的事件并关闭"""
+        self._io_executor.shutdown(wait=True)
+        self.flush_events()
+    
     def get_performance_metrics(self) -> Dict[str, Any]:
         """获取性能指标"""
-        return self.performance_metrics.copy()
+        return asdict(self._counters)
         
     def get_statistics(self) -> Dict[str, Any]:
         """获取统计信息"""
+        self.flush_events()
         return {
             "performance_metrics": self.get_performance_metrics(),
             "data_collector_stats": self.data_collector.get_statistics()
@@ -592,6 +743,8 @@ def initialize_global_instrumentation(config: Optional[InstrumentationConfig] =
     global _global_instrumentation
     if _global_instrumentation is None:
         _global_instrumentation = CustomInstrumentation(config)
+    elif config is not None and config != _global_instrumentation.config:
+        logger.warning("全局 instrumentation 已初始化，忽略新的配置")
     return _global_instrumentation
 
 
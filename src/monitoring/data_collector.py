@@ -7,20 +7,24 @@
 
 import time
 import json
+import itertools
 import logging
-from typing import Dict, Any, Optional, List
+import threading
+from collections import Counter
+from typing import Dict, Any, Optional, List, NamedTuple
 from datetime import datetime
-from dataclasses import dataclass, asdict
 from contextlib import contextmanager
 
 from .opentelemetry_integration import get_global_integration
 
 logger = logging.getLogger(__name__)
 
+# span 属性中成功标志的字符串形式
+_BOOL_STR = {True: "true", False: "false"}
 
-@dataclass
-class ExecutionEvent:
-    """执行事件数据结构"""
+
+class ExecutionEvent(NamedTuple):
+    """执行事件数据结构（命名元组，构造和存储开销小）"""
     event_id: str
     session_id: str
     timestamp: float
@@ -41,21 +45,54 @@ class DataCollector:
         self.sessions: Dict[str, Dict[str, Any]] = {}
         self.ot_integration = get_global_integration()
         
+        # 按事件类型累计的事件数，get_statistics 无需遍历所有事件
+        self._event_type_counts: Counter = Counter()
+        self._total_events = 0
+        
+        # 事件序号，保证同一毫秒内的事件ID也不重复
+        self._event_seq = itertools.count()
+        
+        # 事件可能在 instrumentation 的后台线程中记录，而会话的开始/结束和统计在
+        # 事件循环线程中进行，会话表和累计计数的读写都需持有此锁
+        self._lock = threading.Lock()
+        self.refresh()
+        
         logger.info("数据收集器初始化完成")
+    
+    def refresh(self):
+        """重新检测 OpenTelemetry 可用性并绑定导出方法（集成状态变化后调用）"""
+        if self.ot_integration is None:
+            self.ot_integration = get_global_integration()
+        self._ot_available = bool(self.ot_integration and self.ot_integration.is_available())
+        if self._ot_available:
+            self._trace = self.ot_integration.trace_execution
+            self._record = self.ot_integration.record_execution
+            self._record_fast = self.ot_integration.record_execution_fast
+        else:
+            self._trace = None
+            self._record = None
+            self._record_fast = None
         
     def start_session(self, session_id: str, metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """开始新的执行会话"""
         session = {
             "session_id": session_id,
-            "start_time": time.time(),
+            "start_time": time.time(),  # 墙钟时间，仅用于展示
+            "start_ns": time.monotonic_ns(),  # 单调时钟，用于计算会话时长
             "events": [],
             "metadata": metadata or {}
         }
         
-        self.sessions[session_id] = session
+        with self._lock:
+            replaced = self.sessions.get(session_id)
+            if replaced is not None:
+                # 同ID会话被替换，其事件不再计入统计
+                self._event_type_counts.subtract(event.event_type for event in replaced["events"])
+                self._total_events -= len(replaced["events"])
+            self.sessions[session_id] = session
         
         # 记录到 OpenTelemetry
-        if self.ot_integration and self.ot_integration.is_available():
+        if self._ot_available:
             attributes = {
                 "session.id": session_id,
                 "session.start_time": session["start_time"]
@@ -63,7 +100,7 @@ class DataCollector:
             if metadata:
                 attributes.update(metadata)
                 
-            with self.ot_integration.trace_execution(
+            with self._trace(
                 "session.start",
                 attributes=attributes
             ):
@@ -77,65 +114,80 @@ class DataCollector:
                     success: bool = True, error_message: Optional[str] = None,
                     metadata: Optional[Dict[str, Any]] = None) -> Optional[ExecutionEvent]:
         """记录执行事件"""
-        session = self.sessions.get(session_id)
-        if not session:
-            logger.warning(f"会话不存在，无法记录事件: {session_id}")
-            return None
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if not session:
+                logger.warning(f"会话不存在，无法记录事件: {session_id}")
+                return None
+                
+            event = ExecutionEvent(
+                f"{session_id}_{event_type}_{next(self._event_seq)}",
+                session_id,
+                time.time(),
+                event_type,
+                component,
+                data,
+                duration,
+                success,
+                error_message,
+                metadata or {}
+            )
             
-        event = ExecutionEvent(
-            event_id=f"{session_id}_{event_type}_{int(time.time() * 1000)}",
-            session_id=session_id,
-            timestamp=time.time(),
-            event_type=event_type,
-            component=component,
-            data=data,
-            duration=duration,
-            success=success,
-            error_message=error_message,
-            metadata=metadata or {}
-        )
+            session["events"].append(event)
+            self._event_type_counts[event_type] += 1
+            self._total_events += 1
         
-        session["events"].append(event)
-        
-        # 记录到 OpenTelemetry
-        if self.ot_integration and self.ot_integration.is_available():
-            attributes = {
-                "session.id": session_id,
-                "event.type": event_type,
-                "event.component": component,
-                "event.success": str(success).lower()
-            }
-            if metadata:
-                attributes.update(metadata)
-                
-            if duration:
-                attributes["event.duration"] = duration
-                
-            if error_message:
-                attributes["event.error"] = error_message
-                
-            with self.ot_integration.trace_execution(
-                f"event.{event_type}",
-                attributes=attributes
-            ):
-                pass
-                
-            if duration:
-                self.ot_integration.record_execution(
-                    f"event.{event_type}",
-                    duration,
-                    success,
-                    attributes
-                )
-                
-        logger.debug(f"记录事件: {session_id} - {event_type} - {component}")
+        logger.debug("记录事件: %s - %s - %s", session_id, event_type, component)
+        if self._ot_available:
+            # instrumentation 已在后台线程中调用这里，直接导出即可
+            try:
+                self._export_event(event)
+            except Exception as e:
+                logger.error(f"导出事件失败: {e}")
         return event
+    
+    def _export_event(self, event: ExecutionEvent):
+        """把单个事件记录到 OpenTelemetry
+
+        默认只记录执行指标；metadata 中 span_needed 为真时才创建 span。
+        """
+        name = f"event.{event.event_type}"
+        if not (event.metadata and event.metadata.get("span_needed")):
+            if event.duration:
+                self._record_fast(name, event.duration, event.success)
+            return
         
+        attributes = {
+            "session.id": event.session_id,
+            "event.type": event.event_type,
+            "event.component": event.component,
+            "event.success": _BOOL_STR[bool(event.success)]
+        }
+        if event.metadata:
+            attributes.update(event.metadata)
+            
+        if event.duration:
+            attributes["event.duration"] = event.duration
+            
+        if event.error_message:
+            attributes["event.error"] = event.error_message
+            
+        with self._trace(name, attributes=attributes):
+            pass
+            
+        if event.duration:
+            self._record(
+                name,
+                event.duration,
+                event.success,
+                attributes
+            )
+    
     @contextmanager
     def trace_event(self, session_id: str, event_type: str, component: str,
                    data: Dict[str, Any], metadata: Optional[Dict[str, Any]] = None):
         """追踪事件的上下文管理器"""
-        start_time = time.time()
+        start_ns = time.monotonic_ns()
         success = True
         error_message = None
         
@@ -146,7 +198,7 @@ class DataCollector:
             error_message = str(e)
             raise
         finally:
-            duration = time.time() - start_time
+            duration = (time.monotonic_ns() - start_ns) / 1e9
             self.record_event(
                 session_id=session_id,
                 event_type=event_type,
@@ -158,20 +210,38 @@ class DataCollector:
                 metadata=metadata
             )
             
+    @contextmanager
+    def trace_event_metric_only(self, event_type: str):
+        """只记录执行指标的事件追踪上下文管理器（不创建事件和 span）"""
+        start_ns = time.monotonic_ns()
+        success = True
+        
+        try:
+            yield
+        except Exception:
+            success = False
+            raise
+        finally:
+            if self._ot_available:
+                # 指标上报失败不能覆盖调用方的异常
+                try:
+                    self._record_fast(f"event.{event_type}", (time.monotonic_ns() - start_ns) / 1e9, success)
+                except Exception as e:
+                    logger.error(f"记录事件指标失败: {e}")
+            
     def get_session(self, session_id: str) -> Optional[Dict[str, Any]]:
         """获取会话信息"""
         return self.sessions.get(session_id)
         
     def get_statistics(self) -> Dict[str, Any]:
         """获取统计信息"""
-        total_sessions = len(self.sessions)
-        total_events = sum(len(s["events"]) for s in self.sessions.values())
-        
-        event_types = {}
-        for session in self.sessions.values():
-            for event in session["events"]:
-                event_types[event.event_type] = event_types.get(event.event_type, 0) + 1
-                
+        with self._lock:
+            total_sessions = len(self.sessions)
+            total_events = self._total_events
+            event_types = {
+                event_type: count
+                for event_type, count in self._event_type_counts.items() if count > 0
+            }
         return {
             "total_sessions": total_sessions,
             "total_events": total_events,
@@ -181,32 +251,54 @@ class DataCollector:
 
     def end_session(self, session_id: str, metadata: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         """结束执行会话"""
-        session = self.sessions.get(session_id)
-        if not session:
-            logger.warning(f"会话不存在: {session_id}")
-            return None
-            
-        session["end_time"] = time.time()
-        if metadata:
-            session["metadata"].update(metadata)
+        with self._lock:
+            session = self.sessions.get(session_id)
+            if not session:
+                logger.warning(f"会话不存在: {session_id}")
+                return None
+                
+            session["end_time"] = time.time()
+            duration = (time.monotonic_ns() - session["start_ns"]) / 1e9
+            if metadata:
+                session["metadata"].update(metadata)
+            event_count = len(session["events"])
             
         # 记录到 OpenTelemetry
-        if self.ot_integration and self.ot_integration.is_available():
-            duration = session["end_time"] - session["start_time"]
+        if self._ot_available:
             attributes = {
                 "session.id": session_id,
                 "session.duration": duration,
-                "session.event_count": len(session["events"])
+                "session.event_count": event_count
             }
             if metadata:
                 attributes.update(metadata)
                 
-            self.ot_integration.record_execution(
-                "session.end",
-                duration,
-                success=True,
-                attributes=attributes
-            )
+            try:
+                self._record(
+                    "session.end",
+                    duration,
+                    success=True,
+                    attributes=attributes
+                )
+            except Exception as e:
+                logger.error(f"记录会话指标失败: {e}")
             
-        logger.info(f"结束会话: {session_id}, 持续时间: {session['end_time'] - session['start_time']:.2f}秒")
-        return session 
\ No newline at end of file
+        logger.info(f"结束会话: {session_id}, 持续时间: {duration:.2f}秒")
+        return session 
+
+
+# 全局实例
+_global_data_collector: Optional[DataCollector] = None
+
+
+def get_global_data_collector() -> Optional[DataCollector]:
+    """获取全局数据收集器实例"""
+    return _global_data_collector
+
+
+def initialize_global_data_collector(config: Optional[Dict[str, Any]] = None) -> DataCollector:
+    """初始化全局数据收集器"""
+    global _global_data_collector
+    if _global_data_collector is None:
+        _global_data_collector = DataCollector(config)
+    return _global_data_collector
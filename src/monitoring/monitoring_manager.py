@@ -21,16 +21,23 @@ logger = logging.getLogger(__name__)
 class MonitoringManager:
     """监控管理器"""
     
-    def __init__(self):
-        self.config = get_config()
+    def __init__(self, config=None):
+        self.config = config if config is not None else get_config()
         self.instrumentation: Optional[CustomInstrumentation] = None
         self.is_initialized = False
         
-    def initialize(self) -> bool:
-        """初始化监控系统"""
+    def initialize(self, config=None) -> bool:
+        """初始化监控系统
+
+        config 为 None 时使用构造时的配置；传入时（例如 Agent 自己的配置）
+        以其为准，因为配置只读，派生的配置不会反映到全局 get_config() 中。
+        """
         if self.is_initialized:
             return True
             
+        if config is not None:
+            self.config = config
+            
         if not self.config.monitoring.enable_monitoring:
             logger.info("监控功能已禁用，跳过初始化")
             return False
@@ -40,7 +47,9 @@ class MonitoringManager:
             if self.config.monitoring.enable_opentelemetry:
                 initialize_global_integration({
                     "service_name": self.config.monitoring.service_name,
-                    "service_version": self.config.monitoring.service_version
+                    "service_version": self.config.monitoring.service_version,
+                    "otlp_endpoint": self.config.monitoring.otlp_endpoint,
+                    "console_debug": self.config.monitoring.console_span_export
                 })
                 logger.info("OpenTelemetry 集成已初始化")
             
@@ -181,10 +190,10 @@ def initialize_monitoring() -> bool:
 
 
 def instrument_agent_with_monitoring(agent_instance) -> bool:
-    """为 Agent 实例添加监控（便捷函数）"""
+    """为 Agent 实例添加监控（便捷函数），未初始化时使用 Agent 自身的配置"""
     manager = get_monitoring_manager()
     if not manager.is_initialized:
-        manager.initialize()
+        manager.initialize(getattr(agent_instance, "config", None))
     return manager.instrument_agent(agent_instance)
 
 
@@ -7,6 +7,7 @@ OpenTelemetry 集成模块
 
 import os
 import logging
+from functools import lru_cache
 from typing import Optional, Dict, Any
 from contextlib import contextmanager
 
@@ -14,7 +15,7 @@ try:
     from opentelemetry import trace
     from opentelemetry import metrics
     from opentelemetry.sdk.trace import TracerProvider
-    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter, SimpleSpanProcessor
     from opentelemetry.sdk.metrics import MeterProvider
     from opentelemetry.sdk.metrics.export import ConsoleMetricExporter, PeriodicExportingMetricReader
     from opentelemetry.sdk.resources import Resource
@@ -26,13 +27,39 @@ except ImportError:
     TracerProvider = None
     BatchSpanProcessor = None
     ConsoleSpanExporter = None
+    SimpleSpanProcessor = None
     MeterProvider = None
     ConsoleMetricExporter = None
     PeriodicExportingMetricReader = None
     Resource = None
 
+try:
+    from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+    OTLP_EXPORTER_AVAILABLE = True
+except ImportError:
+    OTLP_EXPORTER_AVAILABLE = False
+    OTLPSpanExporter = None
+
 logger = logging.getLogger(__name__)
 
+# BatchSpanProcessor 参数（面向大量 think/act/observe span 的生产者）
+_SPAN_MAX_QUEUE_SIZE = 10000
+_SPAN_MAX_EXPORT_BATCH_SIZE = 512
+_SPAN_SCHEDULE_DELAY_MILLIS = 5000
+_SPAN_EXPORT_TIMEOUT_MILLIS = 30000
+
+
+@lru_cache(maxsize=1024)
+def _metric_attributes(name: str, success: bool) -> Dict[str, str]:
+    """执行指标的属性字典（按名称和成功标志缓存复用，调用方不可修改）"""
+    return {"name": name, "success": "true" if success else "false"}
+
+
+@lru_cache(maxsize=1024)
+def _error_attributes(name: str) -> Dict[str, str]:
+    """错误计数器的属性字典（按名称缓存复用，调用方不可修改）"""
+    return {"name": name}
+
 
 class OpenTelemetryIntegration:
     """OpenTelemetry 集成类"""
@@ -83,11 +110,30 @@ class OpenTelemetryIntegration:
     def _setup_exporters(self):
         """设置导出器"""
         try:
-            console_exporter = ConsoleSpanExporter()
-            self.tracer_provider.add_span_processor(
-                BatchSpanProcessor(console_exporter)
-            )
-            logger.info("控制台导出器已配置")
+            if OTLP_EXPORTER_AVAILABLE:
+                endpoint = self.config.get("otlp_endpoint")
+                otlp_exporter = OTLPSpanExporter(endpoint=endpoint) if endpoint else OTLPSpanExporter()
+                self.tracer_provider.add_span_processor(
+                    BatchSpanProcessor(
+                        otlp_exporter,
+                        max_queue_size=_SPAN_MAX_QUEUE_SIZE,
+                        max_export_batch_size=_SPAN_MAX_EXPORT_BATCH_SIZE,
+                        schedule_delay_millis=_SPAN_SCHEDULE_DELAY_MILLIS,
+                        export_timeout_millis=_SPAN_EXPORT_TIMEOUT_MILLIS
+                    )
+                )
+                logger.info(f"OTLP 导出器已配置: {endpoint or '默认端点'}")
+            
+            # 控制台导出器同步写 stdout，仅用于调试
+            if self.config.get("console_debug"):
+                self.tracer_provider.add_span_processor(
+                    SimpleSpanProcessor(ConsoleSpanExporter())
+                )
+                logger.info("控制台导出器已配置（调试）")
+            elif not OTLP_EXPORTER_AVAILABLE:
+                logger.warning(
+                    "未安装 opentelemetry-exporter-otlp-proto-grpc，span 将不会被导出"
+                )
                 
         except Exception as e:
             logger.error(f"设置导出器失败: {e}")
@@ -114,6 +160,8 @@ class OpenTelemetryIntegration:
             )
             
             self._initialized = True
+            # 初始化成功后 record_execution 直接走快速路径，不再逐次检查可用性
+            self.record_execution = self.record_execution_fast
             logger.info("OpenTelemetry 工具设置完成")
             
         except Exception as e:
@@ -153,22 +201,20 @@ class OpenTelemetryIntegration:
         if not self.is_available():
             return
             
-        try:
-            self.execution_counter.add(1, {
-                "name": name,
-                "success": str(success).lower()
-            })
-            
-            self.execution_duration.record(duration, {
-                "name": name,
-                "success": str(success).lower()
-            })
-            
-            if not success:
-                self.error_counter.add(1, {"name": name})
-                
-        except Exception as e:
-            logger.error(f"记录执行指标失败: {e}")
+        self.record_execution_fast(name, duration, success)
+    
+    def record_execution_fast(self, name: str, duration: float, success: bool = True,
+                              attributes: Optional[Dict[str, Any]] = None):
+        """只记录计数器和直方图（不检查可用性，属性字典缓存复用），供已确认可用的调用方使用"""
+        metric_attributes = _metric_attributes(name, bool(success))
+        self.execution_counter.add(1, metric_attributes)
+        self.execution_duration.record(duration, metric_attributes)
+        
+        if not success:
+            try:
+                self.error_counter.add(1, _error_attributes(name))
+            except Exception as e:
+                logger.error(f"记录错误指标失败: {e}")
             
     def shutdown(self):
         """关闭 OpenTelemetry 集成"""
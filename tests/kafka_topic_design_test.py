@@ -19,7 +19,8 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
 from src.data_pipeline.kafka_topic_design import (
     TopicType, ExecutionStatus, StepType, EventType,
     ExecutionRecord, MetricRecord, EventRecord,
-    KafkaTopicDesign, MetricNames, get_topic_design
+    KafkaTopicDesign, MetricNames, get_topic_design,
+    MSGSPEC_AVAILABLE, serialize_batch
 )
 
 
@@ -208,11 +209,83 @@ class TestDataStructures(unittest.TestCase):
         # 反序列化
         execution_parsed = json.loads(execution_json)
         
+        # 字节序列化与 JSON 字符串一致，且内容与 to_dict 相同
+        self.assertEqual(execution.to_bytes(), execution_json.encode("utf-8"))
+        self.assertEqual(execution_parsed, execution_dict)
+        
         # 验证
         self.assertEqual(execution_dict["execution_id"], "test_001")
         self.assertEqual(execution_parsed["execution_id"], "test_001")
         self.assertEqual(execution_dict["start_time"], 1234567890.0)
         self.assertEqual(execution_parsed["start_time"], 1234567890.0)
+        self.assertIsInstance(execution_dict["timestamp"], float)
+    
+    def test_execution_record_iso_timestamp(self):
+        """测试执行记录按需输出 ISO-8601 时间戳"""
+        execution = ExecutionRecord(
+            execution_id="test_001",
+            session_id="session_001",
+            agent_id="agent_001",
+            user_message="test message",
+            start_time=1234567890.0,
+            timestamp=1234567890.5
+        )
+        
+        expected = datetime.fromtimestamp(1234567890.5).isoformat()
+        self.assertEqual(execution.to_dict(iso_timestamp=True)["timestamp"], expected)
+        self.assertEqual(json.loads(execution.to_json(iso_timestamp=True))["timestamp"], expected)
+        self.assertEqual(datetime.fromisoformat(expected).timestamp(), 1234567890.5)
+
+    
+    def test_serialize_batch(self):
+        """测试批量序列化"""
+        records = [
+            MetricRecord(
+                metric_id=f"metric_{i:03d}",
+                metric_name=MetricNames.LLM_CALL_COUNT,
+                metric_type="counter",
+                value=float(i)
+            )
+            for i in range(3)
+        ]
+        
+        payloads = serialize_batch(records)
+        self.assertEqual(payloads, [record.to_bytes() for record in records])
+        
+        with self.assertRaises(ValueError):
+            serialize_batch(records, fmt="xml")
+    
+    @unittest.skipUnless(MSGSPEC_AVAILABLE, "msgspec 未安装")
+    def test_record_msgpack_serialization(self):
+        """测试 msgpack 序列化"""
+        import msgspec
+        
+        records = [
+            ExecutionRecord(
+                execution_id="test_001",
+                session_id="session_001",
+                agent_id="agent_001",
+                user_message="test message",
+                start_time=1234567890.0,
+                status=ExecutionStatus.SUCCESS
+            ),
+            MetricRecord(
+                metric_id="metric_001",
+                metric_name=MetricNames.STEP_COUNT,
+                metric_type="counter",
+                value=1.0,
+                labels={"step": "think"}
+            ),
+            EventRecord(
+                event_id="event_001",
+                event_type=EventType.TOOL_CALL,
+                event_data={"tool": "read_file"}
+            ),
+        ]
+        
+        for record in records:
+            decoded = msgspec.msgpack.decode(record.to_msgpack())
+            self.assertEqual(decoded, record.to_dict())
 
 
 if __name__ == "__main__":
@@ -54,6 +54,48 @@ class TestCustomInstrumentation:
         assert instrumentation.performance_metrics["agent_executions"] == 0
         assert instrumentation.performance_metrics["tool_executions"] == 0
         
+    def test_shared_data_collector(self, instrumentation_config):
+        """测试多个 instrumentation 共享同一个数据收集器"""
+        first = CustomInstrumentation(instrumentation_config)
+        second = CustomInstrumentation(InstrumentationConfig(enable_llm_tracing=False))
+        
+        assert first.data_collector is second.data_collector
+        
+    def test_session_cache_invalidation(self, instrumentation_config):
+        """测试会话ID缓存及新会话时的失效"""
+        instrumentation = CustomInstrumentation(instrumentation_config)
+        agent = MockAgent()
+
+        assert instrumentation._session_id(agent) == "test_session_123"
+        assert instrumentation._model_name(agent) == "gpt-3.5-turbo"
+
+        agent.state.conversation_id = "test_session_456"
+        assert instrumentation._session_id(agent) == "test_session_123"
+
+        instrumentation.invalidate_session(agent)
+        assert instrumentation._session_id(agent) == "test_session_456"
+
+    def test_events_recorded_in_background(self, instrumentation_config):
+        """测试事件入队后由后台线程批量记录"""
+        instrumentation = CustomInstrumentation(instrumentation_config)
+        instrumentation.data_collector.start_session("queued_session")
+
+        instrumentation._enqueue_event(
+            "queued_session", "process_message", "agent", ("你好", "结果"),
+            10_000_000, True, None, "agent.process_message"
+        )
+        instrumentation.close()
+        session = instrumentation.data_collector.sessions["queued_session"]
+        assert len(session["events"]) == 1
+        event = session["events"][0]
+        assert event.data["user_message_len"] == 2
+        assert event.data["user_message_preview"] == "你好"
+        assert event.data["result_len"] == 2
+        assert event.data["result_preview"] == "结果"
+        assert "user_message" not in event.data
+        assert event.duration == pytest.approx(0.01)
+        assert not instrumentation._event_queue
+
     def test_instrument_agent_methods(self, instrumentation_config):
         """测试为 Agent 方法添加 instrumentation"""
         with patch('src.monitoring.custom_instrumentation.get_global_integration') as mock:
@@ -96,6 +138,102 @@ class TestCustomInstrumentation:
             assert result == "处理结果: 测试消息"
             assert instrumentation.performance_metrics["agent_executions"] == 1
             assert instrumentation.performance_metrics["total_errors"] == 0
+            
+    @pytest.mark.asyncio
+    async def test_fast_path_when_tracing_and_metrics_disabled(self):
+        """测试追踪不可用且关闭性能指标时包装器直接调用原方法"""
+        with patch('src.monitoring.custom_instrumentation.get_global_integration') as mock:
+            mock_integration = Mock()
+            mock_integration.is_available.return_value = False
+            mock.return_value = mock_integration
+            
+            instrumentation = CustomInstrumentation(
+                InstrumentationConfig(enable_performance_metrics=False)
+            )
+            agent = MockAgent()
+            agent.state.conversation_id = "fast_path_session"
+            wrapped = instrumentation._instrument_process_message(agent.process_message)
+            wrapped._agent_instance = agent
+            
+            assert await wrapped("测试消息") == "处理结果: 测试消息"
+            assert instrumentation.performance_metrics["agent_executions"] == 0
+            assert "fast_path_session" not in instrumentation.data_collector.sessions
+            
+            # 集成变为可用后刷新，包装器恢复记录
+            mock_integration.is_available.return_value = True
+            instrumentation.refresh()
+            assert not instrumentation._fast_noop
+
+            
+    @pytest.mark.asyncio
+    async def test_think_wrapper_records_step(self, instrumentation_config):
+        """测试 _think 包装器通过所属 agent 记录思考步骤"""
+        instrumentation = CustomInstrumentation(instrumentation_config)
+        agent = MockAgent()
+        step = Mock(thought=None, tool_calls=[], final_answer="完成")
+        
+        async def think(current_step):
+            current_step.thought = Mock(content="思考内容")
+        
+        wrapped = instrumentation._instrument_think(think)
+        wrapped._agent_instance = agent
+        instrumentation.data_collector.start_session("test_session_123")
+        
+        assert wrapped.__name__ == "think"
+        assert wrapped.__wrapped__ is think
+        await wrapped(step)
+        
+        instrumentation.close()
+        assert len(instrumentation.data_collector.sessions["test_session_123"]["events"]) == 1
+        event = instrumentation.data_collector.sessions["test_session_123"]["events"][0]
+        assert event.event_type == "think"
+        assert event.data["thought_content"] == "思考内容"
+
+            
+    @pytest.mark.asyncio
+    async def test_llm_wrapper_estimates_tokens_at_flush(self, instrumentation_config):
+        """测试 LLM 包装器的 token 估算在出队时计算"""
+        instrumentation = CustomInstrumentation(instrumentation_config)
+        agent = MockAgent()
+        
+        async def call_llm(messages):
+            return {"content": "回答", "usage": {"total_tokens": 12}}
+        
+        wrapped = instrumentation._instrument_llm_call(call_llm)
+        wrapped._agent_instance = agent
+        instrumentation.data_collector.start_session("test_session_123")
+        
+        messages = [
+            {"role": "system", "content": "系统提示"},
+            {"role": "user", "content": "你好"}
+        ]
+        result = await wrapped(messages)
+        assert result["content"] == "回答"
+        
+        instrumentation.close()
+        event = instrumentation.data_collector.sessions["test_session_123"]["events"][0]
+        assert event.data["total_tokens_estimate"] == 6
+        assert event.data["usage_tokens"] == 12
+        assert event.data["model"] == "gpt-3.5-turbo"
+
+            
+    @pytest.mark.asyncio
+    async def test_tracing_flag_toggled_at_runtime(self, instrumentation_config):
+        """测试运行时关闭对应追踪开关后包装器直接调用原方法"""
+        instrumentation = CustomInstrumentation(instrumentation_config)
+        
+        async def add_memory(content):
+            return "memory_id"
+        
+        wrapped = instrumentation._instrument_memory_operation(add_memory, "add_memory")
+        instrumentation.config.enable_memory_tracing = False
+        
+        assert await wrapped("内容") == "memory_id"
+        assert instrumentation.performance_metrics["memory_operations"] == 0
+        
+        instrumentation.config.enable_memory_tracing = True
+        await wrapped("内容")
+        assert instrumentation.performance_metrics["memory_operations"] == 1
 
 
 if __name__ == "__main__":
@@ -7,6 +7,7 @@
 import unittest
 from unittest.mock import patch, MagicMock
 import time
+import threading
 import sys
 import os
 
@@ -181,6 +182,126 @@ class TestDataCollector(unittest.TestCase):
         self.assertEqual(stats["event_types"]["observe"], 1)
         self.assertIn("ot_integration_available", stats)
 
+    def test_end_session(self):
+        """测试结束会话"""
+        self.collector.start_session("session_end", {"user_id": "user123"})
+        
+        session = self.collector.end_session("session_end", {"status": "done"})
+        
+        self.assertIsNotNone(session)
+        self.assertGreaterEqual(session["end_time"], session["start_time"])
+        self.assertEqual(session["metadata"], {"user_id": "user123", "status": "done"})
+        self.assertIsNone(self.collector.end_session("nonexistent_session"))
+        
+    def test_event_ids_unique(self):
+        """测试连续记录的事件ID不重复"""
+        self.collector.start_session("session_ids")
+        events = [
+            self.collector.record_event("session_ids", "think", "component1", {})
+            for _ in range(5)
+        ]
+        
+        self.assertEqual(len({event.event_id for event in events}), 5)
+        
+    def test_get_statistics_after_session_restart(self):
+        """测试同ID会话重新开始后统计不再包含旧事件"""
+        self.collector.start_session("session_001")
+        self.collector.record_event("session_001", "think", "component1", {})
+        self.collector.record_event("session_001", "act", "component1", {})
+        
+        self.collector.start_session("session_001")
+        self.collector.record_event("session_001", "think", "component1", {})
+        
+        stats = self.collector.get_statistics()
+        
+        self.assertEqual(stats["total_sessions"], 1)
+        self.assertEqual(stats["total_events"], 1)
+        self.assertEqual(stats["event_types"], {"think": 1})
+
+        
+    def test_events_exported_to_opentelemetry(self):
+        """测试记录事件时导出到 OpenTelemetry"""
+        ot_integration = MagicMock()
+        ot_integration.is_available.return_value = True
+        self.collector.ot_integration = ot_integration
+        self.collector.refresh()
+        self.collector.sessions["session_ot"] = {
+            "session_id": "session_ot",
+            "start_time": time.time(),
+            "start_ns": time.monotonic_ns(),
+            "events": [],
+            "metadata": {}
+        }
+        
+        event = self.collector.record_event(
+            "session_ot", "think", "component1", {"data": "test"}, duration=0.2
+        )
+        self.assertIsNotNone(event)
+        self.collector.record_event(
+            "session_ot", "act", "component1", {"data": "test"}, duration=0.3,
+            metadata={"span_needed": True}
+        )
+        
+        # 默认只记录指标，span_needed 的事件才创建 span
+        ot_integration.record_execution_fast.assert_called_once_with("event.think", 0.2, True)
+        ot_integration.trace_execution.assert_called_once()
+        self.assertEqual(ot_integration.trace_execution.call_args[0][0], "event.act")
+        ot_integration.record_execution.assert_called_once()
+        
+    def test_meter_errors_do_not_escape(self):
+        """测试指标上报失败不影响结束会话，也不覆盖调用方的异常"""
+        ot_integration = MagicMock()
+        ot_integration.is_available.return_value = True
+        ot_integration.record_execution.side_effect = RuntimeError("exporter down")
+        ot_integration.record_execution_fast.side_effect = RuntimeError("exporter down")
+        self.collector.ot_integration = ot_integration
+        self.collector.refresh()
+        
+        self.collector.start_session("session_err")
+        self.assertIsNotNone(self.collector.end_session("session_err"))
+        
+        with self.assertRaises(ValueError):
+            with self.collector.trace_event_metric_only("observe"):
+                raise ValueError("Test exception")
+        
+    def test_counts_consistent_across_threads(self):
+        """测试后台线程记录事件与会话重新开始并发时累计计数不漂移"""
+        self.collector.start_session("session_mt")
+        stop = threading.Event()
+        
+        def record():
+            while not stop.is_set():
+                self.collector.record_event("session_mt", "think", "component1", {})
+                
+        worker = threading.Thread(target=record)
+        worker.start()
+        for _ in range(200):
+            self.collector.start_session("session_mt")
+        stop.set()
+        worker.join()
+        
+        stored = len(self.collector.sessions["session_mt"]["events"])
+        stats = self.collector.get_statistics()
+        self.assertEqual(stats["total_events"], stored)
+        self.assertEqual(stats["event_types"].get("think", 0), stored)
+        
+    def test_trace_event_metric_only(self):
+        """测试只记录指标的事件追踪"""
+        ot_integration = MagicMock()
+        ot_integration.is_available.return_value = True
+        self.collector.ot_integration = ot_integration
+        self.collector.refresh()
+        
+        with self.assertRaises(ValueError):
+            with self.collector.trace_event_metric_only("observe"):
+                raise ValueError("Test exception")
+                
+        name, duration, success = ot_integration.record_execution_fast.call_args[0]
+        self.assertEqual(name, "event.observe")
+        self.assertFalse(success)
+        ot_integration.trace_execution.assert_not_called()
+        self.assertEqual(self.collector.get_statistics()["total_events"], 0)
+
 
 if __name__ == '__main__':
     unittest.main() 
\ No newline at end of file
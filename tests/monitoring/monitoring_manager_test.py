@@ -0,0 +1,92 @@
+"""
+监控管理器测试模块
+
+测试监控管理器按传入的配置初始化监控。
+"""
+
+import pytest
+from unittest.mock import Mock
+
+from src.config import get_config
+from src.monitoring import monitoring_manager
+from src.monitoring.monitoring_manager import (
+    MonitoringManager,
+    instrument_agent_with_monitoring
+)
+
+
+class MockAgent:
+    """模拟 Agent 类"""
+
+    def __init__(self, config):
+        self.config = config
+        self.state = Mock()
+        self.state.conversation_id = "manager_session"
+
+    async def process_message(self, user_message: str) -> str:
+        return user_message
+
+    async def _think(self, step):
+        pass
+
+    async def _act(self, step):
+        pass
+
+    async def _observe(self, step):
+        pass
+
+    async def _call_llm(self, messages):
+        return {}
+
+
+def monitoring_config(**updates):
+    """返回修改了监控配置的新配置实例"""
+    config = get_config()
+    defaults = {
+        "enable_opentelemetry": False,
+        "enable_step_tracking": False,
+        "enable_local_backup": False,
+    }
+    defaults.update(updates)
+    return config.model_copy(
+        update={"monitoring": config.monitoring.model_copy(update=defaults)}
+    )
+
+
+@pytest.fixture
+def fresh_manager(monkeypatch):
+    """替换全局监控管理器，避免测试之间互相影响"""
+    monkeypatch.setattr(monitoring_manager, "_global_monitoring_manager", None)
+
+
+class TestMonitoringManager:
+    """测试监控管理器"""
+
+    def test_global_config_disables_monitoring(self):
+        """测试默认全局配置下不启用监控"""
+        manager = MonitoringManager()
+
+        assert manager.config is get_config()
+        assert manager.initialize() is False
+        assert not manager.is_monitoring_enabled()
+
+    def test_initialize_with_explicit_config(self):
+        """测试传入的派生配置优先于全局配置"""
+        config = monitoring_config(enable_monitoring=True)
+        manager = MonitoringManager()
+
+        assert manager.initialize(config) is True
+        assert manager.config is config
+        assert manager.is_monitoring_enabled()
+
+    def test_instrument_agent_uses_agent_config(self, fresh_manager):
+        """测试为 Agent 添加监控时使用 Agent 自身的配置"""
+        agent = MockAgent(monitoring_config(enable_monitoring=True))
+
+        assert instrument_agent_with_monitoring(agent) is True
+        assert hasattr(agent.process_message, "__wrapped__")
+        assert monitoring_manager.get_monitoring_manager().config is agent.config
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-v"])
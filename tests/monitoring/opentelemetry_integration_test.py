@@ -60,6 +60,22 @@ class TestOpenTelemetryIntegration(unittest.TestCase):
                             self.assertEqual(integration.tracer, mock_tracer)
                             self.assertEqual(integration.meter, mock_meter)
                             
+    def test_span_exporters(self):
+        """测试 OTLP 导出器使用调优的批处理器，控制台导出器仅在调试时启用"""
+        with patch('src.monitoring.opentelemetry_integration.OTLP_EXPORTER_AVAILABLE', True):
+            with patch('src.monitoring.opentelemetry_integration.OTLPSpanExporter', create=True) as mock_otlp:
+                with patch('src.monitoring.opentelemetry_integration.BatchSpanProcessor') as mock_batch:
+                    with patch('src.monitoring.opentelemetry_integration.SimpleSpanProcessor') as mock_simple:
+                        integration = OpenTelemetryIntegration(self.config)
+                        
+                        mock_otlp.assert_called_once_with(endpoint="http://localhost:4317")
+                        self.assertEqual(mock_batch.call_args[1]["max_queue_size"], 10000)
+                        self.assertEqual(mock_batch.call_args[1]["max_export_batch_size"], 512)
+                        mock_simple.assert_not_called()
+                        
+                        OpenTelemetryIntegration(dict(self.config, console_debug=True))
+                        mock_simple.assert_called_once()
+                            
     def test_trace_execution_context_manager(self):
         """测试执行追踪上下文管理器"""
         with patch('src.monitoring.opentelemetry_integration.OPENTELEMETRY_AVAILABLE', True):
@@ -110,6 +126,8 @@ class TestOpenTelemetryIntegration(unittest.TestCase):
                             mock_trace.get_tracer.return_value = mock_tracer
                             
                             integration = OpenTelemetryIntegration(self.config)
+                            # 初始化成功后直接绑定快速路径
+                            self.assertEqual(integration.record_execution, integration.record_execution_fast)
                             
                             # 测试记录成功执行
                             integration.record_execution("test.operation", 1.5, True, {"key": "value"})
@@ -0,0 +1,61 @@
+"""CLI日志缓冲写入测试."""
+
+import logging
+import os
+import tempfile
+import time
+
+import pytest
+
+from src.cli.logging import BufferedFileHandler
+
+
+class TestBufferedFileHandler:
+    """缓冲文件处理器测试."""
+
+    def setup_method(self):
+        """设置测试环境."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.log_file = os.path.join(self.temp_dir, "cli.log")
+
+    def teardown_method(self):
+        """清理测试环境."""
+        if os.path.exists(self.log_file):
+            os.remove(self.log_file)
+        os.rmdir(self.temp_dir)
+
+    def _record(self, level: int, message: str) -> logging.LogRecord:
+        return logging.LogRecord("test", level, __file__, 0, message, None, None)
+
+    def _read(self) -> str:
+        with open(self.log_file, encoding="utf-8") as f:
+            return f.read()
+
+    def test_error_flushed_immediately(self):
+        """测试错误记录立即写入文件."""
+        handler = BufferedFileHandler(self.log_file, flush_interval=60)
+        try:
+            handler.handle(self._record(logging.INFO, "普通记录"))
+            assert self._read() == ""
+
+            handler.handle(self._record(logging.ERROR, "错误记录"))
+            assert self._read() == "普通记录\n错误记录\n"
+        finally:
+            handler.close()
+
+    def test_flushed_after_interval_without_new_records(self):
+        """测试没有新记录时也在刷新间隔后写入."""
+        handler = BufferedFileHandler(self.log_file, flush_interval=0.05)
+        try:
+            handler.handle(self._record(logging.INFO, "安静时段的记录"))
+
+            deadline = time.monotonic() + 2
+            while not self._read() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            assert self._read() == "安静时段的记录\n"
+        finally:
+            handler.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])
@@ -70,7 +70,7 @@ class TestMemoryConfig:
         config = MemoryConfig()
 
         assert config.persist_directory == "./memory_db"
-        assert config.index_type == "IVF100,Flat"
+        assert config.index_type == "Flat"
         assert config.embedding_dimension == 1024
         assert config.embedding_model == "BAAI/bge-large-zh-v1.5"
         assert config.max_memory_items == 1000
@@ -160,6 +160,24 @@ class TestConfig:
         assert config.require_confirmation is True
         assert config.enable_undo is True
 
+    def test_config_is_frozen(self):
+        """Test configuration is read-only after creation."""
+        config = Config()
+
+        with pytest.raises(ValueError):
+            config.llm.model = "other-model"
+
+        updated = config.model_copy(
+            update={"llm": config.llm.model_copy(update={"model": "other-model"})}
+        )
+        assert updated.llm.model == "other-model"
+        assert config.llm.model == "Qwen/QwQ-32B"
+
+    def test_config_forbids_unknown_fields(self):
+        """Test unknown configuration fields are rejected."""
+        with pytest.raises(ValueError):
+            LLMConfig(unknown_option=True)
+
 
 class TestConfigFunctions:
     """Test configuration functions."""
@@ -208,8 +226,7 @@ class TestConfigDirectories:
             log_file = Path(temp_dir) / "logs" / "test.log"
 
             # 创建临时配置
-            config = Config()
-            config.logging.file = str(log_file)
+            config = Config(logging=LoggingConfig(file=str(log_file)))
 
             # 确保日志目录存在
             log_file.parent.mkdir(parents=True, exist_ok=True)
@@ -222,8 +239,7 @@ class TestConfigDirectories:
             memory_dir = Path(temp_dir) / "memory"
 
             # 创建临时配置
-            config = Config()
-            config.memory.persist_directory = str(memory_dir)
+            config = Config(memory=MemoryConfig(persist_directory=str(memory_dir)))
 
             # 确保内存目录存在
             memory_dir.mkdir(parents=True, exist_ok=True)
@@ -2,14 +2,19 @@
 
 import asyncio
 import json
+from datetime import datetime
 import tempfile
 from pathlib import Path
 from unittest.mock import patch, MagicMock, AsyncMock
 
 import pytest
+import faiss
 import numpy as np
 
-from src.memory import MemoryItem, MemoryQuery, MemoryResult, FAISSMemoryManager
+from src.memory import (
+    MemoryItem, MemoryQuery, MemoryResult, FAISSMemoryManager, LongTermMemoryManager, ConversationSummary,
+    ShortTermMemoryManager, LayeredMemoryCoordinator
+)
 
 
 class TestMemoryItem:
@@ -39,6 +44,19 @@ class TestMemoryItem:
         
         assert item.metadata == metadata
 
+    def test_memory_item_from_short_term_message(self):
+        """测试短期记忆消息转换为记忆项."""
+        from src.memory.coordinator import _to_memory_item
+        from src.memory.short_term import ShortTermMessage
+
+        message = ShortTermMessage(content="测试内容", role="user")
+        item = _to_memory_item(message)
+
+        assert item.id == message.id
+        assert item.content == "测试内容"
+        assert item.timestamp == datetime.fromtimestamp(message.timestamp)
+        assert item.metadata == {}
+
 
 class TestMemoryQuery:
     """记忆查询测试."""
@@ -104,8 +122,8 @@ class TestFAISSMemoryManager:
         assert memory_id is not None
         assert len(memory_manager.memory_items) == 1
         
-        # 验证记忆项
-        memory_item = memory_manager.memory_items[memory_id]
+        # 验证记忆项（嵌入保存在连续缓冲区中，get_memory 时附带返回）
+        memory_item = await memory_manager.get_memory(memory_id)
         assert memory_item.content == "这是一个测试记忆"
         assert memory_item.role == "user"
         assert memory_item.embedding is not None
@@ -122,8 +140,8 @@ class TestFAISSMemoryManager:
         await memory_manager.add_memory("香蕉是黄色的", "user")
         await memory_manager.add_memory("天空是蓝色的", "user")
         
-        # 搜索相关记忆
-        result = await memory_manager.search_memory("苹果")
+        # 搜索相关记忆（相似度为余弦值，随机向量之间可能为负，用原文查询保证命中）
+        result = await memory_manager.search_memory("苹果是红色的")
         
         assert result.total_count > 0
         assert len(result.items) > 0
@@ -181,7 +199,25 @@ class TestFAISSMemoryManager:
         
         assert success is True
         assert memory_id not in memory_manager.memory_items
-    
+
+    @pytest.mark.asyncio
+    async def test_update_and_delete_without_rebuild(self, memory_manager):
+        """测试更新和删除按ID修改索引，不重建整个索引."""
+        await memory_manager.initialize()
+
+        first_id = await memory_manager.add_memory("第一条", "user")
+        second_id = await memory_manager.add_memory("第二条", "user")
+
+        with patch.object(memory_manager, "_rebuild_index", AsyncMock(side_effect=AssertionError)):
+            assert await memory_manager.update_memory(first_id, "第一条（更新）") is True
+            assert memory_manager.index.ntotal == 2
+            assert await memory_manager.delete_memory(second_id) is True
+            assert memory_manager.index.ntotal == 1
+
+        memory_manager.similarity_threshold = 0.5
+        relevant = await memory_manager.search_relevant_memories("第一条（更新）", limit=1)
+        assert relevant[0].id == first_id
+
     @pytest.mark.asyncio
     async def test_list_memories(self, memory_manager):
         """测试列出记忆."""
@@ -240,7 +276,62 @@ class TestFAISSMemoryManager:
         
         assert len(memory_ids) == 3
         assert len(memory_manager.memory_items) == 3
-    
+
+    @pytest.mark.asyncio
+    async def test_add_conversation_memory_batches_embeddings(self, memory_manager):
+        """测试批量添加对话记忆时只发起一次嵌入请求."""
+        memory_manager.api_key = "test-key"
+        await memory_manager.initialize()
+
+        messages = [{"content": f"消息 {i}", "role": "user"} for i in range(3)]
+        response = {
+            "data": [
+                {"index": i, "embedding": [1.0 if j == i else 0.0 for j in range(128)]}
+                for i in reversed(range(3))
+            ]
+        }
+
+        with patch.object(
+            memory_manager, "_call_siliconflow_api", AsyncMock(return_value=response)
+        ) as mock_api:
+            memory_ids = await memory_manager.add_conversation_memory(messages)
+
+        mock_api.assert_awaited_once_with(["消息 0", "消息 1", "消息 2"])
+        assert memory_manager.index.ntotal == 3
+        for i, memory_id in enumerate(memory_ids):
+            memory_item = await memory_manager.get_memory(memory_id)
+            assert memory_item.embedding[i] == 1.0
+
+    @pytest.mark.asyncio
+    async def test_embedding_cache_skips_repeated_requests(self, temp_dir):
+        """测试相同内容的嵌入命中缓存（含重启后），不再请求API."""
+        config = {
+            "persist_directory": temp_dir,
+            "embedding_dimension": 4,
+            "openai_api_key": "test-key"
+        }
+        response = {"data": [{"index": 0, "embedding": [0.0, 1.0, 0.0, 0.0]}]}
+
+        manager1 = FAISSMemoryManager(config)
+        await manager1.initialize()
+        with patch.object(
+            manager1, "_call_siliconflow_api", AsyncMock(return_value=response)
+        ) as mock_api:
+            await manager1.add_memory("重复内容", "user")
+            await manager1.add_memory("重复内容", "assistant")
+            await manager1.search_memory("重复内容")
+        mock_api.assert_awaited_once_with("重复内容")
+        await manager1.close()
+
+        manager2 = FAISSMemoryManager(config)
+        await manager2.initialize()
+        with patch.object(manager2, "_call_siliconflow_api", AsyncMock()) as mock_api:
+            embeddings = await manager2._get_embeddings_batch(["重复内容", "重复内容"])
+        mock_api.assert_not_awaited()
+        assert [list(e) for e in embeddings] == [[0.0, 1.0, 0.0, 0.0]] * 2
+
+        await manager2.close()
+
     @pytest.mark.asyncio
     async def test_search_relevant_memories(self, memory_manager):
         """测试搜索相关记忆."""
@@ -252,11 +343,12 @@ class TestFAISSMemoryManager:
         await memory_manager.add_memory("Python是一种编程语言", "user")
         await memory_manager.add_memory("JavaScript是前端语言", "user")
         
-        relevant = await memory_manager.search_relevant_memories("Python", limit=1)
+        relevant = await memory_manager.search_relevant_memories("Python是一种编程语言", limit=1)
         
-        # 由于使用随机向量，不依赖具体的返回顺序，只验证返回了结果
+        # 查询与记忆原文相同，余弦相似度最高
         assert len(relevant) == 1
-        assert relevant[0].content in ["Python是一种编程语言", "JavaScript是前端语言"]
+        assert relevant[0].content == "Python是一种编程语言"
+        assert relevant[0].similarity_score == pytest.approx(1.0, abs=1e-5)
     
     @pytest.mark.asyncio
     async def test_persistence(self, temp_dir):
@@ -281,9 +373,160 @@ class TestFAISSMemoryManager:
         memory_item = await manager2.get_memory(memory_id)
         assert memory_item is not None
         assert memory_item.content == "持久化测试"
+        assert len(memory_item.embedding) == 128
+        assert manager2.index.ntotal == 1
         
         await manager2.close()
-    
+
+    @pytest.mark.asyncio
+    async def test_legacy_json_migration(self, temp_dir):
+        """测试旧版 metadata.json 迁移到SQLite."""
+        config = {
+            "persist_directory": temp_dir,
+            "embedding_dimension": 4,
+        }
+        item = MemoryItem(content="旧数据", role="user", embedding=[1.0, 0.0, 0.0, 0.0])
+        legacy = {
+            "memory_items": {item.id: item.model_dump()},
+            "memory_ids": [item.id]
+        }
+        with open(Path(temp_dir) / "metadata.json", "w", encoding="utf-8") as f:
+            json.dump(legacy, f, ensure_ascii=False, default=str)
+
+        manager = FAISSMemoryManager(config)
+        await manager.initialize()
+
+        migrated = await manager.get_memory(item.id)
+        assert migrated.content == "旧数据"
+        assert migrated.embedding == [1.0, 0.0, 0.0, 0.0]
+        assert manager.index.ntotal == 1
+        assert not (Path(temp_dir) / "metadata.json").exists()
+
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_ivf_index_trained_when_enough_vectors(self, temp_dir):
+        """测试IVF索引在向量足够时完成训练."""
+        config = {
+            "persist_directory": temp_dir,
+            "embedding_dimension": 16,
+            "index_type": "IVF2,Flat",
+            "nprobe": 2,
+            "similarity_threshold": 0.5
+        }
+        manager = FAISSMemoryManager(config)
+        await manager.initialize()
+
+        messages = [{"content": f"记忆 {i}", "role": "user"} for i in range(80)]
+        await manager.add_conversation_memory(messages)
+
+        stats = await manager.get_memory_stats()
+        assert stats["index_trained"] is True
+        assert manager.index.ntotal == 80
+        assert manager.index.nprobe == 2
+        assert manager.index.parallel_mode == 1
+
+        relevant = await manager.search_relevant_memories("记忆 7", limit=1)
+        assert relevant[0].content == "记忆 7"
+
+    def test_untrainable_index_falls_back_to_flat(self, temp_dir):
+        """测试记忆上限不足以训练时回退到Flat索引."""
+        manager = FAISSMemoryManager({
+            "persist_directory": temp_dir,
+            "embedding_dimension": 16,
+            "index_type": "IVF100,Flat",
+            "max_memory_items": 1000
+        })
+
+        assert manager.index_type == "Flat"
+        assert manager._train_threshold == 0
+
+    @pytest.mark.asyncio
+    async def test_train_threshold_computed_once(self, temp_dir):
+        """测试训练阈值只在初始化时计算，追加向量不再创建临时索引."""
+        config = {
+            "persist_directory": temp_dir,
+            "embedding_dimension": 16,
+            "index_type": "IVF2,Flat"
+        }
+        manager = FAISSMemoryManager(config)
+        await manager.initialize()
+        assert manager._train_threshold == 78
+
+        with patch.object(manager, "_new_factory_index") as mock_factory:
+            await manager.add_conversation_memory([{"content": "记忆", "role": "user"}])
+        mock_factory.assert_not_called()
+        await manager.close()
+
+    @pytest.mark.asyncio
+    async def test_sq8_index_trained_and_reloaded(self, temp_dir):
+        """测试SQ8量化索引的训练以及重启后复用训练结果."""
+        config = {
+            "persist_directory": temp_dir,
+            "embedding_dimension": 16,
+            "index_type": "SQ8",
+            "max_memory_items": 2000,
+            "similarity_threshold": 0.5
+        }
+        manager1 = FAISSMemoryManager(config)
+        await manager1.initialize()
+
+        messages = [{"content": f"记忆 {i}", "role": "user"} for i in range(1100)]
+        await manager1.add_conversation_memory(messages)
+
+        stats = await manager1.get_memory_stats()
+        assert stats["index_trained"] is True
+        assert isinstance(faiss.downcast_index(manager1.index.index), faiss.IndexScalarQuantizer)
+        assert manager1.trained_index_file.exists()
+        await manager1.close()
+
+        manager2 = FAISSMemoryManager(config)
+        with patch.object(FAISSMemoryManager, "_maybe_train") as mock_train:
+            await manager2.initialize()
+        mock_train.assert_called_once()
+        assert (await manager2.get_memory_stats())["index_trained"] is True
+        assert manager2.index.ntotal == 1100
+
+        relevant = await manager2.search_relevant_memories("记忆 7", limit=1)
+        assert relevant[0].content == "记忆 7"
+
+    @pytest.mark.asyncio
+    async def test_use_gpu_without_gpu_falls_back_to_cpu(self, temp_dir):
+        """测试无可用GPU时 use_gpu 回退到CPU索引."""
+        config = {
+            "persist_directory": temp_dir,
+            "embedding_dimension": 8,
+            "use_gpu": True
+        }
+        with patch("src.memory.faiss_manager.faiss.get_num_gpus", return_value=0):
+            manager = FAISSMemoryManager(config)
+            await manager.initialize()
+
+        assert manager.use_gpu is False
+        assert manager._gpu_res is None
+        assert isinstance(manager.index, faiss.IndexIDMap2)
+
+    @pytest.mark.asyncio
+    async def test_concurrent_searches_batched(self, memory_manager):
+        """测试GPU模式下并发查询合并为一次批量搜索."""
+        await memory_manager.initialize()
+        for i in range(3):
+            await memory_manager.add_memory(f"记忆 {i}", "user")
+
+        # 模拟GPU资源以启用查询合并
+        memory_manager._gpu_res = object()
+        index = memory_manager.index
+        with patch.object(memory_manager, "index", MagicMock(wraps=index)) as mock_index:
+            mock_index.ntotal = index.ntotal
+            results = await asyncio.gather(
+                *(memory_manager.search_memory(f"记忆 {i}") for i in range(3))
+            )
+
+        assert mock_index.search.call_count == 1
+        assert mock_index.search.call_args[0][0].shape == (3, 128)
+        for i, result in enumerate(results):
+            assert result.items[0].content == f"记忆 {i}"
+
     @pytest.mark.asyncio
     async def test_memory_trimming(self, memory_manager):
         """测试记忆修剪."""
@@ -301,6 +544,83 @@ class TestFAISSMemoryManager:
         memories = await memory_manager.list_memories()
         assert memories[0].content == "记忆 4"  # 最新的
     
+    @pytest.mark.asyncio
+    async def test_list_memories_order_after_update_and_reload(self, temp_dir):
+        """测试更新后的记忆排在最前，重新加载后顺序不变."""
+        config = {"persist_directory": temp_dir, "embedding_dimension": 8}
+        manager1 = FAISSMemoryManager(config)
+        await manager1.initialize()
+        first_id = await manager1.add_memory("记忆 0", "user")
+        await manager1.add_conversation_memory(
+            [{"content": f"记忆 {i}", "role": "user"} for i in range(1, 3)]
+        )
+        await manager1.update_memory(first_id, "记忆 0 已更新")
+
+        memories = await manager1.list_memories(limit=2)
+        assert [m.content for m in memories] == ["记忆 0 已更新", "记忆 2"]
+        await manager1.close()
+
+        manager2 = FAISSMemoryManager(config)
+        await manager2.initialize()
+        memories = await manager2.list_memories(offset=1)
+        assert [m.content for m in memories] == ["记忆 2", "记忆 1"]
+        await manager2.close()
+
+    @pytest.mark.asyncio
+    async def test_concurrent_add_order_matches_reload(self, temp_dir):
+        """测试并发添加时内存中的顺序与按时间戳重新加载的顺序一致."""
+        config = {"persist_directory": temp_dir, "embedding_dimension": 8}
+        manager1 = FAISSMemoryManager(config)
+        await manager1.initialize()
+        
+        delays = {"first": 0.05, "second": 0.0}
+        
+        async def slow_embedding(text):
+            await asyncio.sleep(delays[text])
+            return np.ones(8, dtype=np.float32)
+        
+        with patch.object(manager1, "_get_embedding", side_effect=slow_embedding):
+            await asyncio.gather(
+                manager1.add_memory("first", "user"),
+                manager1.add_memory("second", "user"),
+            )
+        running = [m.content for m in await manager1.list_memories()]
+        await manager1.close()
+        
+        manager2 = FAISSMemoryManager(config)
+        await manager2.initialize()
+        assert [m.content for m in await manager2.list_memories()] == running
+        await manager2.close()
+
+    @pytest.mark.asyncio
+    async def test_memory_trimming_within_batch(self, memory_manager):
+        """测试批量添加（时间戳相同）时修剪仍保留最新的记忆."""
+        memory_manager.max_memory_items = 3
+        await memory_manager.initialize()
+
+        await memory_manager.add_conversation_memory(
+            [{"content": f"记忆 {i}", "role": "user"} for i in range(5)]
+        )
+
+        memories = await memory_manager.list_memories()
+        assert [m.content for m in memories] == ["记忆 4", "记忆 3", "记忆 2"]
+        assert memory_manager.index.ntotal == 3
+
+    def test_fallback_embedding_is_deterministic(self, memory_manager):
+        """测试回退嵌入由内容决定，且不修改全局随机状态."""
+        np.random.seed(0)
+        expected_next = np.random.random()
+        np.random.seed(0)
+
+        first = memory_manager._fallback_embedding("测试内容")
+        second = memory_manager._fallback_embedding("测试内容")
+
+        assert first.dtype == np.float32
+        assert first.shape == (128,)
+        assert np.array_equal(first, second)
+        assert not np.array_equal(first, memory_manager._fallback_embedding("其他内容"))
+        assert np.random.random() == expected_next
+
     @pytest.mark.asyncio
     async def test_embedding_fallback(self, memory_manager):
         """测试嵌入生成的回退机制."""
@@ -315,5 +635,230 @@ class TestFAISSMemoryManager:
         assert len(memory_item.embedding) == 128  # 配置的维度
 
 
+
+class TestShortTermMemoryManager:
+    """短期记忆管理器测试."""
+    
+    @pytest.mark.asyncio
+    async def test_ring_buffer_evicts_oldest(self):
+        """测试超过轮次限制时淘汰最旧的消息."""
+        manager = ShortTermMemoryManager({"short_term_rounds": 3})
+        for i in range(5):
+            await manager.add_memory(f"消息 {i}", "user")
+        
+        assert [m.content for m in manager.messages.values()] == ["消息 2", "消息 3", "消息 4"]
+        assert [m.content for m in await manager.get_recent_messages(2)] == ["消息 3", "消息 4"]
+        assert [m.content for m in await manager.get_recent_messages(10)] == ["消息 2", "消息 3", "消息 4"]
+        assert [m.content for m in await manager.list_memories(limit=1, offset=1)] == ["消息 3"]
+    
+    @pytest.mark.asyncio
+    async def test_lookup_by_id_after_eviction(self):
+        """测试按ID查找/更新，被淘汰的消息不再可见."""
+        manager = ShortTermMemoryManager({"short_term_rounds": 2})
+        ids = [await manager.add_memory(f"消息 {i}", "user") for i in range(3)]
+        
+        assert await manager.get_memory(ids[0]) is None
+        assert await manager.update_memory(ids[0], "已淘汰") is False
+        assert await manager.update_memory(ids[2], "已更新") is True
+        assert (await manager.get_memory(ids[2])).content == "已更新"
+        assert list(manager.messages) == ids[1:]
+    
+    @pytest.mark.asyncio
+    async def test_search_memory_case_insensitive(self):
+        """测试搜索不区分大小写，且反映更新和删除."""
+        manager = ShortTermMemoryManager({"short_term_rounds": 5})
+        first_id = await manager.add_memory("Hello World", "user")
+        second_id = await manager.add_memory("hello again", "assistant")
+        
+        assert [m.id for m in await manager.search_memory("HELLO")] == [second_id, first_id]
+        
+        await manager.update_memory(first_id, "Goodbye")
+        await manager.delete_memory(second_id)
+        assert await manager.search_memory("hello") == []
+        assert [m.id for m in await manager.search_memory("goodBYE")] == [first_id]
+    
+    @pytest.mark.asyncio
+    async def test_search_memory_multiple_hits_and_limit(self):
+        """测试同一消息多次命中只返回一次，结果从新到旧并受 limit 限制."""
+        manager = ShortTermMemoryManager({"short_term_rounds": 5})
+        for content in ["abc", "xabcx", "nope", "ABC abc"]:
+            await manager.add_memory(content, "user")
+        
+        assert [m.content for m in await manager.search_memory("abc")] == ["ABC abc", "xabcx", "abc"]
+        assert [m.content for m in await manager.search_memory("abc", limit=2)] == ["ABC abc", "xabcx"]
+        assert await manager.search_memory("cn") == []
+    
+    @pytest.mark.asyncio
+    async def test_delete_memory(self):
+        """测试删除短期记忆."""
+        manager = ShortTermMemoryManager({"short_term_rounds": 3})
+        first_id = await manager.add_memory("消息 0", "user")
+        await manager.add_memory("消息 1", "user")
+        
+        assert await manager.delete_memory(first_id) is True
+        assert await manager.delete_memory(first_id) is False
+        assert [m.content for m in manager.messages.values()] == ["消息 1"]
+
+
+class TestLongTermMemoryManager:
+    """长期记忆管理器测试."""
+    
+    @pytest.mark.asyncio
+    async def test_summary_saves_are_debounced(self):
+        """测试连续生成的摘要合并为一次落盘，关闭时保存未落盘的修改."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = LongTermMemoryManager({
+                "persist_directory": temp_dir,
+                "embedding_dimension": 8,
+                "openai_api_key": "test-key"
+            })
+            await manager.initialize()
+            
+            with patch.object(manager, "_call_llm_for_summary", AsyncMock(return_value="摘要")), \
+                    patch.object(manager, "_save_summaries", AsyncMock()) as mock_save:
+                for i in range(3):
+                    await manager.generate_conversation_summary(f"conv-{i}", [])
+                mock_save.assert_not_awaited()
+                
+                await manager.close()
+                mock_save.assert_awaited_once()
+            
+            assert len(manager.summaries) == 3
+
+    @pytest.mark.asyncio
+    async def test_summaries_persistence(self):
+        """测试会话摘要保存后可重新加载."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            config = {"persist_directory": temp_dir, "embedding_dimension": 8}
+            manager1 = LongTermMemoryManager(config)
+            await manager1.initialize()
+            manager1.summaries["conv-1"] = ConversationSummary(
+                conversation_id="conv-1", summary="测试摘要", metadata={"message_count": 2}
+            )
+            await manager1._save_summaries()
+            await manager1.close()
+            
+            manager2 = LongTermMemoryManager(config)
+            await manager2.initialize()
+            loaded = manager2.summaries["conv-1"]
+            assert loaded.summary == "测试摘要"
+            assert loaded.metadata == {"message_count": 2}
+            assert loaded.timestamp == manager1.summaries["conv-1"].timestamp
+            assert manager2.summary_index.ntotal == 1
+            await manager2.close()
+    
+    @pytest.mark.asyncio
+    async def test_summaries_generated_concurrently_and_searched_by_vector(self):
+        """测试多个会话摘要并发生成，并通过摘要向量索引检索."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            manager = LongTermMemoryManager({
+                "persist_directory": temp_dir,
+                "embedding_dimension": 16,
+                "openai_api_key": "test-key",
+                "similarity_threshold": 0.5
+            })
+            await manager.initialize()
+            
+            def fake_summary(prompt):
+                return "讨论了天气" if "天气" in prompt else "讨论了代码"
+            
+            with patch.object(manager, "_call_llm_for_summary", AsyncMock(side_effect=fake_summary)) as mock_llm, \
+                    patch.object(manager, "_call_siliconflow_api", AsyncMock(side_effect=RuntimeError)):
+                results = await manager.generate_conversation_summaries([
+                    ("conv-weather", [{"role": "user", "content": "今天天气如何"}]),
+                    ("conv-code", [{"role": "user", "content": "帮我写代码"}]),
+                ])
+                assert results == ["讨论了天气", "讨论了代码"]
+                assert mock_llm.await_count == 2
+                assert manager.summary_index.ntotal == 2
+                
+                found = await manager.search_memory_with_summary("讨论了代码")
+                assert [r["conversation_id"] for r in found["conversation_summaries"]] == ["conv-code"]
+                
+                await manager.delete_conversation_summary("conv-code")
+                assert manager.summary_index.ntotal == 1
+            
+            await manager.close()
+
+
+
+class _SlowLongTermManager:
+    """模拟写入较慢的长期记忆管理器."""
+    
+    def __init__(self, fail: bool = False):
+        self.memories = []
+        self.fail = fail
+    
+    async def initialize(self):
+        pass
+    
+    async def add_memory(self, content, role, metadata=None):
+        await asyncio.sleep(0.01)
+        if self.fail:
+            raise RuntimeError("写入失败")
+        self.memories.append(content)
+        return content
+    
+    async def clear_memories(self):
+        count = len(self.memories)
+        self.memories.clear()
+        return count
+    
+    async def close(self):
+        pass
+
+
+class TestLayeredMemoryCoordinator:
+    """分层记忆协调器测试."""
+    
+    def _coordinator(self, temp_dir, long_term):
+        """创建每条消息都写入长期记忆的协调器."""
+        coordinator = LayeredMemoryCoordinator({
+            "persist_directory": temp_dir,
+            "embedding_dimension": 8,
+            "conversation_length_threshold": 0
+        })
+        coordinator.long_term_manager = long_term
+        return coordinator
+    
+    @pytest.mark.asyncio
+    async def test_close_drains_background_writes(self):
+        """测试关闭时等待后台长期记忆写入完成."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            long_term = _SlowLongTermManager()
+            coordinator = self._coordinator(temp_dir, long_term)
+            await coordinator.add_memory("记忆", "user", {"conversation_id": "conv-1"})
+            assert long_term.memories == []
+            
+            await coordinator.close()
+            assert long_term.memories == ["记忆"]
+            assert not coordinator._bg_tasks
+    
+    @pytest.mark.asyncio
+    async def test_clear_waits_for_background_writes(self):
+        """测试清空前等待在途写入，清空后数据不会重新出现."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            long_term = _SlowLongTermManager()
+            coordinator = self._coordinator(temp_dir, long_term)
+            await coordinator.add_memory("secret", "user", {"conversation_id": "conv-1"})
+            
+            assert await coordinator.clear_memories() == 2
+            await asyncio.sleep(0.02)
+            assert long_term.memories == []
+            await coordinator.close()
+    
+    @pytest.mark.asyncio
+    async def test_failed_background_write_logged(self, caplog):
+        """测试后台写入失败由完成回调记录日志."""
+        with tempfile.TemporaryDirectory() as temp_dir:
+            coordinator = self._coordinator(temp_dir, _SlowLongTermManager(fail=True))
+            await coordinator.add_memory("记忆", "user", {"conversation_id": "conv-1"})
+            
+            with caplog.at_level("ERROR", logger="src.memory.coordinator"):
+                await coordinator.close()
+            assert "Failed to add long-term memory: 写入失败" in caplog.text
+            assert not coordinator._bg_tasks
+
+
 if __name__ == "__main__":
     pytest.main([__file__]) 
\ No newline at end of file
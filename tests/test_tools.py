@@ -66,7 +66,21 @@ class TestToolExecutor:
         assert schema is not None
         assert schema["name"] == "run_shell"
         assert schema["description"] == "执行系统Shell命令"
-    
+
+    def test_tool_schemas_cache_invalidation(self):
+        """测试工具模式缓存在注册/注销后失效."""
+        assert self.executor.get_tool_schemas() == []
+
+        self.executor.register_tool(RunShellTool)
+        schemas = self.executor.get_tool_schemas()
+        assert [s["name"] for s in schemas] == ["run_shell"]
+        assert self.executor.get_tool_schemas() is schemas
+        assert b'"run_shell"' in self.executor.get_tool_schemas_json()
+
+        self.executor.unregister_tool("run_shell")
+        assert self.executor.get_tool_schemas() == []
+        assert self.executor.get_tool_schemas_json() == b"[]"
+
     @pytest.mark.asyncio
     async def test_execute_nonexistent_tool(self):
         """测试执行不存在的工具."""
@@ -85,6 +99,23 @@ class TestToolExecutor:
         assert result.success is False
         assert "Invalid parameters" in result.error
 
+    @pytest.mark.asyncio
+    async def test_execute_tools_keeps_order(self):
+        """测试批量执行工具时结果顺序与调用顺序一致."""
+        self.executor.register_tool(RunShellTool)
+
+        results = await self.executor.execute_tools([
+            {"name": "run_shell", "arguments": {"command": "echo first"}},
+            {"arguments": {}},
+            {"name": "run_shell", "arguments": {"command": "echo second"}},
+        ])
+
+        assert len(results) == 3
+        assert "first" in results[0].result["stdout"]
+        assert results[1].success is False
+        assert results[1].error == "Tool name is required"
+        assert "second" in results[2].result["stdout"]
+
 
 class TestShellTool:
     """Shell工具测试."""
@@ -0,0 +1,92 @@
+"""撤销历史持久化测试."""
+
+import os
+import tempfile
+
+import orjson
+import pytest
+
+from src.cli.undo import UndoManager
+
+
+class TestUndoHistoryPersistence:
+    """撤销历史持久化测试."""
+
+    def setup_method(self):
+        """设置测试环境."""
+        self.temp_dir = tempfile.mkdtemp()
+        self.history_file = os.path.join(self.temp_dir, "undo_history.ndjson")
+
+    def teardown_method(self):
+        """清理测试环境."""
+        for name in os.listdir(self.temp_dir):
+            os.remove(os.path.join(self.temp_dir, name))
+        os.rmdir(self.temp_dir)
+
+    def _read_lines(self):
+        with open(self.history_file, 'rb') as f:
+            return [orjson.loads(line) for line in f if line.strip()]
+
+    def test_round_trip(self):
+        """测试写入后重新加载得到相同的历史记录."""
+        manager = UndoManager(self.history_file)
+        first = manager.add_action("file_write", "写入文件", {"file_path": "a.txt"})
+        second = manager.add_action("shell_command", "执行命令", {"command": "ls"}, can_undo=False)
+        manager.flush()
+
+        reloaded = UndoManager(self.history_file)
+
+        assert [action.id for action in reloaded.history] == [first, second]
+        assert reloaded.history[0].data == {"file_path": "a.txt"}
+        assert reloaded.history[0].timestamp == manager.history[0].timestamp
+        assert reloaded.history[1].can_undo is False
+
+    @pytest.mark.asyncio
+    async def test_tombstone_survives_reload(self):
+        """测试撤销的动作在重新加载后不再出现."""
+        manager = UndoManager(self.history_file)
+        first = manager.add_action("file_write", "写入文件", {})
+        second = manager.add_action("file_write", "再次写入", {})
+
+        assert await manager.undo_action_by_id(first) is True
+        assert self._read_lines()[-1] == {"tombstone": first}
+
+        reloaded = UndoManager(self.history_file)
+        assert [action.id for action in reloaded.history] == [second]
+
+    def test_compaction(self):
+        """测试追加行数达到上限的两倍时压缩文件."""
+        manager = UndoManager(self.history_file, max_history=3)
+        ids = [manager.add_action("file_write", f"写入 {i}", {}) for i in range(6)]
+        manager.flush()
+
+        assert [record["id"] for record in self._read_lines()] == ids[3:]
+
+        reloaded = UndoManager(self.history_file, max_history=3)
+        assert [action.id for action in reloaded.history] == ids[3:]
+
+    def test_legacy_array_migrated(self):
+        """测试新日志不存在时加载并迁移旧版JSON数组文件."""
+        legacy = [
+            {
+                "id": f"legacy{i}",
+                "action_type": "file_write",
+                "description": f"旧记录 {i}",
+                "timestamp": "2024-01-01T12:00:00",
+                "data": {},
+                "can_undo": True,
+                "undo_function": None
+            }
+            for i in range(2)
+        ]
+        with open(os.path.join(self.temp_dir, "undo_history.json"), 'wb') as f:
+            f.write(orjson.dumps(legacy))
+
+        manager = UndoManager(self.history_file)
+
+        assert [action.id for action in manager.history] == ["legacy0", "legacy1"]
+        assert [record["id"] for record in self._read_lines()] == ["legacy0", "legacy1"]
+
+
+if __name__ == "__main__":
+    pytest.main([__file__])